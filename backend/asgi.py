@@ -0,0 +1,190 @@
+"""ASGI entrypoint: serve the same Flask routes from an asyncio event loop.
+
+    uvicorn asgi:application --port 8001
+    python asgi.py
+
+The event loop owns the sockets, so thousands of idle or slow keep-alive
+connections cost a coroutine each instead of a thread each. Every request is
+dispatched to the Flask app (and therefore the same views, sessions, caches
+and checkout logic as ``server.py``) on a bounded worker pool, which is where
+all blocking SQLite work happens. bcrypt already runs on the hasher's own
+pool; the auth routes that wait on it get a separate small lane so a login
+storm cannot tie up the workers serving the catalog.
+"""
+import asyncio
+import contextvars
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from server import create_app
+
+# Requests that block on the bcrypt pool (see passwords.py).
+AUTH_PATHS = frozenset(('/api/login', '/api/register'))
+
+
+class WSGIBridge:
+    """Minimal ASGI -> WSGI adapter running the app on thread pools."""
+
+    def __init__(self, wsgi_app, workers=32, auth_workers=4):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asgi')
+        self.auth_executor = ThreadPoolExecutor(max_workers=auth_workers, thread_name_prefix='asgi-auth')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.auth_executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                break
+
+        loop = asyncio.get_running_loop()
+        executor = self.auth_executor if scope['path'] in AUTH_PATHS else self.executor
+        # Flask's request context lives in context variables; run every step
+        # of a response in one Context so a streamed generator still sees it
+        # when its next chunk is pulled on a different worker thread.
+        context = contextvars.copy_context()
+        status, headers, body, rest = await loop.run_in_executor(
+            executor, context.run, self._start, build_environ(scope, bytes(body)))
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+        })
+        if rest is None:
+            await send({'type': 'http.response.body', 'body': body})
+            return
+        # Streaming response: pull one chunk per hop so a slow client holds
+        # back the generator instead of letting output pile up in memory.
+        try:
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+            while True:
+                chunk = await loop.run_in_executor(executor, context.run, next, rest, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(rest, 'close'):
+                await loop.run_in_executor(executor, context.run, rest.close)
+
+    def _start(self, environ):
+        """Call the app on a worker thread. Returns ``(status, headers, body,
+        rest)``; ``rest`` is None when ``body`` is the whole response,
+        otherwise the iterator still producing it."""
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        result = self.wsgi_app(environ, start_response)
+        it = iter(result)
+        try:
+            first = next(it, b'')
+            length = next((v for k, v in started[1] if k.lower() == 'content-length'), None)
+            if length is not None and int(length) == len(first):
+                body = first
+            elif length is None and hasattr(result, 'close'):
+                return started[0], started[1], first, _Closing(it, result)
+            else:
+                body = first + b''.join(it)
+        except BaseException:
+            if hasattr(result, 'close'):
+                result.close()
+            raise
+        if hasattr(result, 'close'):
+            result.close()
+        return started[0], started[1], body, None
+
+
+class _Closing:
+    """Iterator that also closes the original WSGI result (PEP 3333)."""
+
+    def __init__(self, it, result):
+        self._it = it
+        self._result = result
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._it)
+
+    def close(self):
+        self._result.close()
+
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = 'HTTP_' + name
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    return environ
+
+
+app = create_app()
+application = WSGIBridge(
+    app,
+    workers=int(os.environ.get('ASGI_WORKERS', '32')),
+    auth_workers=int(os.environ.get('ASGI_AUTH_WORKERS', str(app.config['BCRYPT_WORKERS'] + 2))),
+)
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("The async serving mode needs an ASGI server: pip install uvicorn")
+    uvicorn.run(application, host='0.0.0.0', port=int(os.environ.get('PORT', '8001')), log_level='warning')
@@ -0,0 +1,99 @@
+"""Threaded WSGI vs. ASGI serving: requests/sec and latency at high concurrency.
+
+    python benchmarks/async_serving.py --connections 1000 --duration 10
+
+Starts the app twice on a scratch database, once on werkzeug's threaded
+server (a thread per connection, like ``python server.py``) and once through
+``asgi.py`` on uvicorn, and drives each with the same asyncio client: N
+keep-alive connections each issuing a mix of catalog and auth-check GETs
+back to back (werkzeug closes the connection after each response, so its
+clients reconnect every time). The client runs on the same machine, so
+compare the two modes against each other rather than reading the absolute
+numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import urllib.request
+
+from common import free_port, percentile, seed_sample_data, start_server
+
+REQUEST_TIMEOUT = 30.0
+
+
+async def connection(port, paths, offset, deadline, latencies, errors):
+    reader = writer = None
+    n = offset
+    while time.perf_counter() < deadline:
+        path = paths[n % len(paths)]
+        n += 1
+        t0 = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'.encode('ascii'))
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), REQUEST_TIMEOUT)
+            headers = {}
+            for line in head.split(b'\r\n')[1:]:
+                name, _, value = line.partition(b':')
+                headers[name.strip().lower()] = value.strip().lower()
+            await asyncio.wait_for(reader.readexactly(int(headers.get(b'content-length', 0))), REQUEST_TIMEOUT)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - t0)
+        status = int(head.split(b' ', 2)[1])
+        if status != 200:
+            errors.append(status)
+        # werkzeug's server closes after every response; reconnect then.
+        if headers.get(b'connection') == b'close':
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def drive(port, paths, connections, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(connection(port, paths, i, deadline, latencies, errors) for i in range(connections)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--modes', default='threaded,asgi')
+    args = parser.parse_args()
+
+    print(f'{"mode":>9} {"conns":>6} {"requests":>9} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for mode in args.modes.split(','):
+        fd, db_path = tempfile.mkstemp(prefix='stylesphere-bench-', suffix='.db')
+        os.close(fd)
+        seed_sample_data(db_path)
+        port = free_port()
+        proc, categories = start_server(mode, port, db_path)
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/products?limit=20') as resp:
+                product_ids = [p['id'] for p in json.load(resp)['products']]
+            paths = ['/api/products', '/api/check-auth']
+            paths += [f'/api/products?category_id={c["id"]}' for c in categories['categories']]
+            paths += [f'/api/products/{pid}' for pid in product_ids]
+            latencies, errors, elapsed = asyncio.run(drive(port, paths, args.connections, args.duration))
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(f'{mode:>9} {args.connections:>6} {len(latencies):>9} {len(latencies) / elapsed:>8.0f} '
+              f'{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} {len(errors):>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Commands that serve the app on $PORT, by serving mode.
+SERVERS = {
+    'threaded': [sys.executable, '-c',
+                 'import os, server\n'
+                 'from werkzeug.serving import make_server\n'
+                 'make_server("127.0.0.1", int(os.environ["PORT"]), server.create_app(), threaded=True).serve_forever()'],
+    'asgi': [sys.executable, 'asgi.py'],
+    'prefork': [sys.executable, 'prefork.py', '--host', '127.0.0.1'],
+}
+
+
+def load_app(db_path=None):
+    """Build the app against a scratch SQLite file instead of data.db, with
+    the sample catalog loaded."""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='stylesphere-bench-', suffix='.db')
+        os.close(fd)
+    os.environ['SQLITE_PATH'] = str(db_path)
+    os.environ.setdefault('SESSION_SQLITE_PATH', f'{db_path}.sessions')
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    app = server.create_app()
+    with app.app_context():
+        server.init_sample_data()
+    return app
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def seed_sample_data(db_path):
+    """Load the sample catalog into ``db_path`` with ``flask seed``."""
+    env = dict(os.environ, SQLITE_PATH=str(db_path), SESSION_SQLITE_PATH=f'{db_path}.sessions')
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'server', 'seed'], cwd=BACKEND_DIR, env=env,
+                   stdout=subprocess.DEVNULL, check=True)
+
+
+def start_server(mode, port, db_path, args=()):
+    """Serve the app in a subprocess (``args`` appended to its command) and
+    wait until it answers; returns the process and the decoded
+    /api/categories response."""
+    env = dict(os.environ, PORT=str(port), SQLITE_PATH=str(db_path), SESSION_SQLITE_PATH=f'{db_path}.sessions')
+    proc = subprocess.Popen(SERVERS[mode] + list(args), cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/categories') as resp:
+                return proc, json.load(resp)
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
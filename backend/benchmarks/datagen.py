@@ -0,0 +1,236 @@
+"""Seed a scratch SQLite file with a large, reproducible synthetic dataset.
+
+    python benchmarks/datagen.py /tmp/bench.db --products 1000000 --users 100000 --orders 1000000
+
+The schema comes from migrations.py. Ids, names, prices and timestamps are
+drawn from ``random.Random(seed)``, so the same arguments always produce the
+same database. Orders go to the monthly partition files next to it (see
+order_partitions.py). Every user's password is ``PASSWORD``, hashed once with
+``--bcrypt-rounds`` (run the server with a matching BCRYPT_LOG_ROUNDS or the
+first login of each user will rehash it).
+"""
+import argparse
+import itertools
+import random
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import bcrypt
+
+from common import BACKEND_DIR
+from search_latency import ADJECTIVES, COLORS, NOUNS, vocabulary
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+import migrations  # noqa: E402
+from order_partitions import OrderPartitions, month_of, new_order_id, partition_dir  # noqa: E402
+
+PASSWORD = 'benchpass'
+BATCH = 20000
+CATEGORIES = ["Men's Wear", "Women's Wear", "Children's Wear", 'Underwear', 'Accessories', 'Footwear']
+SIZES = ['XS', 'S', 'M', 'L', 'XL']
+CITIES = [('Pune', 'MH'), ('Mumbai', 'MH'), ('Bengaluru', 'KA'), ('Chennai', 'TN'), ('Delhi', 'DL'), ('Jaipur', 'RJ')]
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def rand_id(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def timestamp(rng, span_days=365):
+    return (EPOCH + timedelta(seconds=rng.randrange(span_days * 86400), microseconds=rng.randrange(10 ** 6))).isoformat()
+
+
+def timestamp_us(rng, span_days=365):
+    """Order timestamps are stored as integer microseconds (see orders.py)."""
+    return int(EPOCH.timestamp()) * 10 ** 6 + rng.randrange(span_days * 86400 * 10 ** 6)
+
+
+def insert(conn, table, rows):
+    if rows:
+        conn.executemany(f'INSERT INTO {table} VALUES ({", ".join("?" * len(rows[0]))})', rows)
+
+
+def insert_orders(conn, partitions, orders, items):
+    """Write order and item rows (compact layout, ``created_at`` last) to
+    their monthly partitions and record each user's months."""
+    conn.commit()
+    months = {}
+    for row in orders:
+        months.setdefault(month_of(row[-1]), ([], []))[0].append(row)
+    month_of_order = {row[0]: month for month, (rows, _) in months.items() for row in rows}
+    for item in items:
+        months[month_of_order[item[0]]][1].append(item)
+    for month, (rows, lines) in sorted(months.items()):
+        schema = partitions.attach(conn, month) or partitions.create(conn, month)
+        insert(conn, f'{schema}.orders', rows)
+        insert(conn, f'{schema}.order_items', lines)
+        conn.executemany('INSERT OR IGNORE INTO order_user_months (user_id, month) VALUES (?, ?)',
+                         {(row[1], month) for row in rows if row[1] is not None})
+        conn.commit()
+
+
+def order_count(conn, partitions, table='orders'):
+    """Rows of ``table`` summed over every order partition."""
+    return sum(conn.execute(f'SELECT COUNT(*) FROM {partitions.attach(conn, month)}.{table}').fetchone()[0]
+               for month in partitions.months(conn))
+
+
+def user_order_ids(conn, partitions, user_id, limit):
+    """Ids of up to ``limit`` of ``user_id``'s most recent orders."""
+    ids = []
+    for month in partitions.months(conn, user_id):
+        schema = partitions.attach(conn, month)
+        ids += [r[0] for r in conn.execute(f'SELECT id FROM {schema}.orders WHERE user_id = ? ORDER BY created_at DESC LIMIT ?',
+                                           (user_id, limit - len(ids)))]
+        if len(ids) >= limit:
+            break
+    return ids
+
+
+def seed_categories(conn, rng):
+    existing = [tuple(r) for r in conn.execute('SELECT id, name FROM categories')]
+    names = {name for _, name in existing}
+    rows = [(rand_id(rng), name, 'https://example.com/c.jpg', EPOCH.isoformat()) for name in CATEGORIES if name not in names]
+    insert(conn, 'categories', rows)
+    conn.commit()
+    return existing + [(r[0], r[1]) for r in rows]
+
+
+def seed_products(conn, rng, count, categories):
+    words = vocabulary(rng) + ADJECTIVES + NOUNS + ['cotton', 'soft', 'breathable', 'stretch', 'comfortable']
+    # Zipf-skewed description words; cumulative weights so each draw is a bisect
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(words))))
+    rng.shuffle(words)
+    brands = vocabulary(rng, 500)
+    offset = conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+    batch = []
+    for i in range(offset, offset + count):
+        cat_id, cat_name = categories[rng.randrange(len(categories))]
+        name = f'{rng.choice(brands)} {rng.choice(COLORS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}'.title()
+        batch.append((rand_id(rng), name, ' '.join(rng.choices(words, cum_weights=cum_weights, k=14)), round(rng.uniform(5, 250), 2),
+                      cat_id, cat_name, 'https://example.com/p.jpg', rng.randint(0, 500), timestamp(rng)))
+        if len(batch) == BATCH:
+            insert(conn, 'products', batch)
+            conn.commit()
+            batch = []
+    insert(conn, 'products', batch)
+    conn.commit()
+
+
+def seed_users(conn, rng, count, rounds):
+    pw_hash = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+    offset = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    batch = []
+    for i in range(offset, offset + count):
+        batch.append((rand_id(rng), f'user{i}', f'user{i}@example.com', pw_hash, f'Bench User {i}', timestamp(rng)))
+        if len(batch) == BATCH:
+            insert(conn, 'users', batch)
+            conn.commit()
+            batch = []
+    insert(conn, 'users', batch)
+    conn.commit()
+
+
+def seed_orders(conn, partitions, rng, count, user_ids, max_lines=3):
+    products = conn.execute('SELECT id, name, image_url, price FROM products').fetchall()
+    if not products:
+        raise SystemExit('seed products before orders')
+    # Each user orders with one contact and one shipping address, like a
+    # repeat customer; product snapshots are interned as products get picked.
+    conn.executemany('INSERT OR IGNORE INTO customers (name, email, phone) VALUES (?, ?, ?)',
+                     [(f'Bench Customer {n}', f'customer{n}@example.com', f'9{n:09d}') for n in range(len(user_ids))])
+    conn.executemany('INSERT OR IGNORE INTO addresses (street, city, state, zip_code, country) VALUES (?, ?, ?, ?, ?)',
+                     [(f'{n % 999 + 1} Main St', *CITIES[n % len(CITIES)], f'{110000 + n % 750000}', 'India')
+                      for n in range(len(user_ids))])
+    customers = {email: cid for cid, email in conn.execute(
+        "SELECT id, email FROM customers WHERE email LIKE 'customer%@example.com'")}
+    addresses = {tuple(r[1:]): r[0] for r in conn.execute('SELECT id, street, city, state, zip_code FROM addresses')}
+    contacts = [(customers[f'customer{n}@example.com'],
+                 addresses[(f'{n % 999 + 1} Main St', *CITIES[n % len(CITIES)], f'{110000 + n % 750000}')])
+                for n in range(len(user_ids))]
+    snapshots = {tuple(r[1:]): r[0] for r in conn.execute('SELECT id, product_id, name, image_url FROM product_snapshots')}
+    next_snapshot = max(snapshots.values(), default=0) + 1
+    orders, items, new_snapshots = [], [], []
+    for _ in range(count):
+        created = timestamp_us(rng)
+        oid = new_order_id(created, rng.getrandbits(74))
+        n = rng.randrange(len(user_ids)) if user_ids else None
+        customer_id, address_id = contacts[n] if n is not None else (None, None)
+        quantity = total = 0
+        for line_no in range(1, rng.randint(1, max_lines) + 1):
+            pid, name, image, price = rng.choice(products)
+            snapshot_id = snapshots.get((pid, name, image))
+            if snapshot_id is None:
+                snapshot_id = snapshots[(pid, name, image)] = next_snapshot
+                new_snapshots.append((next_snapshot, pid, name, image))
+                next_snapshot += 1
+            line_quantity = rng.randint(1, 3)
+            cents = int(round(price * 100))
+            items.append((oid, line_no, snapshot_id, line_quantity, rng.choice(SIZES), cents))
+            quantity += line_quantity
+            total += cents * line_quantity
+        orders.append((oid, user_ids[n] if n is not None else None, customer_id, address_id, quantity, total,
+                       'Cash on Delivery', rng.choice(['confirmed', 'confirmed', 'shipped', 'delivered']), 'pending',
+                       '5-7 business days', created))
+        if len(orders) == BATCH:
+            insert(conn, 'product_snapshots', new_snapshots)
+            insert_orders(conn, partitions, orders, items)
+            orders, items, new_snapshots = [], [], []
+    insert(conn, 'product_snapshots', new_snapshots)
+    insert_orders(conn, partitions, orders, items)
+
+
+def generate(path, products=0, users=0, orders=0, seed=42, rounds=4):
+    """Migrate ``path`` and add the requested number of rows; returns counts."""
+    rng = random.Random(seed)
+    partitions = OrderPartitions(partition_dir(path))
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    try:
+        migrations.migrate(conn)
+        categories = seed_categories(conn, rng)
+        started = time.perf_counter()
+        # Index the bulk load once at the end instead of row by row.
+        triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'products'").fetchall()
+        for name, _ in triggers:
+            conn.execute(f'DROP TRIGGER {name}')
+        seed_products(conn, rng, products, categories)
+        conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+        for _, sql in triggers:
+            conn.execute(sql)
+        conn.commit()
+        seed_users(conn, rng, users, rounds)
+        if orders:
+            user_ids = [r[0] for r in conn.execute('SELECT id FROM users')]
+            seed_orders(conn, partitions, rng, orders, user_ids)
+            partitions.rebuild_sales(conn)
+        print(f'seeded in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+        conn.execute('ANALYZE')
+        counts = {t: conn.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0]
+                  for t in ('categories', 'products', 'users', 'customers', 'addresses', 'product_snapshots')}
+        counts.update({t: order_count(conn, partitions, t) for t in ('orders', 'order_items')})
+        return counts
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--bcrypt-rounds', type=int, default=4)
+    args = parser.parse_args()
+    counts = generate(args.path, args.products, args.users, args.orders, args.seed, args.bcrypt_rounds)
+    print(' '.join(f'{table}={count}' for table, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
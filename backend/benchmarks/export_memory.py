@@ -0,0 +1,68 @@
+"""Peak Python memory of GET /api/orders/export vs. number of orders.
+
+    python benchmarks/export_memory.py --sizes 1000,100000,1000000
+
+The export streams from the cursor in batches, so the peak should stay
+roughly constant while the number of exported bytes grows with the data.
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from common import load_app
+from datagen import insert_orders
+from order_partitions import new_order_id
+
+
+def seed_orders(conn, partitions, count, start):
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    conn.execute("INSERT OR IGNORE INTO customers (id, name, email, phone) VALUES (1, 'Bench', 'bench@example.com', '000')")
+    conn.execute("INSERT OR IGNORE INTO addresses (id, street, city, state, zip_code, country) "
+                 "VALUES (1, '1 Main St', 'Pune', 'MH', '411001', 'India')")
+    conn.execute("INSERT OR IGNORE INTO product_snapshots (id, product_id, name, image_url) "
+                 "VALUES (1, 'p1', 'Bench product', 'https://example.com/p.jpg')")
+    batch, items = [], []
+    for i in range(start, start + count):
+        created = (int(base.timestamp()) + i) * 10 ** 6
+        order_id = new_order_id(created)
+        batch.append((order_id, None, 1, 1, 1, 1999, 'Cash on Delivery', 'confirmed', 'pending', '5-7 business days', created))
+        items.append((order_id, 1, 1, 1, 'M', 1999))
+        if len(batch) == 10000:
+            insert_orders(conn, partitions, batch, items)
+            batch, items = [], []
+    insert_orders(conn, partitions, batch, items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000')
+    args = parser.parse_args()
+
+    # The orders have no user; export them all as an admin
+    os.environ['ADMIN_TOKEN'] = 'bench-admin'
+    app = load_app()
+    conn = app.extensions['db_pool'].connect()
+    client = app.test_client()
+    seeded = 0
+    print(f'{"orders":>10} {"format":>7} {"bytes":>14} {"seconds":>8} {"peak KiB":>9}')
+    for size in [int(s) for s in args.sizes.split(',')]:
+        seed_orders(conn, app.extensions['order_partitions'], size - seeded, seeded)
+        seeded = size
+        for fmt in ('ndjson', 'csv'):
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            resp = client.get(f'/api/orders/export?format={fmt}', headers={'X-Admin-Token': 'bench-admin'},
+                              buffered=False)
+            total = sum(len(chunk) for chunk in resp.response)
+            resp.close()
+            elapsed = time.perf_counter() - t0
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f'{size:>10} {fmt:>7} {total:>14} {elapsed:>8.2f} {peak / 1024:>9.0f}')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Catalog latency with and without a concurrent login storm.
+
+    python benchmarks/login_storm.py --login-threads 32 --duration 3
+
+bcrypt runs on the bounded pool from passwords.py, so login bursts queue (or
+get 503) there instead of starving the threads serving the catalog.
+"""
+import argparse
+import threading
+import time
+
+from common import load_app, percentile
+
+
+def measure_catalog(client, duration):
+    samples = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        assert client.get('/api/products?limit=20').status_code == 200
+        samples.append((time.perf_counter() - t0) * 1000)
+        time.sleep(0.002)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--login-threads', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=3.0)
+    args = parser.parse_args()
+
+    app = load_app()
+    client = app.test_client()
+    client.post('/api/register', json={'username': 'storm', 'email': 'storm@example.com', 'password': 'hunter22'})
+
+    baseline = measure_catalog(client, args.duration)
+
+    stop = threading.Event()
+    statuses = {}
+    lock = threading.Lock()
+
+    def login():
+        c = app.test_client()
+        while not stop.is_set():
+            code = c.post('/api/login', json={'email': 'storm@example.com', 'password': 'hunter22'}).status_code
+            with lock:
+                statuses[code] = statuses.get(code, 0) + 1
+
+    threads = [threading.Thread(target=login) for _ in range(args.login_threads)]
+    for t in threads:
+        t.start()
+    storm = measure_catalog(client, args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    print(f'{"":<14} {"p50 ms":>8} {"p99 ms":>8}')
+    print(f'{"catalog alone":<14} {percentile(baseline, 50):>8.2f} {percentile(baseline, 99):>8.2f}')
+    print(f'{"during storm":<14} {percentile(storm, 50):>8.2f} {percentile(storm, 99):>8.2f}')
+    stats = app.extensions['password_hasher'].stats()
+    print(f'logins by status: {statuses}')
+    print(f'hash jobs: {stats["jobs"]}, rejected: {stats["rejected"]}, timed out: {stats["timed_out"]}, '
+          f'mean queue wait: {1000 * stats["wait_sum"] / max(stats["jobs"], 1):.1f} ms, max: {1000 * stats["wait_max"]:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
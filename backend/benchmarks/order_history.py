@@ -0,0 +1,119 @@
+"""Recent-order latency vs. months of order history.
+
+    python benchmarks/order_history.py --months 1,12,36 --per-month 10000 --users 500
+
+For each history length N, seeds a scratch database with ``--per-month``
+orders in each of the last N months (ending now), spread over ``--users``
+users, and times through ``app.test_client()``:
+
+* the first page (``--limit`` orders) of ``GET /api/orders`` for a
+  logged-in user, who has about ``per-month / users`` orders a month;
+* the same with the admin token (all orders);
+* ``GET /api/orders/<id>`` of the user's newest order.
+
+Each is timed warm and cold, the latter right after the pool's connections
+were closed (SQLite's page cache empty and partitions re-attached; the OS
+page cache stays warm). With monthly partitions both should stay flat as
+the history grows; older months are never opened.
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from common import load_app
+from datagen import PASSWORD, generate, insert_orders, order_count
+from order_partitions import OrderPartitions, month_bounds, month_of, new_order_id, partition_dir
+
+BATCH = 20000
+ADMIN_TOKEN = 'order-history'
+
+
+def seed(db_path, months, per_month, users, rng):
+    generate(db_path, products=1000, users=users)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA synchronous = OFF')
+    partitions = OrderPartitions(partition_dir(db_path))
+    try:
+        user_ids = [r[0] for r in conn.execute('SELECT id FROM users ORDER BY username')]
+        conn.execute("INSERT OR IGNORE INTO customers (id, name, email, phone) VALUES (1, 'Bench', 'bench@example.com', '000')")
+        conn.execute("INSERT OR IGNORE INTO addresses (id, street, city, state, zip_code, country) "
+                     "VALUES (1, '1 Main St', 'Pune', 'MH', '411001', 'India')")
+        conn.execute("INSERT OR IGNORE INTO product_snapshots (id, product_id, name, image_url) "
+                     "VALUES (1, 'p1', 'Bench product', 'https://example.com/p.jpg')")
+        now = time.time_ns() // 1000
+        month = month_of(now)
+        for _ in range(months):
+            start, end = month_bounds(month)
+            end = min(end, now)
+            orders, items = [], []
+            for _ in range(per_month):
+                created = rng.randrange(start, end)
+                oid = new_order_id(created, rng.getrandbits(74))
+                orders.append((oid, rng.choice(user_ids), 1, 1, 1, 1999, 'Cash on Delivery', 'confirmed', 'pending',
+                               '5-7 business days', created))
+                items.append((oid, 1, 1, 1, 'M', 1999))
+                if len(orders) == BATCH:
+                    insert_orders(conn, partitions, orders, items)
+                    orders, items = [], []
+            insert_orders(conn, partitions, orders, items)
+            month = month_of(start - 1)
+        return order_count(conn, partitions)
+    finally:
+        conn.close()
+
+
+def timed(app, client, path, repeat, cold):
+    samples = []
+    for _ in range(repeat):
+        if cold:
+            app.extensions['db_pool'].close_all()
+        started = time.perf_counter()
+        resp = client.get(path)
+        resp.get_data()
+        samples.append(time.perf_counter() - started)
+        assert resp.status_code == 200, (path, resp.status_code)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--months', default='1,12,36')
+    parser.add_argument('--per-month', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    os.environ['ADMIN_TOKEN'] = ADMIN_TOKEN
+    print(f'{"months":>6} {"orders":>9} {"user warm":>10} {"user cold":>10} {"all warm":>9} {"all cold":>9} '
+          f'{"get warm":>9} {"get cold":>9}   (ms)')
+    for months in map(int, args.months.split(',')):
+        directory = tempfile.mkdtemp(prefix='stylesphere-history-')
+        db_path = os.path.join(directory, 'history.db')
+        count = seed(db_path, months, args.per_month, args.users, random.Random(months))
+        os.environ['SESSION_SQLITE_PATH'] = f'{db_path}.sessions'
+        app = load_app(db_path)
+        user = app.test_client()
+        if user.post('/api/login', json={'email': 'user0@example.com', 'password': PASSWORD}).status_code != 200:
+            raise SystemExit('login as user0 failed')
+        admin = app.test_client()
+        admin.environ_base['HTTP_X_ADMIN_TOKEN'] = ADMIN_TOKEN
+        newest = user.get('/api/orders?limit=1').get_json()['orders'][0]['id']
+        page = f'/api/orders?limit={args.limit}'
+        row = [timed(app, client, path, args.repeat, cold)
+               for client, path in ((user, page), (admin, page), (user, f'/api/orders/{newest}'))
+               for cold in (False, True)]
+        print(f'{months:>6} {count:>9} {row[0]:>10.2f} {row[1]:>10.2f} {row[2]:>9.2f} {row[3]:>9.2f} '
+              f'{row[4]:>9.2f} {row[5]:>9.2f}')
+        app.extensions['db_pool'].close_all()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
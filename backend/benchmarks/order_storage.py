@@ -0,0 +1,112 @@
+"""On-disk size of the order tables before and after migration 5.
+
+    python benchmarks/order_storage.py --orders 200000 --users 20000
+
+Builds a database at schema version 4 (flat orders: contact, address and
+product columns repeated on every row, ISO timestamps, REAL prices), fills it
+with synthetic orders, then applies the compact-storage migration. Sizes are
+measured with the dbstat virtual table after a VACUUM on each side, grouped
+by table (each table's indexes are counted with it).
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR
+from datagen import CITIES, SIZES, rand_id, seed_categories, seed_products, timestamp
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+import migrations  # noqa: E402
+
+ORDER_TABLES = ('orders', 'order_items', 'customers', 'addresses', 'product_snapshots')
+BATCH = 20000
+
+
+def seed_flat_orders(conn, rng, count, users, max_lines=3):
+    """Orders in the version 4 layout, one contact and address per user."""
+    products = conn.execute('SELECT id, name, image_url, price FROM products').fetchall()
+    user_ids = [rand_id(rng) for _ in range(users)]
+    orders, items = [], []
+    for _ in range(count):
+        n = rng.randrange(users)
+        city, state = CITIES[n % len(CITIES)]
+        oid = rand_id(rng)
+        lines = []
+        for line_no in range(1, rng.randint(1, max_lines) + 1):
+            pid, name, image, price = rng.choice(products)
+            quantity = rng.randint(1, 3)
+            lines.append((oid, line_no, pid, name, image, quantity, rng.choice(SIZES), price, round(price * quantity, 2)))
+        first = lines[0]
+        orders.append((oid, user_ids[n], first[2], first[3], first[4], sum(line[5] for line in lines), first[6], first[7],
+                       round(sum(line[8] for line in lines), 2), f'Bench Customer {n}', f'customer{n}@example.com',
+                       f'9{n:09d}', f'{n % 999 + 1} Main St', city, state, f'{110000 + n % 750000}', 'India',
+                       'Cash on Delivery', 'confirmed', 'pending', '5-7 business days', timestamp(rng)))
+        items.extend(lines)
+        if len(orders) == BATCH:
+            conn.executemany(f'INSERT INTO orders VALUES ({", ".join("?" * 22)})', orders)
+            conn.executemany(f'INSERT INTO order_items VALUES ({", ".join("?" * 9)})', items)
+            conn.commit()
+            orders, items = [], []
+    if orders:
+        conn.executemany(f'INSERT INTO orders VALUES ({", ".join("?" * 22)})', orders)
+        conn.executemany(f'INSERT INTO order_items VALUES ({", ".join("?" * 9)})', items)
+    conn.commit()
+
+
+def table_sizes(conn):
+    conn.execute('VACUUM')
+    owners = {name: table for name, table in conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')")}
+    sizes = {}
+    for name, size in conn.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name'):
+        table = owners.get(name, name)
+        sizes[table] = sizes.get(table, 0) + size
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    return sizes, conn.execute('PRAGMA page_count').fetchone()[0] * page_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(prefix='stylesphere-orders-', suffix='.db')
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    try:
+        rng = random.Random(args.seed)
+        migrations.migrate(conn, target=4)
+        seed_products(conn, rng, args.products, seed_categories(conn, rng))
+        seed_flat_orders(conn, rng, args.orders, args.users)
+        before, file_before = table_sizes(conn)
+
+        started = time.perf_counter()
+        # Up to the compact layout only; migration 8 moves orders out of this file
+        migrations.migrate(conn, target=5)
+        elapsed = time.perf_counter() - started
+        after, file_after = table_sizes(conn)
+    finally:
+        conn.close()
+        os.remove(path)
+
+    print(f'{args.orders} orders, migrated in {elapsed:.1f}s')
+    print(f'{"table":<20} {"before KiB":>11} {"after KiB":>10}')
+    for table in ORDER_TABLES:
+        print(f'{table:<20} {before.get(table, 0) / 1024:>11.0f} {after.get(table, 0) / 1024:>10.0f}')
+    order_before = sum(before.get(t, 0) for t in ORDER_TABLES)
+    order_after = sum(after.get(t, 0) for t in ORDER_TABLES)
+    print(f'{"order tables":<20} {order_before / 1024:>11.0f} {order_after / 1024:>10.0f}'
+          f'   ({1 - order_after / order_before:.0%} smaller, {order_before / args.orders:.0f} -> '
+          f'{order_after / args.orders:.0f} bytes/order)')
+    print(f'{"whole file":<20} {file_before / 1024:>11.0f} {file_after / 1024:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Checkout throughput with and without the group-commit writer.
+
+    python benchmarks/order_throughput.py --threads 16 --duration 5
+
+Each mode gets a fresh database and ``--threads`` clients placing one-line
+orders for random products (with stock to spare) for ``--duration`` seconds:
+
+* ``per-order``: every checkout commits on its own connection
+  (``synchronous = NORMAL``, the pool default; not durable on power loss)
+* ``per-order durable``: the same with ``synchronous = FULL``, one fsync per order
+* ``group``: checkouts handed to the group-commit writer (``synchronous = FULL``)
+"""
+import argparse
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from common import load_app, percentile
+from datagen import order_count
+from oversell_stress import order_payload
+
+MODES = {
+    'per-order': ('0', 'NORMAL'),
+    'per-order durable': ('0', 'FULL'),
+    'group': ('1', 'FULL'),
+}
+
+
+def run(mode, threads, duration, products):
+    group, synchronous = MODES[mode]
+    os.environ['ORDER_GROUP_COMMIT'] = group
+    app = load_app()
+    pool = app.extensions['db_pool']
+    pool.pragmas['synchronous'] = synchronous
+    conn = pool.connect()
+    now = datetime.now(timezone.utc).isoformat()
+    skus = [str(uuid.uuid4()) for _ in range(products)]
+    conn.executemany('''INSERT INTO products (id, name, description, price, category_id, category_name, image_url, stock, created_at)
+                        VALUES (?, ?, '', 9.99, NULL, NULL, '', 1000000000, ?)''',
+                     [(sku, f'Bench SKU {i}', now) for i, sku in enumerate(skus)])
+    conn.commit()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        mine, failed = [], 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            resp = client.post('/api/orders', json=order_payload(rng.choice(skus), 1))
+            if resp.status_code == 201:
+                mine.append(time.perf_counter() - started)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in workers:
+        t.join()
+
+    stored = order_count(conn, app.extensions['order_partitions'])
+    conn.close()
+    writer = app.extensions.get('order_writer')
+    batch = writer.stats()['writes'] / max(writer.stats()['batches'], 1) if writer else 1.0
+    return {'orders': len(latencies), 'stored': stored, 'errors': errors[0], 'per_sec': len(latencies) / duration,
+            'p50': percentile(latencies, 50), 'p99': percentile(latencies, 99), 'batch': batch}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--modes', default=','.join(MODES), help='comma-separated subset of: ' + ', '.join(MODES))
+    args = parser.parse_args()
+
+    print(f'{"mode":<18} {"orders/s":>9} {"p50 ms":>7} {"p99 ms":>7} {"batch":>6} {"errors":>7}')
+    for mode in args.modes.split(','):
+        r = run(mode, args.threads, args.duration, args.products)
+        if r['stored'] != r['orders']:
+            print(f'{mode}: {r["orders"]} orders acknowledged but {r["stored"]} stored')
+        print(f'{mode:<18} {r["per_sec"]:>9.0f} {r["p50"] * 1000:>7.2f} {r["p99"] * 1000:>7.2f} '
+              f'{r["batch"]:>6.1f} {r["errors"]:>7}')
+
+
+if __name__ == '__main__':
+    main()
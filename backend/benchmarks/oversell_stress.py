@@ -0,0 +1,114 @@
+"""Flash-sale stress test: many threads ordering a few hot SKUs.
+
+    python benchmarks/oversell_stress.py --threads 16 --skus 3 --stock 500
+
+Every thread places orders for random hot SKUs until they are sold out and
+then keeps hammering for --tail seconds. The script exits non-zero if any
+SKU was oversold or if the units in order_items do not match the stock
+that was taken from products.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from common import load_app
+
+
+def order_payload(product_id, quantity):
+    return {
+        'product_id': product_id,
+        'quantity': quantity,
+        'size': 'M',
+        'customer_info': {'name': 'Flash', 'email': 'flash@example.com', 'phone': '000'},
+        'shipping_address': {'street': '1 Main St', 'city': 'Pune', 'state': 'MH', 'zip_code': '411001'},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--skus', type=int, default=3)
+    parser.add_argument('--stock', type=int, default=500)
+    parser.add_argument('--tail', type=float, default=2.0, help='seconds to keep ordering after sell-out')
+    args = parser.parse_args()
+
+    app = load_app()
+    conn = app.extensions['db_pool'].connect()
+    now = datetime.now(timezone.utc).isoformat()
+    skus = [str(uuid.uuid4()) for _ in range(args.skus)]
+    conn.executemany('''INSERT INTO products (id, name, description, price, category_id, category_name, image_url, stock, created_at)
+                        VALUES (?, ?, '', 9.99, NULL, NULL, '', ?, ?)''',
+                     [(sku, f'Hot SKU {i}', args.stock, now) for i, sku in enumerate(skus)])
+    conn.commit()
+
+    sold_out = threading.Event()
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {'ok': 0, 'rejected': 0, 'errors': 0, 'units': dict.fromkeys(skus, 0)}
+    sellout_at = [None]
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        while not stop.is_set():
+            sku = rng.choice(skus)
+            quantity = rng.randint(1, 3)
+            resp = client.post('/api/orders', json=order_payload(sku, quantity))
+            with lock:
+                if resp.status_code == 201:
+                    stats['ok'] += 1
+                    stats['units'][sku] += quantity
+                elif resp.status_code == 400:
+                    stats['rejected'] += 1
+                else:
+                    stats['errors'] += 1
+
+    def watch():
+        while not stop.is_set():
+            if all(app.extensions['inventory'].available.get(sku, 1) <= 0 for sku in skus):
+                sellout_at[0] = time.perf_counter()
+                sold_out.set()
+                return
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    watcher = threading.Thread(target=watch)
+    started = time.perf_counter()
+    for t in threads + [watcher]:
+        t.start()
+    if not sold_out.wait(timeout=300):
+        print('did not sell out within 300s')
+    with lock:
+        before_tail = stats['ok'] + stats['rejected'] + stats['errors']
+    time.sleep(args.tail)
+    stop.set()
+    for t in threads + [watcher]:
+        t.join()
+    finished = time.perf_counter()
+
+    total = stats['ok'] + stats['rejected'] + stats['errors']
+    sellout = (sellout_at[0] or finished) - started
+    print(f'orders placed:      {stats["ok"]} in {sellout:.2f}s ({stats["ok"] / sellout:.0f} orders/s)')
+    print(f'sold-out rejections: {total - before_tail} in {args.tail:.1f}s ({(total - before_tail) / args.tail:.0f} req/s)')
+    print(f'rejected (total):   {stats["rejected"]}, errors: {stats["errors"]}')
+
+    failed = stats['errors'] > 0
+    partitions = app.extensions['order_partitions']
+    for sku in skus:
+        stock = conn.execute('SELECT stock FROM products WHERE id = ?', (sku,)).fetchone()['stock']
+        units = sum(conn.execute(f'''SELECT COALESCE(SUM(i.quantity), 0) AS n FROM {partitions.attach(conn, month)}.order_items i
+                                     JOIN product_snapshots s ON s.id = i.snapshot_id WHERE s.product_id = ?''',
+                                 (sku,)).fetchone()['n'] for month in partitions.months(conn))
+        ok = stock >= 0 and units == args.stock - stock == stats['units'][sku]
+        failed |= not ok
+        print(f'{sku[:8]}: stock left {stock}, units sold {units} / {args.stock} {"OK" if ok else "MISMATCH"}')
+    conn.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
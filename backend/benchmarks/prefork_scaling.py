@@ -0,0 +1,118 @@
+"""Pre-forked workers: throughput, warm-up and memory per worker.
+
+    python benchmarks/prefork_scaling.py --products 20000 --workers 1,2,4 --duration 10
+
+Seeds ``--db`` with datagen.py if it does not exist yet, then starts
+prefork.py with each worker count, with and without the shared catalog
+snapshot (plus the single-process threaded server as a baseline), and for
+each reports:
+
+* startup: seconds until the server answers (the snapshot is rendered
+  before the workers fork, so it shows up here);
+* cold ms: mean latency of the first request for each of ``--cold``
+  product pages, i.e. what freshly started workers serve before their
+  caches are warm;
+* req/s and p99 under the asyncio client from async_serving.py, over
+  product pages, first pages and category listings;
+* USS and PSS (MiB) per worker after the run, from
+  ``/proc/<pid>/smaps_rollup``: memory only that worker holds, and its
+  share of pages mapped by several (the forked heap, the snapshot).
+
+Extra workers only add throughput with spare cores; check ``nproc`` before
+reading the req/s column.
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import time
+import urllib.request
+
+from async_serving import drive
+from common import free_port, percentile, start_server
+from datagen import generate
+
+
+def workers_of(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            children = [int(c) for c in f.read().split()]
+    except OSError:
+        return []
+    return children or [pid]
+
+
+def memory(pid):
+    """(USS, PSS) of ``pid`` in MiB."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if rest.strip().endswith('kB'):
+                values[name] = int(rest.split()[0])
+    uss = values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+    return uss / 1024, values.get('Pss', 0) / 1024
+
+
+def cold_pass(port, paths):
+    started = time.perf_counter()
+    for path in paths:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}') as resp:
+            resp.read()
+    return (time.perf_counter() - started) / len(paths)
+
+
+def run(db_path, mode, args, cold_paths, paths, connections, duration):
+    port = free_port()
+    started = time.perf_counter()
+    proc, _ = start_server(mode, port, db_path, args)
+    startup = time.perf_counter() - started
+    try:
+        cold = cold_pass(port, cold_paths)
+        latencies, errors, elapsed = asyncio.run(drive(port, paths, connections, duration))
+        usage = [memory(pid) for pid in workers_of(proc.pid)]
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {
+        'startup': startup, 'cold': cold, 'rps': len(latencies) / elapsed,
+        'p99': percentile(latencies, 99), 'errors': len(errors),
+        'uss': sum(u for u, _ in usage) / len(usage), 'pss': sum(p for _, p in usage) / len(usage),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='/tmp/stylesphere-prefork.db')
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--cold', type=int, default=500, help='Product pages requested once right after startup.')
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        generate(args.db, args.products)
+    conn = sqlite3.connect(args.db)
+    products = [f'/api/products/{p}' for p, in conn.execute(
+        'SELECT id FROM products ORDER BY created_at DESC, id DESC LIMIT ?', (args.cold,))]
+    listings = ['/api/categories', '/api/products'] + [f'/api/products?category_id={c}'
+                                                        for c, in conn.execute('SELECT id FROM categories')]
+    conn.close()
+    print(f'{os.cpu_count()} CPUs, {args.products} products')
+
+    runs = [('threaded', 1, 'threaded', [])]
+    for n in map(int, args.workers.split(',')):
+        runs.append(('snapshot', n, 'prefork', ['--workers', str(n)]))
+        runs.append(('no snapshot', n, 'prefork', ['--workers', str(n), '--no-snapshot']))
+
+    print(f'{"server":<12} {"workers":>7} {"startup s":>9} {"cold ms":>8} {"req/s":>7} {"p99 ms":>7} '
+          f'{"errors":>6} {"USS MiB":>8} {"PSS MiB":>8}')
+    for name, n, mode, extra in runs:
+        r = run(args.db, mode, extra, products, listings + products, args.connections, args.duration)
+        print(f'{name:<12} {n:>7} {r["startup"]:>9.2f} {r["cold"] * 1000:>8.2f} {r["rps"]:>7.0f} '
+              f'{r["p99"] * 1000:>7.1f} {r["errors"]:>6} {r["uss"]:>8.1f} {r["pss"]:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Query-plan regression check: every SQL statement the API runs, at several table sizes.
+
+    python benchmarks/query_plans.py --scales 10000,100000,1000000 --out plans.json
+
+For each scale, seeds ``<--dir>/plans-<rows>.db`` with datagen.py (``rows``
+products and orders, a tenth as many users) if it does not exist yet. It then
+drives every route in suite.py once or twice through ``app.test_client()``,
+plus the admin dashboards, and records each statement the app's SQLite
+connections run. Statements are grouped under the same normalized label as
+``/api/metrics``. One executed example per statement gets an
+``EXPLAIN QUERY PLAN`` and a timing. Writes are planned but not re-run.
+
+A plan fails the check when it reads a whole table:
+
+* ``SCAN <table>`` with no index;
+* a full index scan (``SCAN <table> USING INDEX``) in a statement with no
+  ``LIMIT``;
+* a temporary B-tree for ``ORDER BY``, ``GROUP BY`` or ``DISTINCT``.
+
+Scans of subqueries, of ``SMALL_TABLES`` and FTS lookups are fine, and so
+are the statements in ``ALLOWED``, each with the reason it is bounded anyway. Failures on
+request-path statements exit 1. Admin dashboard statements are reported but
+do not fail the run. Examples are re-run with their parameters inlined, the
+way the trace reports them; a plan that only differs with bound parameters
+will not show up here.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+
+from common import load_app
+from datagen import EPOCH, PASSWORD, generate
+from suite import ENDPOINTS, TestClientSession, fixtures, worker_context
+
+import metrics  # noqa: E402  (backend/ is on sys.path once datagen is imported)
+import sales  # noqa: E402
+from order_partitions import OrderPartitions, partition_dir  # noqa: E402
+
+ADMIN_TOKEN = 'query-plans'
+
+# (label, path) of routes outside the request path: planned and reported, never fatal
+ADMIN_PATHS = [
+    ('sales_daily', '/api/admin/sales/daily?from={first}&to={last}'),
+    ('sales_categories', '/api/admin/sales/categories?from={first}&to={last}'),
+    ('sales_top_products', '/api/admin/sales/products?from={first}&to={last}'),
+    ('sales_product', '/api/admin/sales/products?product_id={product}&from={first}&to={last}'),
+]
+
+# Tables small by construction; scanning them is fine (FTS5 reads its own
+# few-row config table with a statement of its own; there is one partition
+# per month, and every recovery pass empties the partitions' journals)
+SMALL_TABLES = {'categories', 'products_fts_config', 'order_partitions', 'journal'}
+
+# Normalized statements (regex) whose flagged plan is bounded for another reason
+ALLOWED = {
+    r'^SELECT category_id, NULL, COUNT\(\*\) FROM products INDEXED BY idx_products_category_price':
+        'facet counts cover the whole filtered catalog by design; cached under a tag only catalog writes touch',
+    r'^SELECT p\.id, .* FROM \(SELECT products_fts\.rowid':
+        'sorts at most SEARCH_CANDIDATES full-text matches',
+}
+
+DML = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+SCAN = re.compile(r'^SCAN (?:[\w-]+\.)?(\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+PARTITION = re.compile(r'"(\d{4}-\d{2})"\.')
+
+
+class Recorder:
+    """Trace callback collecting the first executed example of each statement."""
+
+    def __init__(self):
+        self.route = None
+        self.statements = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, sql):
+        if not sql.lstrip().upper().startswith(DML):
+            return
+        label = metrics.normalize_sql(sql)
+        with self._lock:
+            entry = self.statements.setdefault(label, {'example': sql, 'routes': set()})
+            entry['routes'].add(self.route)
+
+    def install(self, app):
+        """Trace every connection the app's pool opens from now on (the
+        group-commit writer opens its own through the same pool)."""
+        pool = app.extensions['db_pool']
+        recorder = self
+
+        class TracedConnection(pool.factory):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.set_trace_callback(recorder)
+
+        pool.close_all()
+        pool.factory = TracedConnection
+
+
+def check_plan(conn, sql):
+    """``(plan lines, problems)`` for one statement."""
+    plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+    # Plans name tables by their alias; these are subqueries, not tables
+    subqueries = {detail.split()[-1] for detail in plan if detail.startswith(('MATERIALIZE ', 'CO-ROUTINE '))}
+    problems = []
+    for detail in plan:
+        if detail.startswith('USE TEMP B-TREE'):
+            problems.append(detail)
+            continue
+        match = SCAN.match(detail)
+        if match is None or 'VIRTUAL TABLE' in detail:
+            continue
+        if match.group(1) in subqueries or match.group(1) in SMALL_TABLES:
+            continue
+        if match.group(2) is None:
+            problems.append(detail)
+        elif not LIMIT.search(sql):
+            problems.append(f'{detail} (no LIMIT)')
+    return plan, problems
+
+
+def timed(conn, sql, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(sql).fetchall()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def exercise(app, db_path, recorder, rounds):
+    """Drive every suite route (and the admin dashboards) through the app."""
+    session = TestClientSession(app)
+    ctx = worker_context(fixtures(db_path, 1), session, db_path, 0)
+    # The last 30 days of datagen's year of orders (the routes above add more today)
+    last = (EPOCH.date() - sales.EPOCH_DAY).days + 364
+    dates = {'first': sales.day_iso(last - 29), 'last': sales.day_iso(last), 'product': ctx['products'][0]}
+    rng = random.Random(0)
+    for n in range(rounds):
+        for endpoint in ENDPOINTS:
+            recorder.route = endpoint.name
+            path, body = endpoint.build(ctx, rng, n)
+            session.request(endpoint.method, path, body, anonymous=endpoint.anonymous)
+            if endpoint.name == 'logout':
+                session.request('POST', '/api/login', {'email': ctx['email'], 'password': PASSWORD})
+    admin = app.test_client()
+    for name, path in ADMIN_PATHS:
+        recorder.route = f'admin:{name}'
+        admin.get(path.format(**dates), headers={'X-Admin-Token': ADMIN_TOKEN}).get_data()
+    recorder.route = None
+
+
+def run_scale(rows, directory, rounds, repeat):
+    db_path = os.path.join(directory, f'plans-{rows}.db')
+    if not os.path.exists(db_path):
+        generate(db_path, products=rows, users=max(rows // 10, 10), orders=rows)
+    app = load_app(db_path)
+    recorder = Recorder()
+    recorder.install(app)
+    exercise(app, db_path, recorder, rounds)
+
+    conn = sqlite3.connect(db_path)
+    partitions = OrderPartitions(partition_dir(db_path))
+    results = {}
+    try:
+        for label, entry in recorder.statements.items():
+            sql = entry['example']
+            # Order statements name their monthly partition
+            for month in set(PARTITION.findall(sql)):
+                partitions.attach(conn, month)
+            plan, problems = check_plan(conn, sql)
+            allowed = next((reason for pattern, reason in ALLOWED.items() if re.match(pattern, label)), None)
+            reads = sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+            results[label] = {
+                'routes': sorted(r for r in entry['routes'] if r),
+                'hot': any(r and not r.startswith('admin:') for r in entry['routes']),
+                'plan': plan,
+                'problems': problems,
+                'allowed': allowed,
+                'ms': round(timed(conn, sql, repeat) * 1000, 3) if reads else None,
+            }
+    finally:
+        conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', default='/tmp', help='where the seeded databases are kept between runs')
+    parser.add_argument('--scales', default='10000,100000,1000000', help='products and orders per database')
+    parser.add_argument('--rounds', type=int, default=2, help='passes over the routes per scale')
+    parser.add_argument('--repeat', type=int, default=5, help='timed executions per statement')
+    parser.add_argument('--out', help='write plans and timings as JSON')
+    args = parser.parse_args()
+
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    os.environ['ADMIN_TOKEN'] = ADMIN_TOKEN
+    scales = [int(s) for s in args.scales.split(',')]
+    report = {rows: run_scale(rows, args.dir, args.rounds, args.repeat) for rows in scales}
+
+    labels = sorted({label for results in report.values() for label in results})
+    failures = 0
+    print(f'{"statement":<72} ' + ' '.join(f'{rows:>7} ms' for rows in scales) + f' {"growth":>7}  plan')
+    for label in labels:
+        seen = [report[rows].get(label) for rows in scales]
+        problems = sorted({p for r in seen if r for p in r['problems']})
+        first = next(r for r in seen if r)
+        if not problems:
+            verdict = 'ok'
+        elif first['allowed']:
+            verdict = f'allowed: {first["allowed"]}'
+        elif first['hot']:
+            verdict = 'FAIL'
+            failures += 1
+        else:
+            verdict = 'warn (admin)'
+        timings = ' '.join(f'{"-" if r is None or r["ms"] is None else format(r["ms"], ".3f"):>10}' for r in seen)
+        ms = [r['ms'] for r in seen if r and r['ms']]
+        growth = f'{ms[-1] / ms[0]:.1f}x' if len(ms) > 1 else '-'
+        print(f'{label[:72]:<72} {timings} {growth:>7}  {verdict}')
+        for problem in problems:
+            print(f'    {problem}   [{", ".join(first["routes"])}]')
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({str(rows): results for rows, results in report.items()}, f, indent=2)
+        print(f'wrote {args.out}')
+    print(f'{len(labels)} statements, {failures} full scan(s) or temp B-tree sort(s) on the request path')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
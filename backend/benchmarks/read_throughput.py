@@ -0,0 +1,91 @@
+"""Catalog read throughput vs. thread count, with an order writer running.
+
+    python benchmarks/read_throughput.py --threads 1,2,4,8 --duration 3
+
+Each reader thread hammers GET /api/products?category_id=... through its own
+test client while one writer thread keeps creating orders. With the pooled
+WAL connections, readers do not queue behind the writer's commit.
+"""
+import argparse
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from common import load_app
+
+
+def seed_products(conn, count):
+    categories = [r['id'] for r in conn.execute('SELECT id FROM categories')]
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [(str(uuid.uuid4()), f'Bench product {i}', 'Synthetic product used for benchmarking ' * 3,
+             19.99 + i % 50, categories[i % len(categories)], 'Bench', 'https://example.com/p.jpg', 10 ** 6, now)
+            for i in range(count)]
+    conn.executemany('''INSERT INTO products (id, name, description, price, category_id, category_name, image_url, stock, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+    conn.commit()
+    return categories
+
+
+def order_payload(product_id):
+    return {
+        'product_id': product_id,
+        'quantity': 1,
+        'size': 'M',
+        'customer_info': {'name': 'Bench', 'email': 'bench@example.com', 'phone': '000'},
+        'shipping_address': {'street': '1 Main St', 'city': 'Pune', 'state': 'MH', 'zip_code': '411001'},
+    }
+
+
+def run(app, threads, duration, categories, product_id):
+    stop = threading.Event()
+    counts = [0] * threads
+    writes = [0]
+
+    def reader(idx):
+        client = app.test_client()
+        n = 0
+        while not stop.is_set():
+            resp = client.get(f'/api/products?category_id={categories[n % len(categories)]}')
+            assert resp.status_code == 200
+            n += 1
+        counts[idx] = n
+
+    def writer():
+        client = app.test_client()
+        while not stop.is_set():
+            client.post('/api/orders', json=order_payload(product_id))
+            writes[0] += 1
+
+    workers = [threading.Thread(target=reader, args=(i,)) for i in range(threads)]
+    workers.append(threading.Thread(target=writer))
+    for t in workers:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in workers:
+        t.join()
+    return sum(counts) / duration, writes[0] / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', default='1,2,4,8')
+    parser.add_argument('--duration', type=float, default=3.0)
+    parser.add_argument('--products', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = load_app()
+    conn = app.extensions['db_pool'].connect()
+    categories = seed_products(conn, args.products)
+    product_id = conn.execute('SELECT id FROM products LIMIT 1').fetchone()['id']
+    conn.close()
+
+    print(f'{"threads":>8} {"reads/s":>10} {"writes/s":>10}')
+    for threads in [int(t) for t in args.threads.split(',')]:
+        reads, writes = run(app, threads, args.duration, categories, product_id)
+        print(f'{threads:>8} {reads:>10.1f} {writes:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
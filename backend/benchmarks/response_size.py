@@ -0,0 +1,56 @@
+"""Bytes on the wire and server time of catalog responses per Content-Encoding.
+
+    python benchmarks/response_size.py --products 2000 --requests 500
+
+Products are copies of the sample catalog (long Unsplash image URLs and
+descriptions). "cold" is the first request after the cache was cleared
+(query, serialization and compression), "warm" the mean over ``--requests``
+repeats served from the cached, already-compressed bytes.
+"""
+import argparse
+import time
+
+from common import load_app
+
+
+def seed(app, count):
+    import server
+    records = [(i, dict(p, name=f'{p["name"]} {i}')) for i, p in
+               enumerate((server.SAMPLE_PRODUCTS[i % len(server.SAMPLE_PRODUCTS)] for i in range(count)), 1)]
+    with app.app_context():
+        server.import_catalog(server.get_db(), records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    app = load_app()
+    import compression
+    seed(app, args.products)
+    client = app.test_client()
+    cache = app.extensions['catalog_cache']
+    paths = ['/api/products?limit=100', '/api/products?limit=20', '/api/categories']
+
+    print(f'{"path":<26} {"encoding":>8} {"bytes":>8} {"ratio":>6} {"cold ms":>8} {"warm ms":>8}')
+    for path in paths:
+        identity = None
+        for encoding in ('identity',) + compression.ENCODINGS:
+            headers = {'Accept-Encoding': encoding}
+            cache.clear()
+            started = time.perf_counter()
+            resp = client.get(path, headers=headers)
+            cold = time.perf_counter() - started
+            size = len(resp.data)
+            identity = identity or size
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                client.get(path, headers=headers)
+            warm = (time.perf_counter() - started) / args.requests
+            print(f'{path:<26} {encoding:>8} {size:>8} {size / identity:>6.2f} {cold * 1000:>8.2f} {warm * 1000:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
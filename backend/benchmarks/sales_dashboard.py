@@ -0,0 +1,92 @@
+"""Dashboard queries from the daily sales aggregates vs. scanning orders.
+
+    python benchmarks/sales_dashboard.py --db /tmp/sales.db --orders 500000 --days 30
+
+Seeds ``--db`` with datagen.py if it does not exist yet (orders are spread
+over a year), then times each dashboard query over the last ``--days`` days
+of orders, once through sales.py and once computed from the order tables
+(of each monthly partition in range; rows are not merged across months).
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+from common import BACKEND_DIR
+from datagen import generate, order_count
+
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+import sales  # noqa: E402
+from order_partitions import OrderPartitions, month_of, partition_dir  # noqa: E402
+
+US = sales.US_PER_DAY
+
+RAW = {
+    'daily': f'''SELECT created_at / {US}, COUNT(*), SUM(quantity), SUM(total_cents) FROM {{schema}}.orders
+                 WHERE created_at BETWEEN ? AND ? GROUP BY 1''',
+    'categories': f'''SELECT o.created_at / {US}, p.category_id, COUNT(DISTINCT o.id), SUM(i.quantity),
+                             SUM(i.quantity * i.unit_cents)
+                      FROM {{schema}}.orders o JOIN {{schema}}.order_items i ON i.order_id = o.id
+                      JOIN product_snapshots s ON s.id = i.snapshot_id LEFT JOIN products p ON p.id = s.product_id
+                      WHERE o.created_at BETWEEN ? AND ? GROUP BY 1, 2''',
+    'top products': '''SELECT s.product_id, SUM(i.quantity * i.unit_cents) AS revenue
+                       FROM {schema}.orders o JOIN {schema}.order_items i ON i.order_id = o.id
+                       JOIN product_snapshots s ON s.id = i.snapshot_id
+                       WHERE o.created_at BETWEEN ? AND ? GROUP BY 1 ORDER BY revenue DESC LIMIT 20''',
+}
+
+AGGREGATE = {
+    'daily': sales.daily,
+    'categories': sales.by_category,
+    'top products': sales.top_products,
+}
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='/tmp/stylesphere-sales.db')
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--orders', type=int, default=500000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        generate(args.db, args.products, args.users, args.orders)
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    partitions = OrderPartitions(partition_dir(args.db))
+    total = order_count(conn, partitions)
+    newest_month = partitions.months(conn)[0]
+    newest = conn.execute(f'SELECT MAX(created_at) FROM {partitions.attach(conn, newest_month)}.orders').fetchone()[0]
+    last = sales.day_number(newest)
+    first = last - args.days + 1
+    schemas = [partitions.attach(conn, month) for month in partitions.months(conn, first=month_of(first * US))]
+    in_range = sum(conn.execute(f'SELECT COUNT(*) FROM {schema}.orders WHERE created_at >= ?', (first * US,)).fetchone()[0]
+                   for schema in schemas)
+    print(f'{args.days} days in {len(schemas)} partition(s), {in_range} of {total} orders')
+
+    print(f'{"query":<14} {"aggregates ms":>14} {"orders scan ms":>15}')
+    for name, query in RAW.items():
+        aggregate = timed(lambda: AGGREGATE[name](conn, first, last), args.repeat)
+        raw = timed(lambda: [conn.execute(query.format(schema=schema), (first * US, (last + 1) * US - 1)).fetchall()
+                             for schema in schemas], args.repeat)
+        print(f'{name:<14} {aggregate * 1000:>14.2f} {raw * 1000:>15.2f}')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Latency of GET /api/products/search on a large synthetic catalog.
+
+    python benchmarks/search_latency.py --products 300000
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+from common import load_app, percentile
+
+ADJECTIVES = ['classic', 'slim', 'relaxed', 'vintage', 'organic', 'linen', 'denim', 'woven', 'knit',
+              'quilted', 'pleated', 'floral', 'striped', 'tailored', 'cropped', 'oversized', 'satin', 'wool',
+              'cashmere', 'leather', 'suede', 'corduroy', 'ribbed', 'printed', 'embroidered', 'sleeveless',
+              'padded', 'hooded', 'waterproof', 'lightweight', 'fitted', 'boxy', 'wrap', 'tiered', 'ruched']
+COLORS = ['black', 'white', 'navy', 'olive', 'rust', 'ivory', 'charcoal', 'burgundy', 'sage', 'camel',
+          'cobalt', 'blush', 'mustard', 'teal', 'taupe', 'lilac', 'khaki', 'coral', 'indigo', 'cream']
+NOUNS = ['shirt', 'dress', 'jacket', 'trousers', 'skirt', 'hoodie', 'sweater', 'blazer', 'shorts',
+         'jeans', 'coat', 'cardigan', 'tee', 'camisole', 'jumpsuit', 'pajamas', 'socks', 'scarf', 'vest',
+         'parka', 'polo', 'chinos', 'leggings', 'kimono', 'tunic', 'poncho', 'bodysuit', 'romper', 'gilet',
+         'overshirt', 'anorak', 'culottes', 'joggers', 'bralette', 'briefs', 'boxers', 'beanie', 'gloves']
+QUERIES = ['shirt', 'dr', 'denim jack', 'organic cotton tee', 'vintage wool coat', 'pleat', 'satin cam']
+
+
+def vocabulary(rng, size=4000):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)]
+
+
+def seed(conn, count, rng):
+    """Insert ``count`` products whose names and descriptions have a
+    realistic term distribution: a fashion vocabulary for names and a long,
+    Zipf-skewed tail of words for descriptions."""
+    categories = [(r['id'], r['name']) for r in conn.execute('SELECT id, name FROM categories')]
+    words = vocabulary(rng) + ADJECTIVES + NOUNS + ['cotton', 'soft', 'breathable', 'stretch', 'comfortable']
+    weights = [1.0 / (rank + 1) for rank in range(len(words))]
+    rng.shuffle(words)
+    brands = vocabulary(rng, 500)
+    now = datetime.now(timezone.utc).isoformat()
+    batch = []
+    for i in range(count):
+        cat_id, cat_name = categories[i % len(categories)]
+        name = f'{rng.choice(brands)} {rng.choice(COLORS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}'
+        description = ' '.join(rng.choices(words, weights, k=14))
+        batch.append((str(uuid.uuid4()), name.title(), description, 10 + i % 200,
+                      cat_id, cat_name, 'https://example.com/p.jpg', 50, now))
+        if len(batch) == 10000:
+            conn.executemany('INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+            batch = []
+    if batch:
+        conn.executemany('INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+    conn.commit()
+    return [c[0] for c in categories]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=300000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = load_app()
+    conn = app.extensions['db_pool'].connect()
+    started = time.perf_counter()
+    categories = seed(conn, args.products, random.Random(42))
+    print(f'seeded {args.products} products in {time.perf_counter() - started:.1f}s')
+    conn.close()
+
+    client = app.test_client()
+    print(f'{"query":<24} {"p50 ms":>8} {"p99 ms":>8}')
+    for query in QUERIES:
+        for category in (None, categories[0]):
+            url = f'/api/products/search?q={query}' + (f'&category_id={category}' if category else '')
+            samples = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                assert client.get(url).status_code == 200
+                samples.append((time.perf_counter() - t0) * 1000)
+            label = query + (' +cat' if category else '')
+            print(f'{label:<24} {percentile(samples, 50):>8.2f} {percentile(samples, 99):>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
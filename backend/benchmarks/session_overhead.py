@@ -0,0 +1,63 @@
+"""Per-request session overhead of the memory, sqlite and cookie backends.
+
+    python benchmarks/session_overhead.py --requests 5000
+
+For each backend this times open_session + save_session for a logged-in,
+unmodified session (the common authenticated read) and for a modified one,
+plus the end-to-end latency of GET /api/check-auth.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import load_app, percentile
+
+
+def time_interface(app, cookie_header, requests, modify):
+    interface = app.session_interface
+    samples = []
+    for i in range(requests):
+        with app.test_request_context('/api/check-auth', headers={'Cookie': cookie_header}) as ctx:
+            response = app.response_class()
+            t0 = time.perf_counter()
+            sess = interface.open_session(app, ctx.request)
+            if modify:
+                sess['counter'] = i
+            interface.save_session(app, sess, response)
+            samples.append((time.perf_counter() - t0) * 1e6)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    os.environ['SESSION_SQLITE_PATH'] = tempfile.mktemp(prefix='stylesphere-sessions-', suffix='.db')
+    app = load_app()
+    import sessions
+
+    print(f'{"backend":<8} {"read p50 us":>12} {"read p99 us":>12} {"write p50 us":>13} {"check-auth p50 ms":>18}')
+    for backend in ('memory', 'sqlite', 'cookie'):
+        app.config['SESSION_BACKEND'] = backend
+        sessions.init_app(app)
+        client = app.test_client()
+        resp = client.post('/api/register', json={'username': f'bench-{backend}', 'email': f'{backend}@example.com',
+                                                  'password': 'hunter22'})
+        cookie = resp.headers['Set-Cookie'].split(';', 1)[0]
+
+        reads = time_interface(app, cookie, args.requests, modify=False)
+        writes = time_interface(app, cookie, args.requests // 5, modify=True)
+        e2e = []
+        for _ in range(args.requests // 5):
+            t0 = time.perf_counter()
+            assert client.get('/api/check-auth').json['authenticated']
+            e2e.append((time.perf_counter() - t0) * 1000)
+        print(f'{backend:<8} {percentile(reads, 50):>12.1f} {percentile(reads, 99):>12.1f} '
+              f'{percentile(writes, 50):>13.1f} {percentile(e2e, 50):>18.3f}')
+
+
+if __name__ == '__main__':
+    main()
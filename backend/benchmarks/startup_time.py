@@ -0,0 +1,77 @@
+"""Cold-start cost of a worker: importing wsgi.py and serving its first request.
+
+    python benchmarks/startup_time.py --runs 10 --budget 1.0
+
+Each run is a fresh interpreter, the way a process manager boots or recycles
+a worker. The import must not touch the database (checked against a path that
+does not exist yet); the first request is timed against a fresh file, a
+migrated file without the schema marker, and one with it. Exits 1 if the
+import created the database or its median exceeds ``--budget`` seconds.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from common import BACKEND_DIR
+
+PROBE = '''
+import json, os, time
+started = time.perf_counter()
+import wsgi
+imported = time.perf_counter() - started
+touched = os.path.exists(os.environ["SQLITE_PATH"])
+started = time.perf_counter()
+status = wsgi.app.test_client().get("/api/categories").status_code
+first = time.perf_counter() - started
+print(json.dumps({"import": imported, "touched": touched, "first_request": first, "status": status}))
+'''
+
+
+def probe(db_path):
+    env = dict(os.environ, SQLITE_PATH=db_path, SESSION_SQLITE_PATH=f'{db_path}.sessions')
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=1.0, help='Maximum median import time in seconds.')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='stylesphere-startup-')
+    results = {'fresh': [], 'no marker': [], 'marker': []}
+    for i in range(args.runs):
+        db_path = os.path.join(tmp, f'{i}.db')
+        results['fresh'].append(probe(db_path))
+        os.remove(f'{db_path}.schema')
+        results['no marker'].append(probe(db_path))
+        results['marker'].append(probe(db_path))
+
+    print(f'{"database":<10} {"import ms":>10} {"first req ms":>13}')
+    for name, runs in results.items():
+        imported = statistics.median(r['import'] for r in runs) * 1000
+        first = statistics.median(r['first_request'] for r in runs) * 1000
+        print(f'{name:<10} {imported:>10.1f} {first:>13.1f}')
+
+    runs = [r for rs in results.values() for r in rs]
+    failures = []
+    if any(r['touched'] for r in results['fresh']):
+        failures.append('importing wsgi created the database')
+    if any(r['status'] != 200 for r in runs):
+        failures.append('first request failed')
+    median_import = statistics.median(r['import'] for r in runs)
+    if median_import > args.budget:
+        failures.append(f'median import {median_import:.3f}s is over the {args.budget}s budget')
+    for failure in failures:
+        print(f'FAIL: {failure}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
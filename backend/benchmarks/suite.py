@@ -0,0 +1,338 @@
+"""Per-endpoint throughput and latency for every API route, with run-to-run comparison.
+
+    python benchmarks/suite.py run --db /tmp/bench.db --products 1000000 --users 100000 --orders 1000000 \\
+        --targets client,http --out before.json
+    python benchmarks/suite.py run --db /tmp/bench.db --out after.json
+    python benchmarks/suite.py compare before.json after.json --threshold 0.10
+
+``run`` seeds ``--db`` with datagen.py if it does not exist yet (reusing it
+otherwise, so runs before and after a change see the same data), then drives
+each endpoint in turn with ``--concurrency`` worker threads for ``--duration``
+seconds. Each worker logs in as its own seeded user first. The ``client``
+target calls the app in-process through ``app.test_client()``; the ``http``
+target goes through a real werkzeug server in a subprocess. Results
+(requests/s and p50/p95/p99 in ms per endpoint) are written as JSON.
+
+``compare`` prints both runs side by side and exits non-zero when an
+endpoint lost more than ``--threshold`` of its throughput or its p99 grew by
+more than that fraction.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from common import BACKEND_DIR, free_port, load_app, percentile, start_server
+from datagen import PASSWORD, generate, order_count, user_order_ids
+from order_partitions import OrderPartitions, partition_dir
+from pagination import encode_cursor
+from search_latency import QUERIES
+
+
+class Endpoint:
+    """One benchmarked route. ``build(ctx, rng, n)`` returns ``(path, json_body)``."""
+
+    def __init__(self, name, method, build, ok=(200,), anonymous=False):
+        self.name = name
+        self.method = method
+        self.build = build
+        self.ok = ok
+        self.anonymous = anonymous
+
+
+def order_body(ctx, rng):
+    return {
+        'product_id': rng.choice(ctx['in_stock']),
+        'quantity': 1,
+        'size': 'M',
+        'customer_info': {'name': 'Bench', 'email': 'bench@example.com', 'phone': '000'},
+        'shipping_address': {'street': '1 Main St', 'city': 'Pune', 'state': 'MH', 'zip_code': '411001'},
+    }
+
+
+ENDPOINTS = [
+    Endpoint('root', 'GET', lambda ctx, rng, n: ('/api', None)),
+    Endpoint('categories', 'GET', lambda ctx, rng, n: ('/api/categories', None)),
+    Endpoint('products', 'GET', lambda ctx, rng, n: ('/api/products', None)),
+    Endpoint('products_by_category', 'GET',
+             lambda ctx, rng, n: (f'/api/products?category_id={rng.choice(ctx["categories"])}', None)),
+    Endpoint('products_next_page', 'GET', lambda ctx, rng, n: (f'/api/products?after={ctx["cursor"]}', None)),
+    Endpoint('products_filtered', 'GET', lambda ctx, rng, n: (
+        f'/api/products?category_id={rng.choice(ctx["categories"])},{rng.choice(ctx["categories"])}'
+        f'&min_price={rng.randrange(0, 100)}&max_price={rng.randrange(100, 300)}&in_stock=1&sort=price', None)),
+    Endpoint('products_by_name', 'GET',
+             lambda ctx, rng, n: (f'/api/products?category_id={rng.choice(ctx["categories"])}&sort=name', None)),
+    Endpoint('products_cards', 'GET', lambda ctx, rng, n: ('/api/products?fields=name,price,image_url', None)),
+    Endpoint('products_by_id', 'GET',
+             lambda ctx, rng, n: (f'/api/products?ids={",".join(rng.sample(ctx["products"], 10))}', None)),
+    Endpoint('search', 'GET', lambda ctx, rng, n: (f'/api/products/search?q={quote(rng.choice(QUERIES))}', None)),
+    Endpoint('product', 'GET', lambda ctx, rng, n: (f'/api/products/{rng.choice(ctx["products"])}', None)),
+    Endpoint('check_auth', 'GET', lambda ctx, rng, n: ('/api/check-auth', None)),
+    Endpoint('profile', 'GET', lambda ctx, rng, n: ('/api/profile', None)),
+    Endpoint('profile_update', 'PUT', lambda ctx, rng, n: ('/api/profile', {'full_name': f'Bench User {n}'})),
+    Endpoint('orders', 'GET', lambda ctx, rng, n: ('/api/orders?limit=20', None)),
+    Endpoint('order', 'GET', lambda ctx, rng, n: (f'/api/orders/{rng.choice(ctx["orders"])}', None), ok=(200, 404)),
+    Endpoint('orders_export', 'GET', lambda ctx, rng, n: ('/api/orders/export?format=ndjson', None)),
+    Endpoint('orders_create', 'POST', lambda ctx, rng, n: ('/api/orders', order_body(ctx, rng)), ok=(201,)),
+    Endpoint('login', 'POST', lambda ctx, rng, n: ('/api/login', {'email': ctx['email'], 'password': PASSWORD}),
+             anonymous=True),
+    Endpoint('register', 'POST', lambda ctx, rng, n: ('/api/register', {
+        'username': f'{ctx["run_id"]}-{n}', 'email': f'{ctx["run_id"]}-{n}@example.com', 'password': PASSWORD,
+    }), ok=(201,), anonymous=True),
+    Endpoint('logout', 'POST', lambda ctx, rng, n: ('/api/logout', None), anonymous=True),
+]
+
+
+class TestClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+        self.anonymous = app.test_client()
+
+    def request(self, method, path, body=None, anonymous=False):
+        client = self.anonymous if anonymous else self.client
+        resp = client.open(path, method=method, json=body)
+        resp.get_data()
+        return resp.status_code
+
+    def close(self):
+        pass
+
+
+class HTTPSession:
+    """Keeps the session cookie itself; http.client reconnects whenever the
+    server closes the connection."""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.cookie = None
+
+    def request(self, method, path, body=None, anonymous=False):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if self.cookie and not anonymous:
+            headers['Cookie'] = self.cookie
+        self.conn.request(method, path, payload, headers)
+        resp = self.conn.getresponse()
+        resp.read()
+        cookie = resp.getheader('Set-Cookie')
+        if cookie and not anonymous:
+            self.cookie = cookie.split(';', 1)[0]
+        return resp.status
+
+    def close(self):
+        self.conn.close()
+
+
+def fixtures(db_path, workers):
+    """Ids the request builders pick from, read straight from the database."""
+    conn = sqlite3.connect(db_path)
+    try:
+        users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        if users < workers:
+            raise SystemExit(f'--concurrency {workers} needs at least {workers} users (have {users})')
+        return {
+            'categories': [r[0] for r in conn.execute('SELECT id FROM categories')],
+            'products': [r[0] for r in conn.execute('SELECT id FROM products ORDER BY random() LIMIT 1000')],
+            'in_stock': [r[0] for r in conn.execute('SELECT id FROM products WHERE stock > 100 ORDER BY random() LIMIT 1000')],
+            'run_id': f'bench{int(time.time())}',
+        }
+    finally:
+        conn.close()
+
+
+def worker_context(shared, session, db_path, idx):
+    """Log worker ``idx`` in as ``user<idx>`` and collect ids it may read."""
+    ctx = dict(shared, email=f'user{idx}@example.com')
+    status = session.request('POST', '/api/login', {'email': ctx['email'], 'password': PASSWORD})
+    if status != 200:
+        raise SystemExit(f'login as {ctx["email"]} failed with {status}')
+    conn = sqlite3.connect(db_path)
+    try:
+        user_id = conn.execute('SELECT id FROM users WHERE email = ?', (ctx['email'],)).fetchone()[0]
+        ctx['orders'] = user_order_ids(conn, OrderPartitions(partition_dir(db_path)), user_id, 50)
+        row = conn.execute('SELECT created_at, id FROM products ORDER BY created_at, id LIMIT 1 OFFSET 49').fetchone()
+    finally:
+        conn.close()
+    ctx['cursor'] = encode_cursor(*row) if row else ''
+    ctx['orders'] = ctx['orders'] or ['missing']
+    return ctx
+
+
+def measure(endpoint, sessions, contexts, duration):
+    latencies = [[] for _ in sessions]
+    errors = [0] * len(sessions)
+    deadline = time.perf_counter() + duration
+
+    def work(idx):
+        rng = random.Random(idx)
+        session, ctx = sessions[idx], contexts[idx]
+        n = idx * 10 ** 7
+        while time.perf_counter() < deadline:
+            path, body = endpoint.build(ctx, rng, n)
+            n += 1
+            t0 = time.perf_counter()
+            try:
+                status = session.request(endpoint.method, path, body, anonymous=endpoint.anonymous)
+            except (OSError, http.client.HTTPException):
+                session.close()
+                errors[idx] += 1
+                continue
+            latencies[idx].append(time.perf_counter() - t0)
+            if status not in endpoint.ok:
+                errors[idx] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(len(sessions))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    samples = [s for per_worker in latencies for s in per_worker]
+    return {
+        'requests': len(samples),
+        'errors': sum(errors),
+        'rps': round(len(samples) / elapsed, 1),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def run_target(target, db_path, endpoints, concurrency, duration):
+    shared = fixtures(db_path, concurrency)
+    proc = None
+    if target == 'client':
+        app = load_app(db_path)
+        sessions = [TestClientSession(app) for _ in range(concurrency)]
+    else:
+        port = free_port()
+        proc, _ = start_server('threaded', port, db_path)
+        sessions = [HTTPSession(port) for _ in range(concurrency)]
+    try:
+        contexts = [worker_context(shared, s, db_path, i) for i, s in enumerate(sessions)]
+        results = {}
+        for endpoint in endpoints:
+            results[endpoint.name] = stats = measure(endpoint, sessions, contexts, duration)
+            print(f'{target:>7} {endpoint.name:<22} {stats["rps"]:>9.1f} {stats["p50_ms"]:>9.2f} '
+                  f'{stats["p95_ms"]:>9.2f} {stats["p99_ms"]:>9.2f} {stats["errors"]:>7}', flush=True)
+        return results
+    finally:
+        for s in sessions:
+            s.close()
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cmd_run(args):
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', str(args.bcrypt_rounds))
+    if not os.path.exists(args.db):
+        generate(args.db, args.products, args.users, args.orders, args.seed, args.bcrypt_rounds)
+    names = args.endpoints.split(',') if args.endpoints else [e.name for e in ENDPOINTS]
+    unknown = set(names) - {e.name for e in ENDPOINTS}
+    if unknown:
+        raise SystemExit(f'unknown endpoints: {", ".join(sorted(unknown))}')
+    endpoints = [e for e in ENDPOINTS if e.name in names]
+
+    conn = sqlite3.connect(args.db)
+    dataset = {t: conn.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0] for t in ('products', 'users')}
+    dataset['orders'] = order_count(conn, OrderPartitions(partition_dir(args.db)))
+    conn.close()
+    report = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'dataset': dataset,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+        },
+        'results': {},
+    }
+    print(f'{"target":>7} {"endpoint":<22} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"errors":>7}')
+    for target in args.targets.split(','):
+        report['results'][target] = run_target(target, args.db, endpoints, args.concurrency, args.duration)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'wrote {args.out}')
+
+
+def cmd_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)['results']
+    with open(args.head) as f:
+        head = json.load(f)['results']
+    regressions = 0
+    print(f'{"target":>7} {"endpoint":<22} {"req/s":>19} {"change":>7} {"p99 ms":>19} {"change":>7}')
+    for target in sorted(set(base) & set(head)):
+        for name in base[target]:
+            if name not in head[target]:
+                continue
+            old, new = base[target][name], head[target][name]
+            rps_change = new['rps'] / old['rps'] - 1 if old['rps'] else 0.0
+            p99_change = new['p99_ms'] / old['p99_ms'] - 1 if old['p99_ms'] else 0.0
+            flag = ''
+            if rps_change < -args.threshold or p99_change > args.threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f'{target:>7} {name:<22} {old["rps"]:>9.1f}{new["rps"]:>10.1f} {rps_change:>+7.1%} '
+                  f'{old["p99_ms"]:>9.2f}{new["p99_ms"]:>10.2f} {p99_change:>+7.1%}{flag}')
+    print(f'{regressions} regression(s) beyond {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='benchmark every endpoint and write a JSON report')
+    run.add_argument('--db', required=True, help='scratch database; seeded first if it does not exist')
+    run.add_argument('--products', type=int, default=100000)
+    run.add_argument('--users', type=int, default=10000)
+    run.add_argument('--orders', type=int, default=100000)
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--bcrypt-rounds', type=int, default=4)
+    run.add_argument('--targets', default='client,http')
+    run.add_argument('--endpoints', help='comma-separated subset of: ' + ', '.join(e.name for e in ENDPOINTS))
+    run.add_argument('--concurrency', type=int, default=8)
+    run.add_argument('--duration', type=float, default=3.0, help='seconds per endpoint')
+    run.add_argument('--out', default='benchmark-results.json')
+
+    compare = sub.add_parser('compare', help='flag endpoints that got slower between two reports')
+    compare.add_argument('base')
+    compare.add_argument('head')
+    compare.add_argument('--threshold', type=float, default=0.10)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        cmd_run(args)
+    else:
+        sys.exit(cmd_compare(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import compression
+
+
+class CachedResponse:
+    __slots__ = ('body', 'etag', 'tags', 'encoded', 'built', 'slots')
+
+    def __init__(self, body, tags, built=0, slots=()):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.tags = frozenset(tags)
+        self.encoded = {}
+        # With an InvalidationBoard: when the data was read, and the board
+        # slots of ``tags``
+        self.built = built
+        self.slots = slots
+
+    def encode(self, encoding):
+        """``body`` compressed with ``encoding``; computed on first use and
+        kept for as long as the entry is cached. (Two threads may both
+        compress a fresh entry; the results are identical.)"""
+        data = self.encoded.get(encoding)
+        if data is None:
+            data = self.encoded[encoding] = compression.compress(
+                self.body, encoding, compression.CACHED_LEVELS[encoding])
+        return data
+
+
+class CatalogCache:
+    """Read-through cache of serialized catalog responses.
+
+    Entries hold the exact JSON bytes sent to the client plus a strong ETag
+    derived from them, and the gzip/brotli variants of those bytes once a
+    client has asked for them. Each entry is tagged with what it was built from
+    (``product:<id>`` for every product it contains, ``products`` for listings,
+    ``categories``), so a stock change for one product only drops the
+    responses that actually include that product.
+
+    ``version`` is bumped on every invalidation; a load that raced with an
+    invalidation is served but not stored, so stale bytes never get cached.
+
+    Under pre-forked workers (prefork.py) ``board`` is the shared
+    ``InvalidationBoard``: invalidations are published to it and an entry is
+    only served while none of its tags was invalidated, by any process, since
+    it was built. ``snapshot`` is then the shared ``CatalogSnapshot``
+    consulted before loading from the database.
+
+    Bulk catalog writes (``flask import-catalog``, ``flask seed``) may run in
+    another process. ``clear_everywhere`` replaces the ``generation_path``
+    file next to the database, and every cache sharing it compares that
+    file's inode and mtime on each lookup (one ``stat``) and clears itself
+    when they changed.
+    """
+
+    def __init__(self, max_entries=1024, board=None, snapshot=None, generation_path=None):
+        self.max_entries = max_entries
+        self.board = board
+        self.snapshot = snapshot
+        self.generation_path = generation_path
+        self._generation = self._read_generation()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._by_tag = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if self.generation_path is not None:
+            generation = self._read_generation()
+            if generation != self._generation:
+                self._generation = generation
+                self.clear()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.board is not None and not self.board.fresh(entry.slots, entry.built):
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def get_or_load(self, key, loader):
+        """Return the cached entry for ``key``, building it with ``loader``.
+
+        ``loader()`` returns ``(body_bytes, tags)`` or ``None`` when there is
+        nothing to cache (e.g. an unknown product id).
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        if self.snapshot is not None:
+            entry = self.snapshot.get(key)
+            if entry is not None:
+                return entry
+        version = self.version
+        built = time.monotonic_ns()
+        loaded = loader()
+        if loaded is None:
+            return None
+        entry = CachedResponse(*loaded)
+        if self.board is not None:
+            entry.built = built
+            entry.slots = self.board.slots_for(entry.tags)
+        with self._lock:
+            if self.version == version:
+                self._store(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        self._discard(key)
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def put(self, key, entry):
+        """Store a ready-made ``entry`` (e.g. one carried over from a snapshot)."""
+        with self._lock:
+            self._store(key, entry)
+
+    def invalidate(self, *tags):
+        if self.board is not None:
+            self.board.touch(*tags)
+        with self._lock:
+            self.version += 1
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._discard(key)
+
+    def clear(self):
+        if self.board is not None:
+            self.board.touch_all()
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def clear_everywhere(self):
+        """``clear`` this cache and every other one sharing ``generation_path``."""
+        if self.generation_path is not None:
+            tmp = f'{self.generation_path}.{os.getpid()}'
+            with open(tmp, 'w') as f:
+                f.write(str(time.time_ns()))
+            # A new inode, so even two bumps within one mtime tick differ
+            os.replace(tmp, self.generation_path)
+            self._generation = self._read_generation()
+        self.clear()
+
+    def _read_generation(self):
+        if self.generation_path is None:
+            return None
+        try:
+            stat = os.stat(self.generation_path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries.items())
+
+    def stats(self):
+        stats = {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'version': self.version}
+        if self.snapshot is not None:
+            stats['snapshot_hits'] = self.snapshot.hits
+        return stats
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def generation_path(db_path):
+    """The generation file of the catalog in ``db_path`` (None in memory)."""
+    if not db_path or db_path == ':memory:' or db_path.startswith('file:'):
+        return None
+    return f'{db_path}.catalog-generation'
+
+
+def product_tag(product_id):
+    return f'product:{product_id}'
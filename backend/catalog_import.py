@@ -0,0 +1,202 @@
+import csv
+import io
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+
+BATCH_SIZE = 5000
+
+# Product ids are derived from the name, so importing the same file into an
+# empty database always produces the same ids.
+PRODUCT_NAMESPACE = uuid.UUID('0b6c3c5e-4a1e-4d55-9a52-2f5f8a6f1c11')
+CATEGORY_NAMESPACE = uuid.UUID('7d0e2f8e-3c5b-4c7a-8f0d-51a2d6b9e3a4')
+
+# Applied to the import connection only, and reset afterwards.
+IMPORT_PRAGMAS = {
+    'synchronous': 'OFF',
+    'cache_size': -262144,  # ~256 MB
+    'temp_store': 'MEMORY',
+}
+
+# Indexing rows one at a time through the products_fts triggers costs about
+# ten times more per row than a full 'rebuild'. Once an import has changed
+# more than this fraction of the catalog, the triggers are dropped for the
+# rest of the transaction and the index is rebuilt once before committing.
+FTS_REBUILD_FRACTION = 0.1
+
+PRODUCT_COLUMNS = ('description', 'price', 'category_id', 'category_name', 'image_url', 'stock')
+
+UPSERT = f'''INSERT INTO products (id, name, {", ".join(PRODUCT_COLUMNS)}, created_at)
+             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+             ON CONFLICT(name) DO UPDATE SET {", ".join(f"{c} = excluded.{c}" for c in PRODUCT_COLUMNS)}
+             WHERE ({", ".join(PRODUCT_COLUMNS)}) IS NOT ({", ".join(f"excluded.{c}" for c in PRODUCT_COLUMNS)})'''
+
+INSERT_NEW = f'''INSERT INTO products (id, name, {", ".join(PRODUCT_COLUMNS)}, created_at)
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 ON CONFLICT(name) DO NOTHING'''
+
+
+class CatalogImportError(ValueError):
+    """A record that cannot be imported; nothing from the file is kept."""
+
+    def __init__(self, message, line=None):
+        super().__init__(f"line {line}: {message}" if line is not None else message)
+        self.line = line
+
+
+def read_records(stream, fmt):
+    """Yield ``(line_no, record)`` from a text stream of CSV (with a header
+    row) or JSON Lines."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    raise CatalogImportError(f"invalid JSON ({e})", line_no)
+                if not isinstance(record, dict):
+                    raise CatalogImportError("expected a JSON object", line_no)
+                yield line_no, record
+    else:
+        raise CatalogImportError(f"unsupported format: {fmt}")
+
+
+def detect_format(filename):
+    return 'csv' if str(filename).lower().endswith('.csv') else 'jsonl'
+
+
+def text_stream(binary):
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def ensure_categories(conn, categories):
+    """Create any of ``categories`` (dicts with ``name`` and optionally
+    ``image_url``) that do not exist yet; returns the number created."""
+    now = datetime.now(timezone.utc).isoformat()
+    cur = conn.executemany('INSERT INTO categories (id, name, image_url, created_at) VALUES (?, ?, ?, ?) ON CONFLICT(name) DO NOTHING',
+                           [(str(uuid.uuid5(CATEGORY_NAMESPACE, c['name'])), c['name'], c.get('image_url'), now)
+                            for c in categories])
+    return cur.rowcount
+
+
+def suspend_fts_triggers(conn):
+    """Drop the products_fts sync triggers; returns their SQL so the
+    caller can recreate them (in the same transaction)."""
+    triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'products_fts_%'").fetchall()
+    for name, _ in triggers:
+        conn.execute(f'DROP TRIGGER {name}')
+    return [sql for _, sql in triggers]
+
+
+def _product_row(record, line_no, categories, now):
+    name = (record.get('name') or '').strip()
+    if not name:
+        raise CatalogImportError("name is required", line_no)
+    category = (record.get('category') or record.get('category_name') or '').strip()
+    if not category:
+        raise CatalogImportError("category is required", line_no)
+    try:
+        price = round(float(record.get('price')), 2)
+        stock = int(record.get('stock') or 0)
+    except (TypeError, ValueError):
+        raise CatalogImportError("price must be a number and stock an integer", line_no)
+    if price < 0 or stock < 0:
+        raise CatalogImportError("price and stock must not be negative", line_no)
+    if category not in categories:
+        categories[category] = None
+    product_id = record.get('id') or str(uuid.uuid5(PRODUCT_NAMESPACE, name))
+    return [product_id, name, record.get('description') or '', price, category, category,
+            record.get('image_url') or '', stock, now]
+
+
+def import_records(conn, records, update_existing=True, batch_size=BATCH_SIZE):
+    """Upsert products from ``(line_no, record)`` pairs in one transaction.
+
+    Records are matched to existing products by ``name``. With
+    ``update_existing`` an existing product is only rewritten when one of its
+    columns actually differs, so re-importing an unchanged file writes
+    nothing (and does not touch the full-text index); without it existing
+    products are left alone. Large imports switch the full-text index from
+    per-row triggers to one rebuild (see ``FTS_REBUILD_FRACTION``).
+
+    Category names are resolved to ids from an in-memory map, creating
+    unknown categories on the way. Any bad record rolls the whole import
+    back.
+
+    Returns a report dict with row counts and the throughput.
+    """
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc).isoformat()
+    statement = UPSERT if update_existing else INSERT_NEW
+    report = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'categories_created': 0}
+
+    saved = {name: conn.execute(f'PRAGMA {name}').fetchone()[0] for name in IMPORT_PRAGMAS}
+    for name, value in IMPORT_PRAGMAS.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        categories = {row[1]: row[0] for row in conn.execute('SELECT id, name FROM categories')}
+        catalog_size = conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+        fts_triggers = None
+        batch, lines = [], []
+
+        def flush():
+            nonlocal fts_triggers
+            new_categories = list({row[4] for row in batch if categories[row[4]] is None})
+            if new_categories:
+                report['categories_created'] += ensure_categories(conn, [{'name': n} for n in new_categories])
+                categories.update((r[1], r[0]) for r in conn.execute(
+                    f'SELECT id, name FROM categories WHERE name IN ({", ".join("?" * len(new_categories))})',
+                    new_categories))
+            for row in batch:
+                row[4] = categories[row[4]]
+            # An id already held by another product (in the database, or
+            # earlier in this batch) would fail the insert on the primary key
+            ids = [row[0] for row in batch]
+            owners = dict(conn.execute(f'SELECT id, name FROM products WHERE id IN ({", ".join("?" * len(ids))})', ids))
+            for row, line_no in zip(batch, lines):
+                owner = owners.setdefault(row[0], row[1])
+                if owner != row[1]:
+                    raise CatalogImportError(f"id {row[0]} already belongs to product {owner!r}", line_no)
+            names = [row[1] for row in batch]
+            existing = {r[0] for r in conn.execute(
+                f'SELECT name FROM products WHERE name IN ({", ".join("?" * len(names))})', names)}
+            inserted = len(set(names) - existing)
+            written = conn.executemany(statement, batch).rowcount
+            report['inserted'] += inserted
+            report['updated'] += written - inserted
+            batch.clear()
+            lines.clear()
+            if fts_triggers is None and report['inserted'] + report['updated'] > FTS_REBUILD_FRACTION * catalog_size:
+                fts_triggers = suspend_fts_triggers(conn)
+
+        for line_no, record in records:
+            batch.append(_product_row(record, line_no, categories, now))
+            lines.append(line_no)
+            report['rows'] += 1
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        if fts_triggers is not None:
+            for sql in fts_triggers:
+                conn.execute(sql)
+            conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        for name, value in saved.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+
+    elapsed = time.perf_counter() - started
+    report['unchanged'] = report['rows'] - report['inserted'] - report['updated']
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_sec'] = round(report['rows'] / elapsed) if elapsed > 0 else report['rows']
+    return report
@@ -0,0 +1,269 @@
+"""Catalog responses rendered once and shared by every pre-forked worker.
+
+The parent process (prefork.py) renders the hot catalog responses through
+the app itself (categories, the first product page overall and per
+category, and the detail of the newest ``CATALOG_SNAPSHOT_PRODUCTS``
+products), together with their ETags and gzip/brotli variants, and writes
+them to ``<SQLITE_PATH>.catalog``. Workers map that file read-only, so the
+bytes live once in the page cache instead of once per worker's
+``CatalogCache``, and a freshly forked worker serves them without a query.
+
+Entries carry the board slots of their tags (see invalidation.py) and the
+time the snapshot was rendered; an entry whose product changed since then is
+skipped and the request falls through to the database (and the worker's own
+cache). When the board says some entries went stale, the parent re-renders
+those (and only those), rewrites the file and announces it through the
+board's generation slot.
+
+File layout: a header, then one record per entry, then an index of
+``(key hash, record offset)`` pairs sorted by hash for a binary search.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+import compression
+import invalidation
+from catalog_cache import CatalogCache
+
+MAGIC = b'SSCATv1\0'
+HEADER = struct.Struct('<8sqQQ')       # magic, rendered at (monotonic ns), entries, index offset
+INDEX = struct.Struct('<QQ')           # key hash, record offset
+RECORD = struct.Struct('<16sHHIII')    # etag digest, key length, slots, body, gzip and br lengths
+SLOT = struct.Struct('<H')
+
+DEFAULT_PRODUCTS = 5000
+
+
+def _key_bytes(key):
+    return repr(key).encode('utf-8')
+
+
+def _key_hash(key_bytes):
+    return int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), 'little')
+
+
+class SnapshotEntry:
+    """A response served from the snapshot; quacks like ``CachedResponse``."""
+    __slots__ = ('body', 'etag', 'encoded')
+
+    def __init__(self, body, etag, encoded):
+        self.body = body
+        self.etag = etag
+        self.encoded = encoded
+
+    def encode(self, encoding):
+        data = self.encoded.get(encoding)
+        if data is None:
+            data = self.encoded[encoding] = compression.compress(
+                self.body, encoding, compression.CACHED_LEVELS[encoding])
+        return data
+
+
+class CatalogSnapshot:
+    """Read side of the snapshot file. The mapping is (re)opened lazily,
+    whenever the board's generation slot names a newer file than the one
+    mapped, so a worker never keeps serving a replaced snapshot."""
+
+    def __init__(self, path, board):
+        self.path = path
+        self.board = board
+        self.hits = 0
+        self._map = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        generation = self.board.read(invalidation.GENERATION)
+        if generation != self._generation:
+            self._open(generation)
+        mapped = self._map
+        if mapped is None:
+            return None
+        _, rendered, count, index_offset = HEADER.unpack_from(mapped, 0)
+        kb = _key_bytes(key)
+        wanted = _key_hash(kb)
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            h, offset = INDEX.unpack_from(mapped, index_offset + mid * INDEX.size)
+            if h < wanted:
+                lo = mid + 1
+            elif h > wanted:
+                hi = mid
+            else:
+                return self._entry(mapped, offset, kb, rendered)
+        return None
+
+    def _entry(self, mapped, offset, kb, rendered):
+        digest, key_len, n_slots, body_len, gzip_len, br_len = RECORD.unpack_from(mapped, offset)
+        pos = offset + RECORD.size
+        if mapped[pos:pos + key_len] != kb:
+            return None
+        pos += key_len
+        slots = struct.unpack_from(f'<{n_slots}H', mapped, pos)
+        if not self.board.fresh(slots, rendered):
+            return None
+        pos += n_slots * SLOT.size
+        body = mapped[pos:pos + body_len]
+        pos += body_len
+        encoded = {}
+        if gzip_len:
+            encoded['gzip'] = mapped[pos:pos + gzip_len]
+        pos += gzip_len
+        if br_len:
+            encoded['br'] = mapped[pos:pos + br_len]
+        self.hits += 1
+        return SnapshotEntry(body, digest.hex(), encoded)
+
+    def _open(self, generation):
+        with self._lock:
+            if generation == self._generation:
+                return
+            mapped = None
+            if generation:
+                try:
+                    with open(self.path, 'rb') as f:
+                        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    mapped = None
+                if mapped is not None and (HEADER.unpack_from(mapped, 0)[0] != MAGIC
+                                           or HEADER.unpack_from(mapped, 0)[1] != generation):
+                    mapped.close()
+                    mapped = None
+            # The old mapping is left to the garbage collector: a request in
+            # another thread may still be slicing it.
+            self._map = mapped
+            self._generation = generation
+
+
+def write(path, entries, rendered, board):
+    """Write ``entries`` (``(key, CachedResponse)`` pairs) atomically to ``path``."""
+    records, index = [], []
+    offset = HEADER.size
+    for key, entry in entries:
+        kb = _key_bytes(key)
+        slots = board.slots_for(entry.tags)
+        variants = [entry.encoded.get(encoding, b'') for encoding in ('gzip', 'br')]
+        record = b''.join([
+            RECORD.pack(bytes.fromhex(entry.etag), len(kb), len(slots), len(entry.body), *map(len, variants)),
+            kb, struct.pack(f'<{len(slots)}H', *slots), entry.body, *variants,
+        ])
+        index.append((_key_hash(kb), offset))
+        records.append(record)
+        offset += len(record)
+    index.sort()
+    tmp = f'{path}.{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, rendered, len(index), offset))
+        f.writelines(records)
+        f.writelines(INDEX.pack(*item) for item in index)
+    os.replace(tmp, path)
+
+
+def hot_paths(app, max_products=DEFAULT_PRODUCTS):
+    """The catalog URLs worth rendering into the snapshot."""
+    paths = ['/api/categories', '/api/products']
+    with app.app_context():
+        conn = app.extensions['db_pool'].acquire()
+        try:
+            paths += [f'/api/products?category_id={c}' for c, in conn.execute('SELECT id FROM categories')]
+            paths += [f'/api/products/{p}' for p, in conn.execute(
+                'SELECT id FROM products ORDER BY created_at DESC, id DESC LIMIT ?', (max_products,))]
+        finally:
+            app.extensions['db_pool'].release(conn)
+    return paths
+
+
+def render(app, paths, seed=()):
+    """Request ``paths`` from ``app`` and return ``{key: (path, CachedResponse)}``
+    for the responses they cached, compressed variants included. ``seed``
+    holds ``(key, CachedResponse)`` pairs still valid, which the views reuse
+    instead of loading them again (e.g. facet counts shared with a page)."""
+    # Render into a private cache, so the entries are exactly what the views
+    # would have cached, under the same keys.
+    live = app.extensions['catalog_cache']
+    scratch = app.extensions['catalog_cache'] = CatalogCache(max_entries=len(seed) + len(paths) * 2 + 16)
+    for key, entry in seed:
+        scratch.put(key, entry)
+    rendered = {}
+    try:
+        client = app.test_client()
+        for path in paths:
+            before = len(scratch)
+            client.get(path, headers={'Accept-Encoding': 'identity'})
+            for key, entry in scratch.entries()[before:]:
+                rendered[key] = (path, entry)
+    finally:
+        app.extensions['catalog_cache'] = live
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    for _, entry in rendered.values():
+        if len(entry.body) >= min_size:
+            for encoding in compression.ENCODINGS:
+                entry.encode(encoding)
+    return rendered
+
+
+def refresh(app):
+    """Re-render what went stale in the snapshot and publish it to every
+    worker; returns the number of responses rendered.
+
+    The parent keeps the entries it last wrote. One whose board slots are all
+    older than the previous render is carried over as is, so a checkout
+    costs a re-render of the pages showing the products it sold, not of the
+    whole snapshot. The set of hot URLs is only recomputed by a full render:
+    the first one, and after a full clear (``ALL``, e.g. a catalog import).
+    """
+    board = app.extensions['catalog_board']
+    rendered = time.monotonic_ns()
+    previous = app.extensions.get('catalog_snapshot_rendered', 0)
+    current = app.extensions.get('catalog_snapshot_entries')
+    if current is None or board.read(invalidation.ALL) >= previous:
+        current = render(app, hot_paths(app, app.config['CATALOG_SNAPSHOT_PRODUCTS']))
+        count = len(current)
+    else:
+        stale = {key for key, (_, entry) in current.items() if not board.fresh(board.slots_for(entry.tags), previous)}
+        stale_paths = {current[key][0] for key in stale}
+        current = {key: value for key, value in current.items() if key not in stale}
+        fresh = render(app, sorted(stale_paths), [(key, entry) for key, (_, entry) in current.items()])
+        current.update(fresh)
+        count = len(fresh)
+    entries = [(key, entry) for key, (_, entry) in current.items()]
+    write(app.extensions['catalog_snapshot'].path, entries, rendered, board)
+    board.write(invalidation.GENERATION, rendered)
+    app.extensions['catalog_snapshot_entries'] = current
+    app.extensions['catalog_snapshot_slots'] = tuple(sorted(
+        {slot for _, entry in entries for slot in board.slots_for(entry.tags)}))
+    app.extensions['catalog_snapshot_rendered'] = rendered
+    return count
+
+
+def stale(app):
+    """True if anything in the snapshot was invalidated since it was
+    rendered. Only the slots its entries carry are read, so invalidations of
+    other tags (user profiles, products outside the snapshot) never trigger
+    a re-render."""
+    rendered = app.extensions.get('catalog_snapshot_rendered', 0)
+    return not app.extensions['catalog_board'].fresh(app.extensions.get('catalog_snapshot_slots', ()), rendered)
+
+
+def share(app):
+    """Switch ``app``'s caches to cross-process mode: invalidations go through
+    a board next to the database, and catalog reads try the snapshot first.
+    Call before forking, then ``refresh``."""
+    path = app.config['SQLITE_PATH']
+    board = invalidation.InvalidationBoard(f'{path}.board')
+    board.reset()
+    snapshot = CatalogSnapshot(f'{path}.catalog', board)
+    app.extensions['catalog_board'] = board
+    app.extensions['catalog_snapshot'] = snapshot
+    cache = app.extensions['catalog_cache']
+    cache.board = board
+    cache.snapshot = snapshot
+    users = app.extensions['user_cache']
+    users.board = board
+    users.namespace = 'user:'
+    return board
@@ -0,0 +1,105 @@
+import sqlite3
+import threading
+from flask import g, current_app
+
+import migrations
+
+# Pragmas applied to every pooled connection. WAL lets readers run alongside
+# the single writer; busy_timeout makes writers wait for the lock instead of
+# failing immediately with "database is locked".
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -16000,  # negative = KiB, so ~16 MB of page cache per connection
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+
+class ConnectionPool:
+    """A small pool of SQLite connections handed out one per request.
+
+    Connections are created lazily and returned to an idle stack when the
+    request ends, so a busy worker reuses warm connections (and their page
+    cache) instead of reopening the file every time. ``setup(conn)`` runs once,
+    on the first connection the pool opens (schema checks go there rather than
+    into app startup).
+    """
+
+    def __init__(self, path, max_idle=16, pragmas=None, factory=sqlite3.Connection, setup=None):
+        self.path = path
+        self.max_idle = max_idle
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.factory = factory
+        self.setup = setup
+        self.opened = 0
+        self._idle = []
+        self._lock = threading.Lock()
+        self._setup_lock = threading.Lock()
+        self._ready = setup is None
+
+    def connect(self):
+        # Pooled connections move between worker threads, but only ever belong
+        # to one request at a time.
+        conn = sqlite3.connect(self.path, check_same_thread=False, factory=self.factory)
+        self.opened += 1
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        if not self._ready:
+            with self._setup_lock:
+                if not self._ready:
+                    try:
+                        self.setup(conn)
+                    except Exception:
+                        conn.close()
+                        raise
+                    self._ready = True
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self.connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def stats(self):
+        return {'opened': self.opened, 'idle': len(self._idle)}
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def get_db():
+    """Return the connection checked out for the current request."""
+    if 'db' not in g:
+        g.db = current_app.extensions['db_pool'].acquire()
+    return g.db
+
+
+def close_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        current_app.extensions['db_pool'].release(conn)
+
+
+def init_app(app):
+    path = app.config['SQLITE_PATH']
+    pool = ConnectionPool(path, max_idle=app.config.get('SQLITE_POOL_SIZE', 16),
+                          setup=lambda conn: migrations.ensure_schema(conn, path))
+    app.extensions['db_pool'] = pool
+    app.teardown_appcontext(close_db)
+    return pool
@@ -0,0 +1,129 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class GroupCommitWriter:
+    """One writer thread that commits many checkouts per transaction.
+
+    ``submit(write)`` queues ``write(conn)`` and blocks until it is durable.
+    The writer takes whatever is queued (up to ``max_batch`` writes, waiting
+    at most ``max_delay`` seconds after the first for more to arrive), runs
+    each write inside its own SAVEPOINT of a single ``BEGIN IMMEDIATE``
+    transaction and commits once. A write that raises is rolled back to its
+    savepoint and its caller gets the exception, while the rest of the batch
+    goes on. Callers only get their result after the COMMIT returned, and the
+    writer's connection runs with ``synchronous = FULL``, so an acknowledged
+    order survives a power loss. That costs one fsync per batch instead of
+    one per order.
+
+    ``prepare(conn)``, if given, runs before each batch's transaction begins,
+    for setup that cannot run inside one (attaching the current order
+    partition, see order_partitions.py).
+
+    The thread and its connection are started on first use, in whichever
+    process submits (so a writer built before a fork works in the child).
+    """
+
+    def __init__(self, connect, max_batch=64, max_delay=0.002, prepare=None):
+        self.connect = connect
+        self.prepare = prepare
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.largest_batch = 0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+
+    def submit(self, write):
+        """Run ``write(conn)`` in the next batch; return its result once the
+        batch is committed, or raise what it (or the commit) raised."""
+        future = Future()
+        self._writer_queue().put((write, future))
+        return future.result()
+
+    def stats(self):
+        with self._lock:
+            return {'batches': self.batches, 'writes': self.writes, 'failed': self.failed,
+                    'largest_batch': self.largest_batch}
+
+    def _writer_queue(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._queue = queue.SimpleQueue()
+                    threading.Thread(target=self._run, args=(self._queue,), name='group-commit', daemon=True).start()
+                    self._pid = pid
+        return self._queue
+
+    def _run(self, jobs):
+        conn = None
+        while True:
+            batch = [jobs.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                wait = deadline - time.monotonic()
+                try:
+                    batch.append(jobs.get(timeout=wait) if wait > 0 else jobs.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    conn = self.connect()
+                    conn.execute('PRAGMA synchronous = FULL')
+                self._commit(conn, batch)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit(self, conn, batch):
+        done, failed = [], 0
+        try:
+            if self.prepare is not None:
+                self.prepare(conn)
+            conn.execute('BEGIN IMMEDIATE')
+            for write, future in batch:
+                conn.execute('SAVEPOINT checkout')
+                try:
+                    result = write(conn)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO checkout')
+                    conn.execute('RELEASE checkout')
+                    future.set_exception(e)
+                    failed += 1
+                else:
+                    conn.execute('RELEASE checkout')
+                    done.append((future, result))
+            conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            with self._lock:
+                self.batches += 1
+                self.writes += len(batch)
+                self.failed += failed
+                self.largest_batch = max(self.largest_batch, len(batch))
+        for future, result in done:
+            future.set_result(result)
+
+
+def init_app(app):
+    """Route checkouts through a group-commit writer unless
+    ``ORDER_GROUP_COMMIT`` is off."""
+    if not app.config.get('ORDER_GROUP_COMMIT', True):
+        return None
+    pool = app.extensions['db_pool']
+    writer = GroupCommitWriter(pool.connect, max_batch=app.config.get('ORDER_COMMIT_BATCH', 64),
+                               max_delay=app.config.get('ORDER_COMMIT_DELAY_MS', 2) / 1000,
+                               prepare=app.extensions['order_partitions'].prepare_write)
+    app.extensions['order_writer'] = writer
+    return writer
@@ -0,0 +1,84 @@
+import mmap
+import os
+import struct
+import time
+import zlib
+
+SLOTS = 8192
+SLOT = struct.Struct('q')
+
+# Reserved slots: everything (a full clear) and the catalog snapshot
+# generation (see catalog_snapshot.py). Tags hash onto the rest.
+ALL = 0
+GENERATION = 1
+FIRST_TAG_SLOT = 2
+
+
+class InvalidationBoard:
+    """Cache invalidations shared by every process that maps the same file.
+
+    Each tag hashes onto one of ``slots`` 8-byte slots in a ``MAP_SHARED``
+    mapping. Invalidating a tag writes the current ``CLOCK_MONOTONIC`` time
+    (system-wide, so comparable across processes) into its slot. Something
+    cached from data read at time ``t`` is still fresh while all of its slots
+    (and the ``ALL`` slot) are older than ``t``. Two tags sharing a slot only
+    cost a spurious miss, never a stale hit. Writers always store a new
+    timestamp rather than incrementing, so two processes invalidating at once
+    cannot cancel each other out.
+
+    A board built before ``fork()`` is shared with the children, which is how
+    a checkout in one pre-forked worker retires the cached copies in all of
+    them (see prefork.py).
+    """
+
+    def __init__(self, path, slots=SLOTS):
+        self.path = path
+        self.slots = slots
+        size = slots * SLOT.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def slot(self, tag):
+        return FIRST_TAG_SLOT + zlib.crc32(tag.encode('utf-8')) % (self.slots - FIRST_TAG_SLOT)
+
+    def slots_for(self, tags):
+        return tuple(sorted({self.slot(tag) for tag in tags}))
+
+    def read(self, slot):
+        return SLOT.unpack_from(self._map, slot * SLOT.size)[0]
+
+    def write(self, slot, value):
+        SLOT.pack_into(self._map, slot * SLOT.size, value)
+
+    def touch(self, *tags):
+        now = time.monotonic_ns()
+        for slot in self.slots_for(tags):
+            self.write(slot, now)
+
+    def touch_all(self):
+        self.write(ALL, time.monotonic_ns())
+
+    def fresh(self, slots, since):
+        """True if none of ``slots`` was invalidated at or after ``since``."""
+        if self.read(ALL) >= since:
+            return False
+        return all(self.read(slot) < since for slot in slots)
+
+    def newest(self):
+        """Time of the latest invalidation of any tag."""
+        with memoryview(self._map) as view, view.cast('q') as values:
+            return max(values[ALL], max(values[FIRST_TAG_SLOT:]))
+
+    def reset(self):
+        """Zero every slot. Monotonic times only compare within one boot, so a
+        board left over from an earlier run must not be trusted."""
+        self._map[:] = bytes(len(self._map))
+
+    def close(self):
+        self._map.close()
@@ -0,0 +1,153 @@
+import itertools
+import threading
+import time
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(product_id)
+        self.product_id = product_id
+
+
+class UnknownProduct(KeyError):
+    def __init__(self, product_id):
+        super().__init__(product_id)
+        self.product_id = product_id
+
+
+class Hold:
+    __slots__ = ('id', 'quantities', 'expires_at')
+
+    def __init__(self, hold_id, quantities, expires_at):
+        self.id = hold_id
+        self.quantities = quantities
+        self.expires_at = expires_at
+
+
+class InventoryEngine:
+    """In-memory stock counters in front of the ``products.stock`` column.
+
+    ``available[product_id]`` is the last known database stock minus the
+    quantities currently held by in-flight checkouts. A checkout first
+    reserves against these counters, so a sold-out hot SKU is rejected
+    without ever reaching the order transaction (or its write lock). The
+    database stays the source of truth. A counter that is too high is caught
+    by the order transaction, which still decrements with ``WHERE stock >=
+    ?``: the checkout fails, releases its hold and the product is reloaded.
+    A counter that is too low (a restock through the CLI or another worker, a
+    direct database edit) is reloaded before a checkout is rejected on its
+    account, so drift costs a primary-key read per rejection, never an
+    oversell or a wrongly refused order.
+
+    Holds that are neither committed nor released within ``hold_ttl`` seconds
+    are returned to the pool by ``expire()``, and ``reconcile()`` re-reads the
+    tracked products from the database.
+    """
+
+    def __init__(self, hold_ttl=30.0, reconcile_interval=30.0):
+        self.hold_ttl = hold_ttl
+        self.reconcile_interval = reconcile_interval
+        self.available = {}
+        self.rejected = 0
+        self._holds = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._next_expiry_check = 0.0
+        self.last_reconciled = time.monotonic()
+
+    def reserve(self, needed, load):
+        """Hold ``needed`` ({product_id: quantity}) or raise.
+
+        ``load(product_ids)`` returns ``{product_id: stock}`` from the database
+        and is called for the products that are not tracked yet or whose
+        counters are short of ``needed``.
+        """
+        now = time.monotonic()
+        if now >= self._next_expiry_check:
+            self.expire(now)
+        with self._lock:
+            short = [pid for pid, quantity in needed.items() if self.available.get(pid, -1) < quantity]
+        if short:
+            loaded = load(short)
+            with self._lock:
+                for pid in short:
+                    if pid in loaded:
+                        self.available[pid] = loaded[pid] - self._held(pid)
+                    else:
+                        self.available.pop(pid, None)
+        with self._lock:
+            for pid, quantity in needed.items():
+                if pid not in self.available:
+                    raise UnknownProduct(pid)
+                if self.available[pid] < quantity:
+                    self.rejected += 1
+                    raise InsufficientStock(pid)
+            for pid, quantity in needed.items():
+                self.available[pid] -= quantity
+            hold = Hold(next(self._ids), dict(needed), now + self.hold_ttl)
+            self._holds[hold.id] = hold
+            return hold
+
+    def commit(self, hold):
+        """The database decrement succeeded; the held units are gone for good."""
+        with self._lock:
+            self._holds.pop(hold.id, None)
+
+    def release(self, hold, stale=False):
+        """Return held units. With ``stale=True`` the database disagreed with
+        the counters, so the products are dropped and reloaded on next use."""
+        with self._lock:
+            if self._holds.pop(hold.id, None) is None:
+                return
+            for pid, quantity in hold.quantities.items():
+                if stale:
+                    self.available.pop(pid, None)
+                elif pid in self.available:
+                    self.available[pid] += quantity
+
+    def expire(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._next_expiry_check = now + 1.0
+            expired = [h for h in self._holds.values() if h.expires_at <= now]
+        for hold in expired:
+            self.release(hold)
+        return len(expired)
+
+    def forget(self, product_ids=None):
+        """Stop trusting the counters for ``product_ids`` (all when None)."""
+        with self._lock:
+            if product_ids is None:
+                self.available.clear()
+            else:
+                for pid in product_ids:
+                    self.available.pop(pid, None)
+
+    def reconcile(self, conn):
+        """Re-read stock for every tracked product and re-apply open holds."""
+        self.expire()
+        with self._lock:
+            tracked = list(self.available)
+        stock = {}
+        for start in range(0, len(tracked), 500):
+            chunk = tracked[start:start + 500]
+            cur = conn.execute(f'SELECT id, stock FROM products WHERE id IN ({", ".join("?" * len(chunk))})', chunk)
+            stock.update((row['id'], row['stock']) for row in cur)
+        with self._lock:
+            for pid in tracked:
+                if pid in stock:
+                    self.available[pid] = stock[pid] - self._held(pid)
+                else:
+                    self.available.pop(pid, None)
+            self.last_reconciled = time.monotonic()
+        return len(tracked)
+
+    def stats(self):
+        with self._lock:
+            return {'tracked': len(self.available), 'holds': len(self._holds), 'rejected': self.rejected}
+
+    def reconcile_due(self):
+        return time.monotonic() - self.last_reconciled >= self.reconcile_interval
+
+    def _held(self, pid):
+        return sum(h.quantities.get(pid, 0) for h in self._holds.values())
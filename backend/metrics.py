@@ -0,0 +1,205 @@
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+from flask import g, request
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+WHITESPACE = re.compile(r'\s+')
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Collapse a statement to a stable label: whitespace squeezed, literals
+    and variable-length ``?, ?, ...`` lists replaced, so ``IN (...)`` queries
+    of any size share one series."""
+    sql = WHITESPACE.sub(' ', sql).strip()
+    sql = LITERAL.sub('?', sql)
+    return PLACEHOLDER_LIST.sub('?, ...', sql)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{v}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in sorted(values):
+            lines.append(f'{self.name}{format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram keyed by label values.
+
+    ``observe`` is one bisect and three additions under a lock; buckets are
+    stored non-cumulatively and only summed up when rendered.
+    """
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(k, list(counts), total) for k, (counts, total) in self._series.items()]
+        for label_values, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{format_labels(self.labels, label_values, [("le", le)])} {cumulative}')
+            labels = format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.Error:
+            self.connection.metrics.sql_errors.inc(normalize_sql(sql))
+            raise
+        finally:
+            self.connection.metrics.sql_duration.observe(time.perf_counter() - started, normalize_sql(sql))
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error:
+            self.connection.metrics.sql_errors.inc(normalize_sql(sql))
+            raise
+        finally:
+            self.connection.metrics.sql_duration.observe(time.perf_counter() - started, normalize_sql(sql))
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection that times every statement and commit.
+
+    ``metrics`` is bound by ``Metrics.connection_class``; ``execute`` and
+    ``executemany`` are overridden too because the C shortcuts on
+    ``Connection`` bypass the cursor's Python methods.
+    """
+
+    metrics = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        except sqlite3.Error:
+            self.metrics.sql_errors.inc('COMMIT')
+            raise
+        finally:
+            self.metrics.commit_duration.observe(time.perf_counter() - started)
+
+
+class Metrics:
+    """Process-local request and SQLite metrics in Prometheus text format.
+
+    Values that other components already count (cache hits, bcrypt queue,
+    inventory) are not duplicated; collectors registered with
+    ``add_collector`` read them at scrape time.
+    """
+
+    def __init__(self):
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Time spent in Flask views.', ('method', 'route', 'status'))
+        self.sql_duration = Histogram(
+            'sqlite_statement_duration_seconds', 'Time spent executing SQL statements.', ('statement',))
+        self.commit_duration = Histogram(
+            'sqlite_commit_duration_seconds', 'Time spent in COMMIT, including waits for the write lock.')
+        self.sql_errors = Counter('sqlite_errors_total', 'Statements and commits that raised.', ('statement',))
+        self.connection_class = type('InstrumentedConnection', (InstrumentedConnection,), {'metrics': self})
+        self._collectors = []
+
+    def add_collector(self, collect):
+        """``collect()`` yields ``(name, type, help, samples)`` with samples as
+        ``(suffix, labels_dict, value)``; read on every scrape."""
+        self._collectors.append(collect)
+
+    def before_request(self):
+        g.metrics_started = time.perf_counter()
+
+    def after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            self.request_duration.observe(time.perf_counter() - started,
+                                          request.method, route, str(response.status_code))
+        return response
+
+    def render(self):
+        lines = []
+        for metric in (self.request_duration, self.sql_duration, self.commit_duration, self.sql_errors):
+            lines += metric.render()
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+                for suffix, labels, value in samples:
+                    lines.append(f'{name}{suffix}{format_labels(labels, labels.values())} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Time every view, and every statement on the app's SQLite pool."""
+    metrics = Metrics()
+    app.before_request(metrics.before_request)
+    app.after_request(metrics.after_request)
+    app.extensions['db_pool'].factory = metrics.connection_class
+    app.extensions['metrics'] = metrics
+    return metrics
@@ -0,0 +1,410 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import order_partitions
+import sales
+
+def _iso_to_us(value):
+    if value is None:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (moment - datetime(1970, 1, 1, tzinfo=timezone.utc)) // timedelta(microseconds=1)
+
+
+def _register_functions(conn):
+    conn.create_function('iso_to_us', 1, _iso_to_us, deterministic=True)
+
+
+# Forward-only schema migrations. Each entry is (version, name, steps) where a
+# step is either a SQL string or a callable taking the connection. Never edit a
+# migration that has shipped; append a new one instead.
+MIGRATIONS = [
+    (1, 'initial schema', [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE,
+            email TEXT UNIQUE,
+            password TEXT,
+            full_name TEXT,
+            created_at TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS categories (
+            id TEXT PRIMARY KEY,
+            name TEXT UNIQUE,
+            image_url TEXT,
+            created_at TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS products (
+            id TEXT PRIMARY KEY,
+            name TEXT UNIQUE,
+            description TEXT,
+            price REAL,
+            category_id TEXT,
+            category_name TEXT,
+            image_url TEXT,
+            stock INTEGER,
+            created_at TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS orders (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            product_id TEXT,
+            product_name TEXT,
+            product_image TEXT,
+            quantity INTEGER,
+            size TEXT,
+            unit_price REAL,
+            total_price REAL,
+            customer_name TEXT,
+            customer_email TEXT,
+            customer_phone TEXT,
+            shipping_street TEXT,
+            shipping_city TEXT,
+            shipping_state TEXT,
+            shipping_zip_code TEXT,
+            shipping_country TEXT,
+            payment_method TEXT,
+            order_status TEXT,
+            payment_status TEXT,
+            estimated_delivery TEXT,
+            created_at TEXT
+        )
+        ''',
+    ]),
+    (2, 'indexes for hot queries', [
+        # Registration / login / profile lookups only need the id back, so
+        # (email, id) and (username, id) answer them from the index alone.
+        'CREATE INDEX IF NOT EXISTS idx_users_email_id ON users (email, id)',
+        'CREATE INDEX IF NOT EXISTS idx_users_username_id ON users (username, id)',
+        # Keyset pagination order of the listing endpoints
+        'CREATE INDEX IF NOT EXISTS idx_products_created ON products (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_products_category_created ON products (category_id, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at, id)',
+        'ANALYZE',
+    ]),
+    (3, 'product full-text index', [
+        # External-content FTS5 index over the searchable product columns. The
+        # prefix option keeps 2/3-character prefix queries ("dr*") index-only.
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, description, category_name,
+            content='products', content_rowid='rowid',
+            prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, description, category_name)
+            VALUES (new.rowid, new.name, new.description, new.category_name);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, category_name)
+            VALUES ('delete', old.rowid, old.name, old.description, old.category_name);
+        END
+        ''',
+        # Only fires for the indexed columns, so stock updates on checkout
+        # never touch the full-text index.
+        '''
+        CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description, category_name ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description, category_name)
+            VALUES ('delete', old.rowid, old.name, old.description, old.category_name);
+            INSERT INTO products_fts (rowid, name, description, category_name)
+            VALUES (new.rowid, new.name, new.description, new.category_name);
+        END
+        ''',
+        "INSERT INTO products_fts (products_fts) VALUES ('rebuild')",
+    ]),
+    (4, 'order line items', [
+        '''
+        CREATE TABLE IF NOT EXISTS order_items (
+            order_id TEXT NOT NULL,
+            line_no INTEGER NOT NULL,
+            product_id TEXT,
+            product_name TEXT,
+            product_image TEXT,
+            quantity INTEGER,
+            size TEXT,
+            unit_price REAL,
+            total_price REAL,
+            PRIMARY KEY (order_id, line_no)
+        ) WITHOUT ROWID
+        ''',
+        # Every existing order was a single-product order; give it its one line.
+        '''
+        INSERT OR IGNORE INTO order_items (order_id, line_no, product_id, product_name, product_image, quantity, size, unit_price, total_price)
+        SELECT id, 1, product_id, product_name, product_image, quantity, size, unit_price, total_price FROM orders
+        ''',
+    ]),
+    (5, 'compact order storage', [
+        # Contacts, addresses and product name/image are stored once and
+        # referenced by integer id; money is integer cents and timestamps are
+        # integer microseconds since the epoch (see orders.py).
+        _register_functions,
+        'CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, email TEXT, phone TEXT)',
+        'CREATE UNIQUE INDEX idx_customers_contact ON customers (email, phone, name)',
+        'CREATE TABLE addresses (id INTEGER PRIMARY KEY, street TEXT, city TEXT, state TEXT, zip_code TEXT, country TEXT)',
+        'CREATE UNIQUE INDEX idx_addresses_all ON addresses (zip_code, street, city, state, country)',
+        'CREATE TABLE product_snapshots (id INTEGER PRIMARY KEY, product_id TEXT, name TEXT, image_url TEXT)',
+        'CREATE UNIQUE INDEX idx_product_snapshots ON product_snapshots (product_id, name, image_url)',
+        '''
+        INSERT INTO customers (name, email, phone)
+        SELECT DISTINCT customer_name, customer_email, customer_phone FROM orders
+        ''',
+        '''
+        INSERT INTO addresses (street, city, state, zip_code, country)
+        SELECT DISTINCT shipping_street, shipping_city, shipping_state, shipping_zip_code, shipping_country FROM orders
+        ''',
+        '''
+        INSERT INTO product_snapshots (product_id, name, image_url)
+        SELECT DISTINCT product_id, product_name, product_image FROM order_items
+        ''',
+        '''
+        CREATE TABLE orders_compact (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            customer_id INTEGER,
+            address_id INTEGER,
+            quantity INTEGER,
+            total_cents INTEGER,
+            payment_method TEXT,
+            order_status TEXT,
+            payment_status TEXT,
+            estimated_delivery TEXT,
+            created_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        '''
+        INSERT INTO orders_compact
+        SELECT o.id, o.user_id, c.id, a.id, o.quantity, CAST(round(o.total_price * 100) AS INTEGER),
+               o.payment_method, o.order_status, o.payment_status, o.estimated_delivery,
+               COALESCE(iso_to_us(o.created_at), 0)
+        FROM orders o
+        LEFT JOIN customers c
+               ON c.email IS o.customer_email AND c.phone IS o.customer_phone AND c.name IS o.customer_name
+        LEFT JOIN addresses a
+               ON a.zip_code IS o.shipping_zip_code AND a.street IS o.shipping_street AND a.city IS o.shipping_city
+              AND a.state IS o.shipping_state AND a.country IS o.shipping_country
+        ''',
+        '''
+        CREATE TABLE order_items_compact (
+            order_id TEXT NOT NULL,
+            line_no INTEGER NOT NULL,
+            snapshot_id INTEGER NOT NULL,
+            quantity INTEGER,
+            size TEXT,
+            unit_cents INTEGER,
+            PRIMARY KEY (order_id, line_no)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        INSERT INTO order_items_compact
+        SELECT i.order_id, i.line_no, s.id, i.quantity, i.size, CAST(round(i.unit_price * 100) AS INTEGER)
+        FROM order_items i
+        JOIN product_snapshots s
+          ON s.product_id IS i.product_id AND s.name IS i.product_name AND s.image_url IS i.product_image
+        ''',
+        'DROP TABLE order_items',
+        'ALTER TABLE order_items_compact RENAME TO order_items',
+        'DROP TABLE orders',
+        'ALTER TABLE orders_compact RENAME TO orders',
+        'CREATE INDEX idx_orders_created ON orders (created_at, id)',
+        'CREATE INDEX idx_orders_user_created ON orders (user_id, created_at, id)',
+        'ANALYZE',
+    ]),
+    (6, 'product listing sorts and facets', [
+        # One index per sort of GET /api/products, with and without a leading
+        # category_id (see product_listing.py).
+        'CREATE INDEX IF NOT EXISTS idx_products_price ON products (price, id)',
+        'CREATE INDEX IF NOT EXISTS idx_products_name ON products (name, id)',
+        'CREATE INDEX IF NOT EXISTS idx_products_category_name ON products (category_id, name, id)',
+        # Also covers the facet counts, which read category_id, price and stock.
+        'CREATE INDEX IF NOT EXISTS idx_products_category_price ON products (category_id, price, id, stock)',
+        'ANALYZE',
+    ]),
+    (7, 'daily sales aggregates', [
+        # Maintained by checkout (see sales.py); day = days since the epoch, UTC
+        '''
+        CREATE TABLE sales_daily (
+            day INTEGER PRIMARY KEY,
+            orders INTEGER NOT NULL,
+            units INTEGER NOT NULL,
+            revenue_cents INTEGER NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE sales_category_daily (
+            day INTEGER NOT NULL,
+            category_id TEXT NOT NULL,
+            orders INTEGER NOT NULL,
+            units INTEGER NOT NULL,
+            revenue_cents INTEGER NOT NULL,
+            PRIMARY KEY (day, category_id)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE sales_product_daily (
+            day INTEGER NOT NULL,
+            product_id TEXT NOT NULL,
+            orders INTEGER NOT NULL,
+            units INTEGER NOT NULL,
+            revenue_cents INTEGER NOT NULL,
+            PRIMARY KEY (day, product_id)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX idx_sales_product_daily_product ON sales_product_daily (product_id, day)',
+        sales.rebuild,
+    ]),
+    (8, 'monthly order partitions', [
+        # Orders move to one attached file per month (see order_partitions.py);
+        # these tables route queries to the right files.
+        '''
+        CREATE TABLE order_partitions (
+            month TEXT PRIMARY KEY,
+            archived INTEGER NOT NULL DEFAULT 0,
+            file TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE order_user_months (
+            user_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            PRIMARY KEY (user_id, month)
+        ) WITHOUT ROWID
+        ''',
+        # Orders placed before this migration have uuid4 ids that do not
+        # encode their month
+        '''
+        CREATE TABLE order_locator (
+            id TEXT PRIMARY KEY,
+            month TEXT NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        order_partitions.migrate_orders,
+        'DROP TABLE order_items',
+        'DROP TABLE orders',
+    ]),
+    (9, 'order commit journal', [
+        # A checkout commits main and its partition separately; both sides
+        # journal the order until OrderPartitions.recover has matched them.
+        '''
+        CREATE TABLE order_journal (
+            id TEXT PRIMARY KEY,
+            month TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            lines TEXT NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX idx_order_journal_month ON order_journal (month)',
+        order_partitions.add_journals,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    try:
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def migrate(conn, target=None):
+    """Bring the database up to ``target`` (default LATEST_VERSION).
+
+    On an up-to-date database this is a single ``SELECT MAX(version)``.
+    Returns the list of versions that were applied.
+    """
+    target = LATEST_VERSION if target is None else target
+    if current_version(conn) >= target:
+        return []
+
+    applied = []
+    # BEGIN IMMEDIATE takes the write lock up front, so concurrently booting
+    # workers queue here and re-check the version instead of racing.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT,
+                applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        current = current_version(conn)
+        for version, name, steps in MIGRATIONS:
+            if version <= current or version > target:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+            applied.append(version)
+        # Mirrored in the file header for ensure_schema's fast path
+        conn.execute(f'PRAGMA user_version = {current_version(conn)}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied
+
+
+def schema_marker(path):
+    return f'{path}.schema'
+
+
+def _fingerprint(path):
+    # The inode changes when the database file is replaced (restored from a
+    # backup, swapped in by a deploy), which invalidates the marker.
+    return f'{LATEST_VERSION} {os.stat(path).st_ino}'
+
+
+def ensure_schema(conn, path=None):
+    """``migrate`` unless the marker file next to ``path`` says this database
+    is already at LATEST_VERSION.
+
+    The marker is written by the first process (or ``flask migrate`` during a
+    deploy) that finds the schema current, so later workers start with one
+    ``stat``, a small file read and a ``PRAGMA user_version`` (the database
+    header, which migrate keeps equal to the schema version) instead of a
+    query. The pragma catches an older database restored over the same file
+    in place, which keeps the inode the marker records.
+    """
+    if not path or path == ':memory:' or path.startswith('file:'):
+        return migrate(conn)
+    marker = schema_marker(path)
+    try:
+        with open(marker) as f:
+            if f.read() == _fingerprint(path) and conn.execute('PRAGMA user_version').fetchone()[0] == LATEST_VERSION:
+                return []
+    except OSError:
+        pass
+    applied = migrate(conn)
+    version = current_version(conn)
+    if conn.execute('PRAGMA user_version').fetchone()[0] != version:
+        # Migrated before the header was kept in step
+        conn.execute(f'PRAGMA user_version = {version}')
+    try:
+        tmp = f'{marker}.{os.getpid()}'
+        with open(tmp, 'w') as f:
+            f.write(_fingerprint(path))
+        os.replace(tmp, marker)
+    except OSError:
+        pass
+    return applied
@@ -0,0 +1,475 @@
+"""Orders partitioned by month into separate SQLite files.
+
+Each calendar month (UTC) of orders lives in its own file,
+``<SQLITE_PATH>.orders/YYYY-MM.db``, with the same compact ``orders`` and
+``order_items`` tables and indexes the main database used to hold (migration
+8 moved them out). A connection ATTACHes the months a query needs under the
+schema name ``"YYYY-MM"``, so a listing of recent orders reads the newest
+partitions only, and its cost does not grow with the years of history
+behind them. Side tables (customers, addresses, product snapshots) stay in
+the main database and partitions point into them.
+
+The main database keeps the routing tables:
+
+* ``order_partitions``: every month, its file and whether it is archived;
+* ``order_user_months``: the months each user has orders in, so a user's
+  order list skips months without any;
+* ``order_locator``: the month of orders migrated from the single table.
+  New order ids are UUIDv7s, whose leading 48 bits are the creation time in
+  milliseconds, so their month is read off the id itself.
+
+``archive`` rewrites a past month into a compact read-only file (``VACUUM
+INTO``, optionally gzipped) that is attached with ``immutable=1``; a
+gzipped archive is extracted to ``cache/`` on first read.
+
+A checkout writes its partition and the main database (stock, aggregates,
+routing rows) in one transaction. In WAL mode SQLite commits each attached
+file atomically but not all of them together, so a crash in the middle of a
+COMMIT can keep an order without its stock decrement, or the reverse. Each
+checkout therefore also journals its order id on both sides (``journal`` in
+the partition, ``order_journal`` with the sold lines in main), and
+``recover`` compares the two: an order only the partition has gets its stock
+decrement and aggregates applied, and a main-only half (the order itself was
+lost) is undone. Recovery runs before a process's first checkout and then
+with every inventory reconcile, which also keeps the journals short.
+"""
+import gzip
+import json
+import os
+import re
+import secrets
+import shutil
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import sales
+
+MONTH = re.compile(r'^\d{4}-\d{2}$')
+
+# Attach next month's partition this long (µs) before it starts, so a
+# checkout queued just before midnight on the last day finds it.
+ROLLOVER_US = 60 * 10 ** 6
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS {schema}.orders (
+        id TEXT PRIMARY KEY,
+        user_id TEXT,
+        customer_id INTEGER,
+        address_id INTEGER,
+        quantity INTEGER,
+        total_cents INTEGER,
+        payment_method TEXT,
+        order_status TEXT,
+        payment_status TEXT,
+        estimated_delivery TEXT,
+        created_at INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS {schema}.order_items (
+        order_id TEXT NOT NULL,
+        line_no INTEGER NOT NULL,
+        snapshot_id INTEGER NOT NULL,
+        quantity INTEGER,
+        size TEXT,
+        unit_cents INTEGER,
+        PRIMARY KEY (order_id, line_no)
+    ) WITHOUT ROWID
+    ''',
+    # Orders committed here whose main-database half is not verified yet
+    'CREATE TABLE IF NOT EXISTS {schema}.journal (id TEXT PRIMARY KEY) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_orders_created ON orders (created_at, id)',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_orders_user_created ON orders (user_id, created_at, id)',
+]
+
+ORDER_FIELDS = ('id', 'user_id', 'customer_id', 'address_id', 'quantity', 'total_cents', 'payment_method',
+                'order_status', 'payment_status', 'estimated_delivery', 'created_at')
+ITEM_FIELDS = ('order_id', 'line_no', 'snapshot_id', 'quantity', 'size', 'unit_cents')
+
+
+class PartitionError(ValueError):
+    pass
+
+
+def partition_dir(db_path):
+    return f'{db_path}.orders'
+
+
+def schema_name(month):
+    return f'"{month}"'
+
+
+def month_of(created_us):
+    """``YYYY-MM`` (UTC) of a stored ``created_at``."""
+    return time.strftime('%Y-%m', time.gmtime(created_us // 10 ** 6))
+
+
+def month_bounds(month):
+    """``[start, end)`` of ``month`` in epoch microseconds."""
+    year, mon = map(int, month.split('-'))
+    start = datetime(year, mon, 1, tzinfo=timezone.utc)
+    end = datetime(year + mon // 12, mon % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp()) * 10 ** 6, int(end.timestamp()) * 10 ** 6
+
+
+def new_order_id(created_us, bits=None):
+    """A UUIDv7 for an order created at ``created_us``: 48 bits of
+    milliseconds, then 74 random bits (``bits`` if given)."""
+    bits = secrets.randbits(74) if bits is None else bits
+    value = (created_us // 1000 & (1 << 48) - 1) << 80
+    value |= 0x7 << 76 | (bits >> 62 & 0xfff) << 64 | 0b10 << 62 | bits & (1 << 62) - 1
+    return str(uuid.UUID(int=value))
+
+
+def month_of_id(order_id):
+    """The partition month of a UUIDv7 order id; None for anything else."""
+    try:
+        value = uuid.UUID(order_id)
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if value.version != 7:
+        return None
+    return month_of((value.int >> 80) * 1000)
+
+
+def create_schema(conn, schema='main'):
+    conn.execute(f'PRAGMA {schema}.journal_mode = WAL')
+    for statement in SCHEMA:
+        conn.execute(statement.format(schema=schema))
+
+
+class OrderPartitions:
+    """Routing between the main database and the monthly order files.
+
+    Methods take the caller's connection; ATTACH and DETACH cannot run inside
+    a transaction, so ``attach``, ``create`` and ``prepare_write`` must be
+    called outside one. Attachments outlive the request (pooled connections
+    keep them), and a connection holds at most ``SQLITE_LIMIT_ATTACHED``
+    (10 by default) partitions: attaching one more first detaches the
+    earliest month attached, whenever it was last used. Order listings walk
+    months newest first, so that is the month they have just finished.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        # Month in which the last recovery pass started (None: not yet)
+        self.recovered = None
+
+    def path(self, file):
+        return os.path.join(self.directory, file)
+
+    def months(self, conn, user_id=None, first=None, last=None, newest_first=True):
+        """Months with a partition (with an order of ``user_id``, if given)
+        between ``first`` and ``last`` inclusive."""
+        if user_id is None:
+            sql, params = 'SELECT month FROM order_partitions WHERE 1', []
+        else:
+            sql, params = 'SELECT month FROM order_user_months WHERE user_id = ?', [user_id]
+        if first is not None:
+            sql += ' AND month >= ?'
+            params.append(first)
+        if last is not None:
+            sql += ' AND month <= ?'
+            params.append(last)
+        sql += ' ORDER BY month DESC' if newest_first else ' ORDER BY month'
+        return [row[0] for row in conn.execute(sql, params)]
+
+    def attach(self, conn, month):
+        """Attach ``month``'s partition (if it is not already) and return its
+        schema name, or None if there is no such partition."""
+        if not MONTH.match(month):
+            return None
+        row = conn.execute('SELECT file, archived FROM order_partitions WHERE month = ?', (month,)).fetchone()
+        if row is None:
+            return None
+        file, archived = row[0], row[1]
+        path = self._readable(file) if archived else self.path(file)
+        schema = schema_name(month)
+        attached = self._attached(conn)
+        if month in attached:
+            if attached[month] == path:
+                return schema
+            # Archived since this connection attached it
+            conn.execute(f'DETACH {schema}')
+        self._make_room(conn)
+        if archived:
+            conn.execute(f'ATTACH ? AS {schema}', (f'file:{quote(path)}?mode=ro&immutable=1',))
+        else:
+            conn.execute(f'ATTACH ? AS {schema}', (path,))
+            synchronous = conn.execute('PRAGMA main.synchronous').fetchone()[0]
+            conn.execute(f'PRAGMA {schema}.synchronous = {synchronous}')
+        return schema
+
+    def create(self, conn, month):
+        """Create ``month``'s partition file and register it; returns its
+        schema name. Safe to race: every step is idempotent."""
+        if not MONTH.match(month):
+            raise PartitionError(f'not a month: {month}')
+        os.makedirs(self.directory, exist_ok=True)
+        schema = schema_name(month)
+        file = f'{month}.db'
+        if month not in self._attached(conn):
+            self._make_room(conn)
+            conn.execute(f'ATTACH ? AS {schema}', (self.path(file),))
+        # The tables exist before the month is registered, so nobody attaches
+        # a half-created partition.
+        create_schema(conn, schema)
+        conn.commit()
+        conn.execute('INSERT OR IGNORE INTO order_partitions (month, file) VALUES (?, ?)', (month, file))
+        conn.commit()
+        return self.attach(conn, month)
+
+    def prepare_write(self, conn):
+        """Attach the partition new orders go to, creating it on the first
+        checkout of a month (and next month's, shortly before it starts)."""
+        now = time.time_ns() // 1000
+        for month in sorted({month_of(now), month_of(now + ROLLOVER_US)}):
+            if self.attach(conn, month) is None:
+                self.create(conn, month)
+
+    def locate(self, conn, order_id):
+        """The month ``order_id`` is stored in, or None if it is unknown."""
+        month = month_of_id(order_id)
+        if month is None:
+            row = conn.execute('SELECT month FROM order_locator WHERE id = ?', (order_id,)).fetchone()
+            month = row[0] if row else None
+        return month
+
+    def recover(self, conn):
+        """Finish or undo checkouts that a crash committed to only one of
+        their two files, and empty both journals. Checks the hot months with
+        journal entries in main and every hot month since the previous pass
+        (all of them on the first). Must be called outside a transaction;
+        returns the number of orders repaired."""
+        first, self.recovered = self.recovered or '', month_of(time.time_ns() // 1000)
+        months = [row[0] for row in conn.execute(
+            '''SELECT month FROM order_partitions
+               WHERE archived = 0 AND (month >= ? OR month IN (SELECT month FROM order_journal)) ORDER BY month''',
+            (first,))]
+        repaired = 0
+        for month in months:
+            schema = self.attach(conn, month)
+            # One file per transaction, in this order, so a crash during
+            # recovery leaves a state the next pass reads the same way.
+            repaired += _transaction(conn, lambda cur: _replay_partition_only(cur, month, schema))
+            _transaction(conn, lambda cur: cur.execute(
+                f'DELETE FROM {schema}.journal WHERE id IN (SELECT id FROM main.order_journal WHERE month = ?)', (month,)))
+            repaired += _transaction(conn, lambda cur: _settle_main_journal(cur, month, schema))
+        return repaired
+
+    def archive(self, conn, month, compress=False):
+        """Rewrite a past month into a compact read-only file and drop its hot
+        file. Returns what was written."""
+        if month >= month_of(time.time_ns() // 1000):
+            raise PartitionError('only past months can be archived')
+        row = conn.execute('SELECT file, archived FROM order_partitions WHERE month = ?', (month,)).fetchone()
+        if row is None:
+            raise PartitionError(f'no orders partition for {month}')
+        if row[1]:
+            return {'month': month, 'file': row[0], 'archived': False}
+        self.recover(conn)
+        schema = self.attach(conn, month)
+        hot = self.path(row[0])
+        file = f'{month}.archive.db'
+        tmp = self.path(f'{file}.tmp')
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        count = conn.execute(f'SELECT COUNT(*) FROM {schema}.orders').fetchone()[0]
+        # VACUUM INTO attaches its output file for the duration
+        self._make_room(conn, keep=month)
+        conn.execute(f'VACUUM {schema} INTO ?', (tmp,))
+        archive = sqlite3.connect(tmp)
+        try:
+            # Readers open it immutable: no WAL, nothing to recover
+            archive.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            archive.close()
+        if compress:
+            file += '.gz'
+            with open(tmp, 'rb') as src, gzip.open(f'{tmp}.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(tmp)
+            tmp += '.gz'
+        os.replace(tmp, self.path(file))
+        conn.execute(f'DETACH {schema}')
+        conn.execute('UPDATE order_partitions SET file = ?, archived = 1 WHERE month = ?', (file, month))
+        conn.commit()
+        # Connections that still have the hot file attached keep reading it
+        # until their next attach() notices the new file.
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(hot + suffix):
+                os.remove(hot + suffix)
+        return {'month': month, 'file': file, 'archived': True, 'orders': count,
+                'bytes': os.path.getsize(self.path(file))}
+
+    def rebuild_sales(self, conn):
+        """Recompute the daily sales aggregates from every partition in one
+        write transaction, so checkouts wait for it instead of being counted
+        twice and dashboards see the old totals until it commits. ``conn``
+        cannot attach inside that transaction, so the partitions are read
+        through a second connection to the same files. Returns the row counts."""
+        reader = sqlite3.connect(_main_file(conn))
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                sales.clear(conn)
+                for month in self.months(conn, newest_first=False):
+                    sales.add_orders(conn, self.attach(reader, month), source=reader)
+                counts = sales.counts(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        finally:
+            reader.close()
+        return counts
+
+    def _attached(self, conn):
+        return {row[1]: row[2] for row in conn.execute('PRAGMA database_list') if MONTH.match(row[1])}
+
+    def _make_room(self, conn, keep=None):
+        """Detach the earliest attached months (not ``keep``) until one more
+        database can be attached."""
+        attached = [row[1] for row in conn.execute('PRAGMA database_list') if row[1] not in ('main', 'temp')]
+        partitions = sorted(name for name in attached if MONTH.match(name) and name != keep)
+        excess = len(attached) - conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) + 1
+        for month in partitions[:max(excess, 0)]:
+            conn.execute(f'DETACH {schema_name(month)}')
+
+    def _readable(self, file):
+        """Path of an archived partition, extracting it first if gzipped."""
+        if not file.endswith('.gz'):
+            return self.path(file)
+        path = os.path.join(self.directory, 'cache', file[:-3])
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{os.getpid()}'
+            with gzip.open(self.path(file), 'rb') as src, open(tmp, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, path)
+        return path
+
+
+def _transaction(conn, work):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        result = work(conn.cursor())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+
+def _replay_partition_only(cur, month, schema):
+    """Apply the main-database half of orders only the partition committed,
+    and journal them in main as their checkout would have."""
+    found = cur.execute(f'''SELECT o.id, o.user_id, o.created_at FROM {schema}.journal JOIN {schema}.orders o ON o.id = journal.id
+                            WHERE NOT EXISTS (SELECT 1 FROM main.order_journal m WHERE m.id = journal.id)''').fetchall()
+    for order_id, user_id, created_us in found:
+        lines = [tuple(row) for row in cur.execute(
+            f'''SELECT s.product_id, p.category_id, i.quantity, i.quantity * i.unit_cents
+                FROM {schema}.order_items i JOIN main.product_snapshots s ON s.id = i.snapshot_id
+                LEFT JOIN main.products p ON p.id = s.product_id WHERE i.order_id = ? ORDER BY i.line_no''', (order_id,))]
+        for product_id, _, quantity, _ in lines:
+            # The units are sold either way; stock that no longer covers them
+            # bottoms out at zero.
+            cur.execute('UPDATE products SET stock = MAX(stock - ?, 0) WHERE id = ?', (quantity, product_id))
+        sales.record_order(cur, created_us, lines)
+        if user_id is not None:
+            cur.execute('INSERT OR IGNORE INTO order_user_months (user_id, month) VALUES (?, ?)', (user_id, month))
+        cur.execute('INSERT INTO order_journal (id, month, created_at, lines) VALUES (?, ?, ?, ?)',
+                    (order_id, month, created_us, json.dumps(lines)))
+    return len(found)
+
+
+def _settle_main_journal(cur, month, schema):
+    """Drop main journal entries the partition no longer journals, undoing
+    the stock decrement and aggregates of any whose order was lost."""
+    entries = cur.execute(f'''SELECT m.id, m.created_at, m.lines, o.id IS NULL FROM main.order_journal m
+                              LEFT JOIN {schema}.orders o ON o.id = m.id
+                              WHERE m.month = ? AND NOT EXISTS (SELECT 1 FROM {schema}.journal j WHERE j.id = m.id)''',
+                          (month,)).fetchall()
+    lost = 0
+    for _, created_us, lines, missing in entries:
+        if not missing:
+            continue
+        lines = json.loads(lines)
+        for product_id, _, quantity, _ in lines:
+            cur.execute('UPDATE products SET stock = stock + ? WHERE id = ?', (quantity, product_id))
+        sales.record_order(cur, created_us, [(pid, cid, -quantity, -cents) for pid, cid, quantity, cents in lines],
+                           orders=-1)
+        lost += 1
+    cur.executemany('DELETE FROM main.order_journal WHERE id = ?', [(entry[0],) for entry in entries])
+    return lost
+
+
+def add_journals(conn):
+    """Migration 9: add the ``journal`` table to the hot partitions, through
+    their own connections like ``migrate_orders``."""
+    files = [row[0] for row in conn.execute('SELECT file FROM order_partitions WHERE archived = 0')]
+    if not files:
+        return
+    partitions = OrderPartitions(partition_dir(_main_file(conn)))
+    for file in files:
+        target = sqlite3.connect(partitions.path(file))
+        try:
+            create_schema(target)
+            target.commit()
+        finally:
+            target.close()
+
+
+def _main_file(conn):
+    path = next(row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main')
+    if not path:
+        raise PartitionError('an in-memory database has no order partitions')
+    return path
+
+
+def migrate_orders(conn):
+    """Migration 8: copy the single ``orders``/``order_items`` tables into
+    monthly partition files and fill the routing tables.
+
+    The copies go through their own connections (ATTACH cannot run inside the
+    migration's transaction) with INSERT OR IGNORE, so a migration that fails
+    and is retried just finds some rows already copied.
+    """
+    first, last = conn.execute('SELECT MIN(created_at), MAX(created_at) FROM orders').fetchone()
+    if first is None:
+        return
+    partitions = OrderPartitions(partition_dir(_main_file(conn)))
+    os.makedirs(partitions.directory, exist_ok=True)
+    month = month_of(first)
+    while month <= month_of(last):
+        start, end = month_bounds(month)
+        file = f'{month}.db'
+        if conn.execute('SELECT 1 FROM orders WHERE created_at >= ? AND created_at < ? LIMIT 1', (start, end)).fetchone() is None:
+            month = month_of(end)
+            continue
+        target = sqlite3.connect(partitions.path(file))
+        try:
+            create_schema(target)
+            target.executemany(
+                f'INSERT OR IGNORE INTO orders ({", ".join(ORDER_FIELDS)}) VALUES ({", ".join("?" * len(ORDER_FIELDS))})',
+                conn.execute(f'SELECT {", ".join(ORDER_FIELDS)} FROM orders WHERE created_at >= ? AND created_at < ?',
+                             (start, end)))
+            target.executemany(
+                f'INSERT OR IGNORE INTO order_items ({", ".join(ITEM_FIELDS)}) VALUES ({", ".join("?" * len(ITEM_FIELDS))})',
+                conn.execute(f'''SELECT {", ".join("i." + f for f in ITEM_FIELDS)} FROM orders o
+                                 JOIN order_items i ON i.order_id = o.id
+                                 WHERE o.created_at >= ? AND o.created_at < ?''', (start, end)))
+            target.commit()
+        finally:
+            target.close()
+        conn.execute('INSERT OR IGNORE INTO order_partitions (month, file) VALUES (?, ?)', (month, file))
+        conn.execute('''INSERT OR IGNORE INTO order_user_months (user_id, month)
+                        SELECT DISTINCT user_id, ? FROM orders
+                        WHERE created_at >= ? AND created_at < ? AND user_id IS NOT NULL''', (month, start, end))
+        conn.execute('''INSERT OR IGNORE INTO order_locator (id, month)
+                        SELECT id, ? FROM orders WHERE created_at >= ? AND created_at < ?''', (month, start, end))
+        month = month_of(end)
@@ -0,0 +1,333 @@
+from datetime import datetime, timedelta, timezone
+import json
+from inventory import InsufficientStock, UnknownProduct
+import order_partitions
+import sales
+
+MAX_LINE_ITEMS = 100
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Orders are stored compactly (migration 5): money in integer cents,
+# timestamps in integer microseconds since the epoch, and customer contacts,
+# shipping addresses and product name/image snapshots interned in side tables
+# that orders and their lines point into. The API still returns the flat
+# shape below; order_select() joins it back together. Orders and their lines
+# live in monthly partitions (migration 8, see order_partitions.py); the
+# side tables stay in the main database.
+ORDER_COLUMNS = ('id', 'user_id', 'product_id', 'product_name', 'product_image', 'quantity', 'size',
+                 'unit_price', 'total_price', 'customer_name', 'customer_email', 'customer_phone',
+                 'shipping_street', 'shipping_city', 'shipping_state', 'shipping_zip_code', 'shipping_country',
+                 'payment_method', 'order_status', 'payment_status', 'estimated_delivery', 'created_at')
+
+CUSTOMER_COLUMNS = ('name', 'email', 'phone')
+ADDRESS_COLUMNS = ('street', 'city', 'state', 'zip_code', 'country')
+SNAPSHOT_COLUMNS = ('product_id', 'name', 'image_url')
+
+
+def order_select(schema):
+    """SELECT of the API's order columns from the partition ``schema``; the
+    header's product columns are those of its first line."""
+    return f'''SELECT o.id, o.user_id, s.product_id, s.name, s.image_url, o.quantity, i.size, i.unit_cents, o.total_cents,
+                     c.name, c.email, c.phone, a.street, a.city, a.state, a.zip_code, a.country,
+                     o.payment_method, o.order_status, o.payment_status, o.estimated_delivery, o.created_at
+              FROM {schema}.orders o
+              JOIN {schema}.order_items i ON i.order_id = o.id AND i.line_no = 1
+              JOIN main.product_snapshots s ON s.id = i.snapshot_id
+              LEFT JOIN main.customers c ON c.id = o.customer_id
+              LEFT JOIN main.addresses a ON a.id = o.address_id'''
+
+
+class OrderError(Exception):
+    """A checkout request that cannot be fulfilled; carries the HTTP status."""
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+    def to_dict(self):
+        return {"error": str(self), **self.extra}
+
+
+class StockChanged(OrderError):
+    """The database had less stock than the checkout expected."""
+
+    def __init__(self, product_id):
+        super().__init__("Insufficient stock", 400, product_id=product_id)
+
+
+def to_cents(amount):
+    return int(round(amount * 100))
+
+
+def from_cents(cents):
+    return None if cents is None else cents / 100
+
+
+def timestamp_us(moment):
+    """Microseconds since the epoch of an aware datetime (the stored form)."""
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def isoformat_us(value):
+    return None if value is None else (EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def order_values(row):
+    """A row of ``order_select`` converted to API values, in ``ORDER_COLUMNS`` order."""
+    values = list(row)
+    values[7] = from_cents(values[7])
+    values[8] = from_cents(values[8])
+    values[21] = isoformat_us(values[21])
+    return values
+
+
+def order_from_row(row):
+    """The API's order dict from a row of ``order_select``."""
+    return dict(zip(ORDER_COLUMNS, order_values(row)))
+
+
+def intern(cur, table, columns, values):
+    """Id of the ``table`` row holding exactly ``values``, inserted if new.
+
+    Side-table rows are never updated or deleted, so an existing match can
+    be shared by any number of orders.
+    """
+    match = ' AND '.join(f'{c} IS ?' for c in columns)
+    row = cur.execute(f'SELECT id FROM {table} WHERE {match}', values).fetchone()
+    if row is None:
+        row = cur.execute(f'''INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})
+                              ON CONFLICT DO NOTHING RETURNING id''', values).fetchone()
+        if row is None:
+            # A concurrent checkout inserted it after our SELECT
+            row = cur.execute(f'SELECT id FROM {table} WHERE {match}', values).fetchone()
+    return row[0]
+
+
+def parse_items(data):
+    """Normalize a checkout body into a list of line items.
+
+    Accepts either a cart (``items: [{product_id, quantity, size}, ...]``) or
+    the original single-product body (``product_id``, ``quantity``, ``size``).
+    """
+    if 'items' in data:
+        items = data['items']
+        if not isinstance(items, list) or not items:
+            raise OrderError("items must be a non-empty list")
+        if len(items) > MAX_LINE_ITEMS:
+            raise OrderError(f"An order can have at most {MAX_LINE_ITEMS} items")
+    else:
+        items = [{'product_id': data.get('product_id'), 'quantity': data.get('quantity'), 'size': data.get('size')}]
+
+    lines = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise OrderError("Each item must be an object")
+        for field in ('product_id', 'quantity', 'size'):
+            if not item.get(field):
+                raise OrderError(f"{field} is required")
+        try:
+            quantity = int(item['quantity'])
+        except (TypeError, ValueError):
+            raise OrderError("quantity must be an integer")
+        if quantity < 1:
+            raise OrderError("quantity must be positive")
+        lines.append({'product_id': item['product_id'], 'quantity': quantity, 'size': item['size']})
+    return lines
+
+
+def place_order(conn, user_id, lines, customer_info, shipping_address, partitions, inventory=None, writer=None):
+    """Validate stock for every line and write the order in one transaction.
+
+    Stock for all products is read with one ``IN (...)`` query, the header and
+    its ``order_items`` are inserted with one statement each, and the whole
+    checkout is committed once regardless of how many lines it has. Stock is
+    decremented with ``WHERE stock >= ?`` so concurrent checkouts can never
+    drive it negative; with an ``InventoryEngine`` the units are reserved in
+    memory first and sold-out products are rejected before any query runs.
+    With a ``GroupCommitWriter`` the writes run on the writer's connection and
+    share a commit with other checkouts (the writer attaches the current
+    partition before each batch); otherwise ``conn`` attaches it and commits.
+    """
+    needed = {}
+    for line in lines:
+        needed[line['product_id']] = needed.get(line['product_id'], 0) + line['quantity']
+
+    hold = None
+    if inventory is not None:
+        try:
+            hold = inventory.reserve(needed, lambda pids: stock_levels(conn, pids))
+        except UnknownProduct as e:
+            raise OrderError("Product not found", 404, product_id=e.product_id)
+        except InsufficientStock as e:
+            raise OrderError("Insufficient stock", 400, product_id=e.product_id)
+
+    def write(conn):
+        return _write_order(conn.cursor(), user_id, lines, needed, customer_info, shipping_address)
+
+    try:
+        if writer is not None:
+            order = writer.submit(write)
+        else:
+            try:
+                partitions.prepare_write(conn)
+                # Checkouts write two files (main and the partition); taking
+                # every write lock up front, main first, keeps two of them
+                # from each holding one and waiting on the other.
+                conn.execute('BEGIN IMMEDIATE')
+                order = write(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    except StockChanged:
+        if hold is not None:
+            inventory.release(hold, stale=True)
+        raise
+    except Exception:
+        if hold is not None:
+            inventory.release(hold)
+        raise
+    if hold is not None:
+        inventory.commit(hold)
+    return order
+
+
+def stock_levels(conn, product_ids):
+    ids = list(product_ids)
+    cur = conn.execute(f'SELECT id, stock FROM products WHERE id IN ({", ".join("?" * len(ids))})', ids)
+    return {row['id']: row['stock'] for row in cur}
+
+
+def _write_order(cur, user_id, lines, needed, customer_info, shipping_address):
+    """Insert the order and decrement stock, without committing; the caller
+    commits or rolls back."""
+    ids = list(needed)
+    cur.execute(f'SELECT id, name, image_url, price, stock, category_id FROM products WHERE id IN ({", ".join("?" * len(ids))})', ids)
+    products = {row['id']: row for row in cur.fetchall()}
+    for product_id, quantity in needed.items():
+        prod = products.get(product_id)
+        if prod is None:
+            raise OrderError("Product not found", 404, product_id=product_id)
+        if prod['stock'] < quantity:
+            raise StockChanged(product_id)
+
+    items = []
+    for line in lines:
+        prod = products[line['product_id']]
+        unit_cents = to_cents(prod['price'])
+        items.append({
+            "product_id": prod['id'],
+            "product_name": prod['name'],
+            "product_image": prod['image_url'],
+            "quantity": line['quantity'],
+            "size": line['size'],
+            "unit_price": from_cents(unit_cents),
+            "total_price": from_cents(unit_cents * line['quantity']),
+        })
+
+    # The header keeps the first line's product columns so single-item orders
+    # (and list views written against them) look exactly as before.
+    first = items[0]
+    created_at = datetime.now(timezone.utc)
+    created_us = timestamp_us(created_at)
+    # A UUIDv7 carries its creation time, so the order's partition can be
+    # found from the id alone.
+    month = order_partitions.month_of(created_us)
+    total_cents = sum(to_cents(item['unit_price']) * item['quantity'] for item in items)
+    order = {
+        "id": order_partitions.new_order_id(created_us),
+        "user_id": user_id,
+        "product_id": first['product_id'],
+        "product_name": first['product_name'],
+        "product_image": first['product_image'],
+        "quantity": sum(item['quantity'] for item in items),
+        "size": first['size'],
+        "unit_price": first['unit_price'],
+        "total_price": from_cents(total_cents),
+        "customer_info": {
+            "name": customer_info['name'],
+            "email": customer_info['email'],
+            "phone": customer_info['phone']
+        },
+        "shipping_address": {
+            "street": shipping_address['street'],
+            "city": shipping_address['city'],
+            "state": shipping_address['state'],
+            "zip_code": shipping_address['zip_code'],
+            "country": shipping_address.get('country', 'India')
+        },
+        "payment_method": "Cash on Delivery",
+        "order_status": "confirmed",
+        "payment_status": "pending",
+        "estimated_delivery": "5-7 business days",
+        "created_at": created_at.isoformat(),
+        "items": items,
+    }
+
+    customer_id = intern(cur, 'customers', CUSTOMER_COLUMNS,
+                         [order['customer_info'][c] for c in CUSTOMER_COLUMNS])
+    address_id = intern(cur, 'addresses', ADDRESS_COLUMNS,
+                        [order['shipping_address'][c] for c in ADDRESS_COLUMNS])
+    snapshots = {}
+    for item in items:
+        key = (item['product_id'], item['product_name'], item['product_image'])
+        if key not in snapshots:
+            snapshots[key] = intern(cur, 'product_snapshots', SNAPSHOT_COLUMNS, key)
+    schema = order_partitions.schema_name(month)
+    cur.execute(f'''INSERT INTO {schema}.orders (id, user_id, customer_id, address_id, quantity, total_cents,
+                   payment_method, order_status, payment_status, estimated_delivery, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', (
+        order['id'], order['user_id'], customer_id, address_id, order['quantity'], total_cents,
+        order['payment_method'], order['order_status'], order['payment_status'], order['estimated_delivery'],
+        created_us
+    ))
+    cur.executemany(f'''INSERT INTO {schema}.order_items (order_id, line_no, snapshot_id, quantity, size, unit_cents)
+                       VALUES (?, ?, ?, ?, ?, ?)''',
+                    [(order['id'], n, snapshots[(item['product_id'], item['product_name'], item['product_image'])],
+                      item['quantity'], item['size'], to_cents(item['unit_price']))
+                     for n, item in enumerate(items, 1)])
+    if user_id is not None:
+        cur.execute('INSERT OR IGNORE INTO order_user_months (user_id, month) VALUES (?, ?)', (user_id, month))
+    # Both files journal the order until OrderPartitions.recover has checked
+    # that each committed its half.
+    sold = [(item['product_id'], products[item['product_id']]['category_id'], item['quantity'],
+             to_cents(item['unit_price']) * item['quantity']) for item in items]
+    cur.execute(f'INSERT INTO {schema}.journal (id) VALUES (?)', (order['id'],))
+    cur.execute('INSERT INTO order_journal (id, month, created_at, lines) VALUES (?, ?, ?, ?)',
+                (order['id'], month, created_us, json.dumps(sold)))
+    # Conditional decrement: a product whose stock changed since the read
+    # above matches no row, and the whole checkout is rolled back.
+    for product_id, quantity in needed.items():
+        cur.execute('UPDATE products SET stock = stock - ? WHERE id = ? AND stock >= ?', (quantity, product_id, quantity))
+        if cur.rowcount != 1:
+            raise StockChanged(product_id)
+    sales.record_order(cur, created_us, sold)
+    return order
+
+
+def attach_items(conn, orders, schema):
+    """Add an ``items`` list to each order dict (all from the partition
+    ``schema``) with a single batched query."""
+    if not orders:
+        return orders
+    by_id = {o['id']: o for o in orders}
+    for o in orders:
+        o['items'] = []
+    ids = list(by_id)
+    cur = conn.cursor()
+    cur.execute(f'''SELECT i.order_id, s.product_id, s.name, s.image_url, i.quantity, i.size, i.unit_cents
+                    FROM {schema}.order_items i JOIN main.product_snapshots s ON s.id = i.snapshot_id
+                    WHERE i.order_id IN ({", ".join("?" * len(ids))}) ORDER BY i.order_id, i.line_no''', ids)
+    for order_id, product_id, name, image_url, quantity, size, unit_cents in cur.fetchall():
+        by_id[order_id]['items'].append({
+            "product_id": product_id,
+            "product_name": name,
+            "product_image": image_url,
+            "quantity": quantity,
+            "size": size,
+            "unit_price": from_cents(unit_cents),
+            "total_price": from_cents(unit_cents * quantity),
+        })
+    return orders
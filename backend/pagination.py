@@ -0,0 +1,64 @@
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    """Pack the sort key of the last row on a page into an opaque token."""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _sort_value(value):
+    """A value SQLite can bind: None, a string, a float or a 64-bit int."""
+    if value is None:
+        return True
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 63
+    return isinstance(value, (str, float))
+
+
+def decode_cursor(token, size=2):
+    """The values of a cursor token: ``size - 1`` sort key values followed by
+    the row id (a string)."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise PaginationError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise PaginationError("Invalid cursor")
+    if not all(map(_sort_value, values[:-1])) or not isinstance(values[-1], str):
+        raise PaginationError("Invalid cursor")
+    return values
+
+
+def page_args(args, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Read ``limit`` and ``after`` from the query string.
+
+    Returns ``(limit, after)`` where ``after`` is the decoded cursor or None.
+    """
+    try:
+        limit = int(args.get('limit', default))
+    except ValueError:
+        raise PaginationError("limit must be an integer")
+    if limit < 1:
+        raise PaginationError("limit must be positive")
+    after = args.get('after')
+    return min(limit, maximum), decode_cursor(after) if after else None
+
+
+def page(rows, limit, key):
+    """Split a ``LIMIT limit + 1`` result into the page and its next cursor."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
@@ -0,0 +1,108 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import bcrypt
+
+# Upper bounds (seconds) of the queue-wait histogram buckets.
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float('inf'))
+
+HASH_COST = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+
+class HasherBusy(Exception):
+    """The hashing queue is full (or the job timed out); retry later."""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool.
+
+    bcrypt releases the GIL while it works, so a couple of worker threads keep
+    the CPU-heavy hashing off the request threads without a process pool. At
+    most ``workers + max_queue`` jobs are admitted; beyond that callers get
+    ``HasherBusy`` immediately instead of piling up behind a login storm.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_queue=32, timeout=10.0):
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+
+    def hash(self, password):
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def check(self, pw_hash, password):
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), pw_hash.encode('utf-8'))
+
+    def needs_rehash(self, pw_hash):
+        """True when ``pw_hash`` was made with a different work factor."""
+        match = HASH_COST.match(pw_hash)
+        return match is None or int(match.group(1)) != self.rounds
+
+    def stats(self):
+        with self._lock:
+            return {
+                'jobs': self.jobs,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'wait_sum': self.wait_sum,
+                'wait_max': self.wait_max,
+                'wait_buckets': list(zip(WAIT_BUCKETS, self.wait_buckets)),
+            }
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("Password hashing queue is full")
+        submitted = time.perf_counter()
+
+        def job():
+            self._record_wait(time.perf_counter() - submitted)
+            return fn(*args)
+
+        try:
+            future = self._executor.submit(job)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Drop the job if it has not started; nobody is waiting for it.
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise HasherBusy("Password hashing timed out")
+
+    def _record_wait(self, waited):
+        with self._lock:
+            self.jobs += 1
+            self.wait_sum += waited
+            self.wait_max = max(self.wait_max, waited)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if waited <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+
+
+def init_app(app):
+    hasher = PasswordHasher(
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', 12),
+        workers=app.config.get('BCRYPT_WORKERS', min(4, os.cpu_count() or 1)),
+        max_queue=app.config.get('BCRYPT_MAX_QUEUE', 32),
+    )
+    app.extensions['password_hasher'] = hasher
+    return hasher
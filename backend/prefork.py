@@ -0,0 +1,126 @@
+"""Pre-forking entrypoint: several worker processes on one listening socket.
+
+    python prefork.py --workers 4 --port 8001
+
+The parent builds the app, renders the shared catalog snapshot
+(catalog_snapshot.py), closes every SQLite handle it opened while doing so,
+and only then forks; a worker never inherits an open database connection
+and opens its own on first use (pools, the session store and the
+group-commit writer are all lazy). Each worker runs a threaded werkzeug
+server on the inherited socket and the kernel spreads connections across
+them, so CPU-bound request handling scales past one core and the GIL.
+
+Caches stay per worker but coherent: invalidations go through the shared
+board (invalidation.py), so a checkout or profile update in one worker
+retires the cached copies in all of them. The in-memory inventory counters
+are per worker too; the conditional stock decrement keeps them from ever
+overselling (see inventory.py).
+
+The parent restarts workers that die and, every
+``CATALOG_SNAPSHOT_INTERVAL`` seconds, re-renders the snapshot entries that
+were invalidated since the last pass.
+``--no-snapshot`` keeps the shared invalidations but skips the snapshot, so
+every worker warms its own cache from SQLite.
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+
+from werkzeug.serving import make_server
+
+import catalog_snapshot
+from server import create_app
+
+
+def release_handles(app):
+    """Close the SQLite connections this process holds (before a fork)."""
+    app.extensions['db_pool'].close_all()
+    store = getattr(app.session_interface, 'store', None)
+    pool = getattr(store, 'pool', None)
+    if pool is not None:
+        pool.close_all()
+
+
+def serve(app, host, port, workers, snapshot=True, interval=30.0, log=sys.stderr):
+    if workers > 1 and app.config['SESSION_BACKEND'] == 'memory':
+        # Each worker would keep its own sessions: a login would only count on
+        # the connections the kernel happens to hand to the same worker
+        raise SystemExit('prefork: SESSION_BACKEND=memory keeps sessions per worker; '
+                         'use sqlite or cookie with more than one worker')
+    catalog_snapshot.share(app)
+    started = time.perf_counter()
+    if snapshot:
+        count = catalog_snapshot.refresh(app)
+        print(f'catalog snapshot: {count} responses in {time.perf_counter() - started:.2f}s', file=log)
+    release_handles(app)
+    server = make_server(host, port, app, threaded=True)
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                server.serve_forever()
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    print(f'serving on http://{host}:{port} with {workers} workers', file=log, flush=True)
+
+    next_refresh = time.monotonic() + interval
+    while children:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            children.discard(pid)
+            if not stopping:
+                spawn()
+            continue
+        if snapshot and not stopping and time.monotonic() >= next_refresh:
+            if catalog_snapshot.stale(app):
+                catalog_snapshot.refresh(app)
+                release_handles(app)
+            next_refresh = time.monotonic() + interval
+        time.sleep(0.2)
+    server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '8001')))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('PREFORK_WORKERS', str(os.cpu_count() or 1))))
+    parser.add_argument('--no-snapshot', action='store_true', help='Do not share a rendered catalog snapshot.')
+    args = parser.parse_args()
+
+    app = create_app()
+    serve(app, args.host, args.port, args.workers, snapshot=not args.no_snapshot,
+          interval=app.config['CATALOG_SNAPSHOT_INTERVAL'])
+
+
+if __name__ == '__main__':
+    main()
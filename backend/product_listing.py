@@ -0,0 +1,184 @@
+"""Filters, sort orders and facet counts for ``GET /api/products``.
+
+Every sort has a matching index (migration 6), with and without a leading
+``category_id``, so a page is an index range scan from the keyset cursor
+whatever the sort. Facet counts are range counts over the covering
+``(category_id, price, id, stock)`` index, never reads of the table itself.
+"""
+
+# Sort name -> (key column, descending). The key is paired with ``id`` for
+# a total order, which is also what the keyset cursor holds.
+SORTS = {
+    'created': ('created_at', False),
+    'newest': ('created_at', True),
+    'price': ('price', False),
+    'price_desc': ('price', True),
+    'name': ('name', False),
+}
+DEFAULT_SORT = 'created'
+
+# Upper bounds of the price facet buckets; the last bucket is open-ended.
+PRICE_BUCKETS = (25, 50, 100, 200)
+
+MAX_CATEGORIES = 50
+MAX_IDS = 100
+
+# Every column a product response can carry, in response order. ``fields=``
+# picks a subset; ``id`` is always included.
+FIELDS = ('id', 'name', 'description', 'price', 'category_id', 'category_name', 'image_url', 'stock', 'created_at')
+
+
+class ListingError(ValueError):
+    pass
+
+
+def _price(args, name):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ListingError(f"{name} must be a number")
+
+
+def parse_filters(args):
+    """Read ``category_id`` (repeated or comma-separated), ``min_price``,
+    ``max_price``, ``in_stock`` and ``sort`` from the query string.
+
+    Returns a hashable tuple ``(categories, min_price, max_price, in_stock,
+    sort)``, usable as part of a cache key.
+    """
+    categories = sorted({c for value in args.getlist('category_id') for c in value.split(',') if c})
+    if len(categories) > MAX_CATEGORIES:
+        raise ListingError(f"at most {MAX_CATEGORIES} categories")
+    sort = args.get('sort', DEFAULT_SORT)
+    if sort not in SORTS:
+        raise ListingError(f"sort must be one of: {', '.join(SORTS)}")
+    in_stock = args.get('in_stock', '').lower() in ('1', 'true', 'yes')
+    return tuple(categories), _price(args, 'min_price'), _price(args, 'max_price'), in_stock, sort
+
+
+def parse_fields(args):
+    """The columns named by ``fields`` (comma-separated), in ``FIELDS``
+    order, or every column when it is absent."""
+    value = args.get('fields')
+    if not value:
+        return FIELDS
+    requested = {f.strip() for f in value.split(',') if f.strip()}
+    unknown = requested.difference(FIELDS)
+    if unknown:
+        raise ListingError(f"unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(f for f in FIELDS if f == 'id' or f in requested)
+
+
+def parse_ids(args):
+    """Product ids from ``ids`` (repeated or comma-separated), in request
+    order without duplicates."""
+    ids = tuple(dict.fromkeys(i for value in args.getlist('ids') for i in value.split(',') if i))
+    if not ids:
+        raise ListingError("ids must name at least one product")
+    if len(ids) > MAX_IDS:
+        raise ListingError(f"at most {MAX_IDS} ids")
+    return ids
+
+
+def project(rows, fields):
+    return [{f: row[f] for f in fields} for row in rows]
+
+
+def _where(categories=(), min_price=None, max_price=None, in_stock=False):
+    where, params = [], []
+    if len(categories) == 1:
+        where.append('category_id = ?')
+        params.append(categories[0])
+    elif categories:
+        where.append(f'category_id IN ({", ".join("?" * len(categories))})')
+        params.extend(categories)
+    if min_price is not None:
+        where.append('price >= ?')
+        params.append(min_price)
+    if max_price is not None:
+        where.append('price <= ?')
+        params.append(max_price)
+    if in_stock:
+        where.append('stock > 0')
+    return where, params
+
+
+def page_query(filters, after, limit, fields=FIELDS):
+    """SQL and parameters for one ``LIMIT limit + 1`` keyset page.
+
+    Selects ``fields`` plus the sort key the next cursor is built from.
+    """
+    categories, min_price, max_price, in_stock, sort = filters
+    key, descending = SORTS[sort]
+    where, params = _where(categories, min_price, max_price, in_stock)
+    if after:
+        where.append(f'({key}, id) {"<" if descending else ">"} (?, ?)')
+        params.extend(after)
+    columns = fields if key in fields else fields + (key,)
+    sql = f'SELECT {", ".join(columns)} FROM products'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    direction = ' DESC' if descending else ''
+    sql += f' ORDER BY {key}{direction}, id{direction} LIMIT ?'
+    return sql, params + [limit + 1]
+
+
+def batch_query(ids, fields=FIELDS):
+    """SQL and parameters resolving every id of ``ids`` in one query."""
+    return f'SELECT {", ".join(fields)} FROM products WHERE id IN ({", ".join("?" * len(ids))})', list(ids)
+
+
+def sort_key(filters):
+    """The row -> cursor values function for the page's sort."""
+    key = SORTS[filters[4]][0]
+    return lambda row: (row[key], row['id'])
+
+
+def facets(conn, filters):
+    """Counts per category and per price bucket, in one statement.
+
+    Each facet ignores its own filter, so the counts say how many products
+    another category or price range would show with the remaining filters.
+    Every part of the compound SELECT is a count over a range of the covering
+    ``(category_id, price, id, stock)`` index: the category counts over the
+    selected price range, each bucket over its own range within the selected
+    categories. No row outside those ranges is visited, and nothing is sorted.
+    """
+    categories, min_price, max_price, in_stock, _ = filters
+    parts, params = [], []
+
+    def count(select, where, where_params, group=''):
+        where = where + (['stock > 0'] if in_stock else [])
+        parts.append(f'SELECT {select}, COUNT(*) FROM products INDEXED BY idx_products_category_price'
+                     + (' WHERE ' + ' AND '.join(where) if where else '') + group)
+        params.extend(where_params)
+
+    where, where_params = _where(min_price=min_price, max_price=max_price)
+    count('category_id, NULL', where, where_params, ' GROUP BY category_id')
+    bounds = (0,) + PRICE_BUCKETS + (None,)
+    for i in range(len(PRICE_BUCKETS) + 1):
+        where, where_params = _where(categories)
+        if i:
+            where.append('price >= ?')
+            where_params.append(bounds[i])
+        if bounds[i + 1] is not None:
+            where.append('price < ?')
+            where_params.append(bounds[i + 1])
+        count(f'NULL, {i}', where, where_params)
+
+    by_category, by_bucket = {}, [0] * (len(PRICE_BUCKETS) + 1)
+    for category_id, bucket, n in conn.execute(' UNION ALL '.join(parts), params):
+        if bucket is None:
+            by_category[category_id] = n
+        else:
+            by_bucket[bucket] = n
+
+    names = dict(conn.execute('SELECT id, name FROM categories').fetchall())
+    return {
+        "categories": [{"id": c, "name": names.get(c), "count": n}
+                       for c, n in sorted(by_category.items(), key=lambda item: (-item[1], str(item[0])))],
+        "price": [{"min": bounds[i], "max": bounds[i + 1], "count": n} for i, n in enumerate(by_bucket)],
+    }
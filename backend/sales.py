@@ -0,0 +1,168 @@
+"""Daily sales aggregates, kept up to date by checkout.
+
+``sales_daily``, ``sales_category_daily`` and ``sales_product_daily``
+(migration 7) hold orders, units and revenue per UTC day, overall and per
+category / product. ``record_order`` adds a checkout to them in the
+checkout's own transaction, so a dashboard reads a few rows per day instead
+of scanning ``orders``. ``add_orders`` adds a whole orders table (one
+monthly partition, see order_partitions.py) to them, for rebuilds.
+
+A sale is counted under the product's category at checkout time; a rebuild
+uses the categories products have now.
+"""
+from datetime import date, timedelta
+
+US_PER_DAY = 86_400_000_000
+EPOCH_DAY = date(1970, 1, 1)
+
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 366
+TOP_PRODUCTS = 20
+MAX_TOP_PRODUCTS = 200
+
+
+class SalesQueryError(ValueError):
+    pass
+
+
+def day_number(created_us):
+    """Days since the epoch (UTC) of a stored ``created_at``."""
+    return created_us // US_PER_DAY
+
+
+def day_iso(day):
+    return (EPOCH_DAY + timedelta(days=day)).isoformat()
+
+
+def _day_arg(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return (date.fromisoformat(value) - EPOCH_DAY).days
+    except ValueError:
+        raise SalesQueryError(f"{name} must be a date (YYYY-MM-DD)")
+
+
+def parse_range(args, today):
+    """``from``/``to`` (inclusive ISO dates) as day numbers; the last
+    ``DEFAULT_RANGE_DAYS`` days up to ``today`` by default."""
+    last = _day_arg(args, 'to')
+    last = day_number(today) if last is None else last
+    first = _day_arg(args, 'from')
+    first = last - DEFAULT_RANGE_DAYS + 1 if first is None else first
+    if first > last:
+        raise SalesQueryError("from must not be after to")
+    if last - first + 1 > MAX_RANGE_DAYS:
+        raise SalesQueryError(f"at most {MAX_RANGE_DAYS} days per query")
+    return first, last
+
+
+def _upsert(table, key):
+    return f'''INSERT INTO {table} (day, {key}, orders, units, revenue_cents) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (day, {key}) DO UPDATE SET orders = orders + excluded.orders,
+                   units = units + excluded.units, revenue_cents = revenue_cents + excluded.revenue_cents'''
+
+
+UPSERT_PRODUCT = _upsert('sales_product_daily', 'product_id')
+UPSERT_CATEGORY = _upsert('sales_category_daily', 'category_id')
+UPSERT_DAY = '''INSERT INTO sales_daily (day, orders, units, revenue_cents) VALUES (?, ?, ?, ?)
+                ON CONFLICT (day) DO UPDATE SET orders = orders + excluded.orders,
+                    units = units + excluded.units, revenue_cents = revenue_cents + excluded.revenue_cents'''
+
+
+def record_order(cur, created_us, lines, orders=1):
+    """Add one order to the aggregates. ``lines`` are ``(product_id,
+    category_id, quantity, revenue_cents)``; an order counts once per product
+    and category however many of its lines they appear on. ``orders=-1`` with
+    negated lines takes an order back out."""
+    day = day_number(created_us)
+    by_product, by_category = {}, {}
+    for product_id, category_id, quantity, cents in lines:
+        units, revenue = by_product.get(product_id, (0, 0))
+        by_product[product_id] = (units + quantity, revenue + cents)
+        units, revenue = by_category.get(category_id or '', (0, 0))
+        by_category[category_id or ''] = (units + quantity, revenue + cents)
+    cur.executemany(UPSERT_PRODUCT, [(day, pid, orders, units, revenue) for pid, (units, revenue) in by_product.items()])
+    cur.executemany(UPSERT_CATEGORY, [(day, cid, orders, units, revenue) for cid, (units, revenue) in by_category.items()])
+    cur.execute(UPSERT_DAY, (day, orders, sum(u for u, _ in by_product.values()), sum(r for _, r in by_product.values())))
+
+
+def clear(conn):
+    conn.execute('DELETE FROM sales_product_daily')
+    conn.execute('DELETE FROM sales_category_daily')
+    conn.execute('DELETE FROM sales_daily')
+
+
+def add_orders(conn, schema='main', source=None):
+    """Add every order in ``schema``'s ``orders``/``order_items`` to the
+    aggregates, inside the caller's transaction on ``conn``. The orders are
+    read through ``source`` (default ``conn``), which must see the same main
+    database and have ``schema`` attached."""
+    source = conn if source is None else source
+    lines = f'''SELECT o.created_at / {US_PER_DAY} AS day, o.id AS order_id, s.product_id,
+                       COALESCE(p.category_id, '') AS category_id, i.quantity, i.quantity * i.unit_cents AS cents
+                FROM {schema}.orders o
+                JOIN {schema}.order_items i ON i.order_id = o.id
+                JOIN main.product_snapshots s ON s.id = i.snapshot_id
+                LEFT JOIN main.products p ON p.id = s.product_id'''
+    by_product = f'SELECT day, product_id, COUNT(DISTINCT order_id), SUM(quantity), SUM(cents) FROM ({lines}) GROUP BY 1, 2'
+    by_category = f'SELECT day, category_id, COUNT(DISTINCT order_id), SUM(quantity), SUM(cents) FROM ({lines}) GROUP BY 1, 2'
+    by_day = f'SELECT created_at / {US_PER_DAY}, COUNT(*), SUM(quantity), SUM(total_cents) FROM {schema}.orders GROUP BY 1'
+    conn.executemany(UPSERT_PRODUCT, source.execute(by_product))
+    conn.executemany(UPSERT_CATEGORY, source.execute(by_category))
+    conn.executemany(UPSERT_DAY, source.execute(by_day))
+
+
+def counts(conn):
+    return {t: conn.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0]
+            for t in ('sales_daily', 'sales_category_daily', 'sales_product_daily')}
+
+
+def rebuild(conn):
+    """Recompute every aggregate from the ``orders``/``order_items`` tables of
+    the main database, inside the caller's transaction (migration 7; since
+    migration 8 orders live in monthly partitions, see
+    ``OrderPartitions.rebuild_sales``). Returns the row counts."""
+    clear(conn)
+    add_orders(conn)
+    return counts(conn)
+
+
+def _totals(row):
+    return {"orders": row['orders'], "units": row['units'], "revenue": row['revenue_cents'] / 100}
+
+
+def daily(conn, first, last):
+    rows = conn.execute('SELECT day, orders, units, revenue_cents FROM sales_daily WHERE day BETWEEN ? AND ? ORDER BY day',
+                        (first, last))
+    return [{"day": day_iso(r['day']), **_totals(r)} for r in rows]
+
+
+def by_category(conn, first, last):
+    rows = conn.execute('''SELECT d.day, d.category_id, c.name, d.orders, d.units, d.revenue_cents
+                           FROM sales_category_daily d LEFT JOIN categories c ON c.id = d.category_id
+                           WHERE d.day BETWEEN ? AND ? ORDER BY d.day, d.category_id''', (first, last))
+    return [{"day": day_iso(r['day']), "category_id": r['category_id'] or None, "category_name": r['name'], **_totals(r)}
+            for r in rows]
+
+
+def product_series(conn, product_id, first, last):
+    rows = conn.execute('''SELECT day, orders, units, revenue_cents FROM sales_product_daily
+                           WHERE product_id = ? AND day BETWEEN ? AND ? ORDER BY day''', (product_id, first, last))
+    return [{"day": day_iso(r['day']), **_totals(r)} for r in rows]
+
+
+def top_products(conn, first, last, limit=TOP_PRODUCTS, by='revenue'):
+    order = 'revenue_cents' if by == 'revenue' else 'units'
+    # Rank first, then look up names for the winners only. ``+product_id``
+    # keeps the planner on the day range of the primary key instead of
+    # skip-scanning the (product_id, day) index across every product.
+    rows = conn.execute(f'''SELECT t.*, p.name FROM (
+                                SELECT product_id, SUM(orders) AS orders, SUM(units) AS units,
+                                       SUM(revenue_cents) AS revenue_cents
+                                FROM sales_product_daily WHERE day BETWEEN ? AND ?
+                                GROUP BY +product_id ORDER BY {order} DESC, product_id LIMIT ?) t
+                            LEFT JOIN products p ON p.id = t.product_id
+                            ORDER BY t.{order} DESC, t.product_id''', (first, last, limit))
+    return [{"product_id": r['product_id'], "product_name": r['name'], **_totals(r)} for r in rows]
@@ -1,440 +1,537 @@
-from flask import Flask, request, jsonify, session
-from flask_bcrypt import Bcrypt
-from flask_session import Session
+from flask import Blueprint, Flask, current_app, request, jsonify, session, stream_with_context
 from flask_cors import CORS
-import sqlite3
 from datetime import datetime, timezone
+from werkzeug.local import LocalProxy
+import click
+import csv
+import hmac
+import io
+import json
 import os
+import re
+import time
 import uuid
 from dotenv import load_dotenv
 from pathlib import Path
+import db
+from db import get_db
+from catalog_cache import CatalogCache, generation_path, product_tag
+import catalog_import
+import compression
+import group_commit
+from catalog_import import CatalogImportError
+from pagination import PaginationError, page, page_args
+import product_listing
+import sales
+import metrics
+import migrations
+import passwords
+from passwords import HasherBusy
+import orders
+import order_partitions
+from order_partitions import OrderPartitions, PartitionError
+from inventory import InventoryEngine
+import sessions
+from ttl_cache import TTLCache
 
-# Load environment variables
 ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# Initialize Flask app
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_PERMANENT'] = False
-app.config['SESSION_USE_SIGNER'] = True
-
-# Initialize extensions
-bcrypt = Bcrypt(app)
-Session(app)
-CORS(app, origins=os.environ.get('CORS_ORIGINS', '*').split(','), supports_credentials=True)
-
-# SQLite connection (file-based)
-DB_PATH = os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'data.db'))
-
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-conn = get_db_connection()
-
-# Convenience: ensure tables exist
-def create_tables():
-    cur = conn.cursor()
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY,
-            username TEXT UNIQUE,
-            email TEXT UNIQUE,
-            password TEXT,
-            full_name TEXT,
-            created_at TEXT
-        )
-    ''')
-
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS categories (
-            id TEXT PRIMARY KEY,
-            name TEXT UNIQUE,
-            image_url TEXT,
-            created_at TEXT
-        )
-    ''')
-
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id TEXT PRIMARY KEY,
-            name TEXT UNIQUE,
-            description TEXT,
-            price REAL,
-            category_id TEXT,
-            category_name TEXT,
-            image_url TEXT,
-            stock INTEGER,
-            created_at TEXT
-        )
-    ''')
-
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            id TEXT PRIMARY KEY,
-            user_id TEXT,
-            product_id TEXT,
-            product_name TEXT,
-            product_image TEXT,
-            quantity INTEGER,
-            size TEXT,
-            unit_price REAL,
-            total_price REAL,
-            customer_name TEXT,
-            customer_email TEXT,
-            customer_phone TEXT,
-            shipping_street TEXT,
-            shipping_city TEXT,
-            shipping_state TEXT,
-            shipping_zip_code TEXT,
-            shipping_country TEXT,
-            payment_method TEXT,
-            order_status TEXT,
-            payment_status TEXT,
-            estimated_delivery TEXT,
-            created_at TEXT
-        )
-    ''')
-    conn.commit()
 
-create_tables()
+def load_config():
+    """Settings from the environment (and backend/.env)."""
+    load_dotenv(ROOT_DIR / '.env')
+    return {
+        'SECRET_KEY': 'your-secret-key-here',
+        'SESSION_PERMANENT': False,
+        'CORS_ORIGINS': os.environ.get('CORS_ORIGINS', '*').split(','),
+
+        # Session backend: 'sqlite' (default), 'memory' or 'cookie' (see sessions.py)
+        'SESSION_BACKEND': os.environ.get('SESSION_BACKEND', 'sqlite'),
+        'SESSION_SQLITE_PATH': os.environ.get('SESSION_SQLITE_PATH', str(ROOT_DIR / 'sessions.db')),
+        'SESSION_TTL': int(os.environ.get('SESSION_TTL', str(7 * 24 * 3600))),
+
+        # Password hashing runs on a bounded bcrypt pool (see passwords.py); changing
+        # BCRYPT_LOG_ROUNDS rehashes existing passwords on their next login.
+        'BCRYPT_LOG_ROUNDS': int(os.environ.get('BCRYPT_LOG_ROUNDS', '12')),
+        'BCRYPT_WORKERS': int(os.environ.get('BCRYPT_WORKERS', str(min(4, os.cpu_count() or 1)))),
+        'BCRYPT_MAX_QUEUE': int(os.environ.get('BCRYPT_MAX_QUEUE', '32')),
+
+        # SQLite connection pool (file-based); one connection is checked out per request
+        'SQLITE_PATH': os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'data.db')),
+        'SQLITE_POOL_SIZE': int(os.environ.get('SQLITE_POOL_SIZE', '16')),
+
+        'CATALOG_CACHE_SIZE': int(os.environ.get('CATALOG_CACHE_SIZE', '1024')),
+        'USER_CACHE_SIZE': int(os.environ.get('USER_CACHE_SIZE', '10000')),
+        'USER_CACHE_TTL': float(os.environ.get('USER_CACHE_TTL', '300')),
+        'INVENTORY_HOLD_TTL': float(os.environ.get('INVENTORY_HOLD_TTL', '30')),
+        'INVENTORY_RECONCILE_INTERVAL': float(os.environ.get('INVENTORY_RECONCILE_INTERVAL', '30')),
+        # Checkouts share one durable commit per batch (see group_commit.py)
+        'ORDER_GROUP_COMMIT': os.environ.get('ORDER_GROUP_COMMIT', '1').lower() in ('1', 'true', 'yes'),
+        'ORDER_COMMIT_BATCH': int(os.environ.get('ORDER_COMMIT_BATCH', '64')),
+        'ORDER_COMMIT_DELAY_MS': float(os.environ.get('ORDER_COMMIT_DELAY_MS', '2')),
+        # Pre-forked workers (see prefork.py): catalog responses rendered into
+        # the shared snapshot, and how often (seconds) it is re-rendered when stale
+        'CATALOG_SNAPSHOT_PRODUCTS': int(os.environ.get('CATALOG_SNAPSHOT_PRODUCTS', '5000')),
+        'CATALOG_SNAPSHOT_INTERVAL': float(os.environ.get('CATALOG_SNAPSHOT_INTERVAL', '30')),
+        'SEARCH_CANDIDATES': int(os.environ.get('SEARCH_CANDIDATES', '200')),
+        # Responses smaller than this are never compressed (see compression.py)
+        'COMPRESS_MIN_SIZE': int(os.environ.get('COMPRESS_MIN_SIZE', str(compression.MIN_SIZE))),
+
+        # Shared secret for the /api/admin endpoints (disabled when unset)
+        'ADMIN_TOKEN': os.environ.get('ADMIN_TOKEN'),
+        # Bearer token a Prometheus scraper sends for /api/metrics (the admin
+        # token works too; the endpoint is closed when both are unset)
+        'METRICS_TOKEN': os.environ.get('METRICS_TOKEN'),
+    }
+
+# All routes and CLI commands; create_app() registers them on a new app
+api = Blueprint('api', __name__, cli_group=None)
+
+# Per-app components (set up in create_app), used by the views below
+hasher = LocalProxy(lambda: current_app.extensions['password_hasher'])
+# Serialized catalog responses, invalidated whenever products/categories change
+catalog_cache = LocalProxy(lambda: current_app.extensions['catalog_cache'])
+# Identity rows for check-auth/profile, keyed by user id
+user_cache = LocalProxy(lambda: current_app.extensions['user_cache'])
+# In-memory stock reservations in front of products.stock (see inventory.py)
+inventory_engine = LocalProxy(lambda: current_app.extensions['inventory'])
+# Monthly order files attached on demand (see order_partitions.py)
+partitions = LocalProxy(lambda: current_app.extensions['order_partitions'])
+
+# Sample catalog, seeded through the same import path as bulk catalogs
+SAMPLE_CATEGORIES = [
+    {
+        "name": "Men's Wear",
+        "image_url": "https://images.unsplash.com/photo-1618886614638-80e3c103d31a?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2NzB8MHwxfHNlYXJjaHwxfHxtZW4lMjBmYXNoaW9ufGVufDB8fHx8MTc1OTgzOTI2M3ww&ixlib=rb-4.1.0&q=85"
+    },
+    {
+        "name": "Women's Wear",
+        "image_url": "https://images.unsplash.com/photo-1617922001439-4a2e6562f328?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDF8MHwxfHNlYXJjaHwxfHx3b21lbiUyMGZhc2hpb258ZW58MHx8fHwxNzU5ODcwOTg0fDA&ixlib=rb-4.1.0&q=85"
+    },
+    {
+        "name": "Children's Wear",
+        "image_url": "https://images.unsplash.com/photo-1622218286192-95f6a20083c7?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2NzF8MHwxfHNlYXJjaHwxfHxraWRzJTIwY2xvdGhpbmd8ZW58MHx8fHwxNzU5OTE5MjI5fDA&ixlib=rb-4.1.0&q=85"
+    },
+    {
+        "name": "Underwear",
+        "image_url": "https://images.unsplash.com/photo-1568441556126-f36ae0900180?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Nzd8MHwxfHNlYXJjaHw0fHx1bmRlcndlYXJ8ZW58MHx8fHwxNzU5OTE5MjMzfDA&ixlib=rb-4.1.0&q=85"
+    }
+]
+
+SAMPLE_PRODUCTS = [
+    {
+        "name": "Classic Cotton T-Shirt",
+        "description": "Premium quality cotton t-shirt in multiple colors",
+        "price": 29.99,
+        "category": "Men's Wear",
+        "image_url": "https://images.unsplash.com/photo-1562157873-818bc0726f68?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1ODF8MHwxfHNlYXJjaHwzfHxjbG90aGluZ3xlbnwwfHx8fDE3NTk4NTQyMTN8MA&ixlib=rb-4.1.0&q=85",
+        "stock": 100
+    },
+    {
+        "name": "Elegant Women's Dress",
+        "description": "Beautiful and comfortable dress for all occasions",
+        "price": 89.99,
+        "category": "Women's Wear",
+        "image_url": "https://images.unsplash.com/photo-1525507119028-ed4c629a60a3?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1ODF8MHwxfHNlYXJjaHwxfHxjbG90aGluZ3xlbnwwfHx8fDE3NTk4NTQyMTN8MA&ixlib=rb-4.1.0&q=85",
+        "stock": 75
+    },
+    {
+        "name": "Trendy Yellow Track Suit",
+        "description": "Comfortable and stylish track suit perfect for casual wear",
+        "price": 79.99,
+        "category": "Women's Wear",
+        "image_url": "https://images.unsplash.com/photo-1515886657613-9f3515b0c78f?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHwxfHxmYXNoaW9ufGVufDB8fHx8MTc1OTkxOTI3MHww&ixlib=rb-4.1.0&q=85",
+        "stock": 50
+    },
+    {
+        "name": "Kids Colorful Collection",
+        "description": "Vibrant and comfortable children's clothing collection",
+        "price": 39.99,
+        "category": "Children's Wear",
+        "image_url": "https://images.unsplash.com/photo-1622218286192-95f6a20083c7?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2NzF8MHwxfHNlYXJjaHwxfHxraWRzJTIwY2xvdGhpbmd8ZW58MHx8fHwxNzU5OTE5MjI5fDA&ixlib=rb-4.1.0&q=85",
+        "stock": 60
+    },
+    {
+        "name": "Professional Shirts Collection",
+        "description": "High-quality professional shirts for office and formal wear",
+        "price": 59.99,
+        "category": "Men's Wear",
+        "image_url": "https://images.unsplash.com/photo-1489987707025-afc232f7ea0f?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1ODF8MHwxfHNlYXJjaHw0fHxjbG90aGluZ3xlbnwwfHx8fDE3NTk4NTQyMTN8MA&ixlib=rb-4.1.0&q=85",
+        "stock": 80
+    },
+    {
+        "name": "Stylish Outerwear",
+        "description": "Trendy coats and jackets for all seasons",
+        "price": 149.99,
+        "category": "Women's Wear",
+        "image_url": "https://images.unsplash.com/photo-1571513800374-df1bbe650e56?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHwzfHxmYXNoaW9ufGVufDB8fHx8MTc1OTkxOTI3MHww&ixlib=rb-4.1.0&q=85",
+        "stock": 40
+    },
+    {
+        "name": "Slim Fit Denim Jeans",
+        "description": "Comfort stretch slim-fit denim with classic five-pocket styling.",
+        "price": 49.99,
+        "category": "Men's Wear",
+        "image_url": "https://images.unsplash.com/photo-1541099649105-f69ad21f3246?auto=format&fit=crop&w=800&q=85",
+        "stock": 120
+    },
+    {
+        "name": "Casual Linen Shirt",
+        "description": "Breathable linen shirt perfect for warm weather and a relaxed look.",
+        "price": 39.99,
+        "category": "Men's Wear",
+        "image_url": "https://images.unsplash.com/photo-1520975911473-0f9690f8f3a9?auto=format&fit=crop&w=800&q=85",
+        "stock": 80
+    },
+    {
+        "name": "Boho Floral Maxi Dress",
+        "description": "Flowy maxi dress with bohemian floral prints and adjustable straps.",
+        "price": 69.99,
+        "category": "Women's Wear",
+        "image_url": "https://images.unsplash.com/photo-1520975911478-3b0a0f6b7f8f?auto=format&fit=crop&w=800&q=85",
+        "stock": 60
+    },
+    {
+        "name": "High Waisted Tailored Trousers",
+        "description": "Elegant high-waisted trousers with a tapered leg for a polished look.",
+        "price": 69.99,
+        "category": "Women's Wear",
+        "image_url": "https://images.unsplash.com/photo-1544716278-ca5e3f4abd8c?auto=format&fit=crop&w=800&q=85",
+        "stock": 45
+    },
+    {
+        "name": "Kids Graphic Tee Pack",
+        "description": "Soft cotton tee pack featuring playful graphic prints for kids.",
+        "price": 29.99,
+        "category": "Children's Wear",
+        "image_url": "https://images.unsplash.com/photo-1541807084-5c52b6b35a2c?auto=format&fit=crop&w=800&q=85",
+        "stock": 140
+    },
+    {
+        "name": "Comfy Cotton Pajama Set",
+        "description": "Lightweight cotton pajama set with elastic waist and soft finish.",
+        "price": 34.99,
+        "category": "Underwear",
+        "image_url": "https://images.unsplash.com/photo-1514996937319-344454492b37?auto=format&fit=crop&w=800&q=85",
+        "stock": 200
+    },
+    {
+        "name": "Men's Classic Oxford Shirt",
+        "description": "A classic oxford shirt that pairs well with formal and casual outfits.",
+        "price": 44.99,
+        "category": "Men's Wear",
+        "image_url": "https://images.unsplash.com/photo-1541099649105-f69ad21f3246?auto=format&fit=crop&w=900&q=80",
+        "stock": 90
+    },
+    {
+        "name": "Ribbed Knit Sweater",
+        "description": "Cozy ribbed sweater with a soft touch knit — perfect for layering.",
+        "price": 59.99,
+        "category": "Women's Wear",
+        "image_url": "https://images.unsplash.com/photo-1541099649105-f69ad21f3246?auto=format&fit=crop&w=1000&q=80",
+        "stock": 70
+    },
+    {
+        "name": "Outdoor Performance Jacket",
+        "description": "Water-resistant lightweight jacket with breathable fabric and zip pockets.",
+        "price": 119.99,
+        "category": "Men's Wear",
+        "image_url": "https://images.unsplash.com/photo-1520975911468-1f0a7f4a2f2e?auto=format&fit=crop&w=900&q=80",
+        "stock": 35
+    },
+    {
+        "name": "Pleated Midi Skirt",
+        "description": "Elegant pleated midi skirt with a flattering silhouette.",
+        "price": 54.99,
+        "category": "Women's Wear",
+        "image_url": "https://images.unsplash.com/photo-1520975911473-0f9690f8f3a9?auto=format&fit=crop&w=900&q=80",
+        "stock": 50
+    },
+    {
+        "name": "Athletic Running Shorts",
+        "description": "Lightweight running shorts with moisture-wicking fabric and pockets.",
+        "price": 24.99,
+        "category": "Men's Wear",
+        "image_url": "https://images.unsplash.com/photo-1520975911478-3b0a0f6b7f8f?auto=format&fit=crop&w=900&q=80",
+        "stock": 110
+    },
+    {
+        "name": "Soft Terry Hoodie",
+        "description": "Super soft terry hoodie with kangaroo pocket and relaxed fit.",
+        "price": 49.99,
+        "category": "Women's Wear",
+        "image_url": "https://images.unsplash.com/photo-1514996937319-344454492b37?auto=format&fit=crop&w=900&q=80",
+        "stock": 95
+    },
+    {
+        "name": "Kids Denim Jacket",
+        "description": "Durable denim jacket for kids with button front and comfy lining.",
+        "price": 44.99,
+        "category": "Children's Wear",
+        "image_url": "https://images.unsplash.com/photo-1520975911468-1f0a7f4a2f2e?auto=format&fit=crop&w=900&q=80",
+        "stock": 65
+    },
+    {
+        "name": "Classic Cotton Boxer Briefs (3-pack)",
+        "description": "Breathable cotton boxer briefs with supportive fit — 3-pack.",
+        "price": 24.99,
+        "category": "Underwear",
+        "image_url": "https://images.unsplash.com/photo-1562887003-7f9c6d9b0b1f?auto=format&fit=crop&w=800&q=85",
+        "stock": 300
+    },
+    {
+        "name": "Everyday Sports Bra",
+        "description": "Light support sports bra with seamless construction and breathable fabric.",
+        "price": 29.99,
+        "category": "Underwear",
+        "image_url": "https://images.unsplash.com/photo-1551854838-0c6f0d3c7f36?auto=format&fit=crop&w=800&q=85",
+        "stock": 160
+    },
+    {
+        "name": "Leather Belt with Silver Buckle",
+        "description": "Full-grain leather belt with a brushed silver buckle for everyday wear.",
+        "price": 34.99,
+        "category": "Men's Wear",
+        "image_url": "https://images.unsplash.com/photo-1542291026-7eec264c27ff?auto=format&fit=crop&w=800&q=85",
+        "stock": 150
+    },
+    {
+        "name": "Satin Slip Camisole",
+        "description": "Luxurious satin camisole with delicate straps — perfect as a layering piece.",
+        "price": 27.99,
+        "category": "Women's Wear",
+        "image_url": "https://images.unsplash.com/photo-1541099649105-f69ad21f3246?auto=format&fit=crop&w=800&q=80",
+        "stock": 85
+    }
+]
 
 # Initialize sample data
 def init_sample_data():
-    # Check if categories already exist
-    cur = conn.cursor()
-    cur.execute('SELECT COUNT(*) as c FROM categories')
-    if cur.fetchone()['c'] == 0:
-        categories = [
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Men's Wear",
-                "image_url": "https://images.unsplash.com/photo-1618886614638-80e3c103d31a?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2NzB8MHwxfHNlYXJjaHwxfHxtZW4lMjBmYXNoaW9ufGVufDB8fHx8MTc1OTgzOTI2M3ww&ixlib=rb-4.1.0&q=85",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Women's Wear",
-                "image_url": "https://images.unsplash.com/photo-1617922001439-4a2e6562f328?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDF8MHwxfHNlYXJjaHwxfHx3b21lbiUyMGZhc2hpb258ZW58MHx8fHwxNzU5ODcwOTg0fDA&ixlib=rb-4.1.0&q=85",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Children's Wear",
-                "image_url": "https://images.unsplash.com/photo-1622218286192-95f6a20083c7?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2NzF8MHwxfHNlYXJjaHwxfHxraWRzJTIwY2xvdGhpbmd8ZW58MHx8fHwxNzU5OTE5MjI5fDA&ixlib=rb-4.1.0&q=85",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Underwear",
-                "image_url": "https://images.unsplash.com/photo-1568441556126-f36ae0900180?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Nzd8MHwxfHNlYXJjaHw0fHx1bmRlcndlYXJ8ZW58MHx8fHwxNzU5OTE5MjMzfDA&ixlib=rb-4.1.0&q=85",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-        ]
-        for c in categories:
-            cur.execute('INSERT INTO categories (id, name, image_url, created_at) VALUES (?, ?, ?, ?)',
-                        (c['id'], c['name'], c['image_url'], c['created_at']))
-        conn.commit()
+    """Add any missing sample categories and products; existing rows (and
+    their stock) are left as they are."""
+    conn = get_db()
+    created = catalog_import.ensure_categories(conn, SAMPLE_CATEGORIES)
+    conn.commit()
+    report = catalog_import.import_records(conn, enumerate(SAMPLE_PRODUCTS, 1), update_existing=False)
+    if created or report['inserted']:
+        catalog_cache.clear_everywhere()
 
-    # Check if products already exist
-    cur.execute('SELECT COUNT(*) as c FROM products')
-    if cur.fetchone()['c'] == 0:
-        cur.execute('SELECT id, name FROM categories')
-        categories_list = [dict(row) for row in cur.fetchall()]
-        products = [
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Classic Cotton T-Shirt",
-                "description": "Premium quality cotton t-shirt in multiple colors",
-                "price": 29.99,
-                "category_id": categories_list[0]["id"],
-                "category_name": "Men's Wear",
-                "image_url": "https://images.unsplash.com/photo-1562157873-818bc0726f68?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1ODF8MHwxfHNlYXJjaHwzfHxjbG90aGluZ3xlbnwwfHx8fDE3NTk4NTQyMTN8MA&ixlib=rb-4.1.0&q=85",
-                "stock": 100,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Elegant Women's Dress",
-                "description": "Beautiful and comfortable dress for all occasions",
-                "price": 89.99,
-                "category_id": categories_list[1]["id"],
-                "category_name": "Women's Wear",
-                "image_url": "https://images.unsplash.com/photo-1525507119028-ed4c629a60a3?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1ODF8MHwxfHNlYXJjaHwxfHxjbG90aGluZ3xlbnwwfHx8fDE3NTk4NTQyMTN8MA&ixlib=rb-4.1.0&q=85",
-                "stock": 75,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Trendy Yellow Track Suit",
-                "description": "Comfortable and stylish track suit perfect for casual wear",
-                "price": 79.99,
-                "category_id": categories_list[1]["id"],
-                "category_name": "Women's Wear",
-                "image_url": "https://images.unsplash.com/photo-1515886657613-9f3515b0c78f?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHwxfHxmYXNoaW9ufGVufDB8fHx8MTc1OTkxOTI3MHww&ixlib=rb-4.1.0&q=85",
-                "stock": 50,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Kids Colorful Collection",
-                "description": "Vibrant and comfortable children's clothing collection",
-                "price": 39.99,
-                "category_id": categories_list[2]["id"],
-                "category_name": "Children's Wear",
-                "image_url": "https://images.unsplash.com/photo-1622218286192-95f6a20083c7?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2NzF8MHwxfHNlYXJjaHwxfHxraWRzJTIwY2xvdGhpbmd8ZW58MHx8fHwxNzU5OTE5MjI5fDA&ixlib=rb-4.1.0&q=85",
-                "stock": 60,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Professional Shirts Collection",
-                "description": "High-quality professional shirts for office and formal wear",
-                "price": 59.99,
-                "category_id": categories_list[0]["id"],
-                "category_name": "Men's Wear",
-                "image_url": "https://images.unsplash.com/photo-1489987707025-afc232f7ea0f?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1ODF8MHwxfHNlYXJjaHw0fHxjbG90aGluZ3xlbnwwfHx8fDE3NTk4NTQyMTN8MA&ixlib=rb-4.1.0&q=85",
-                "stock": 80,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "name": "Stylish Outerwear",
-                "description": "Trendy coats and jackets for all seasons",
-                "price": 149.99,
-                "category_id": categories_list[1]["id"],
-                "category_name": "Women's Wear",
-                "image_url": "https://images.unsplash.com/photo-1571513800374-df1bbe650e56?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDJ8MHwxfHNlYXJjaHwzfHxmYXNoaW9ufGVufDB8fHx8MTc1OTkxOTI3MHww&ixlib=rb-4.1.0&q=85",
-                "stock": 40,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-        ]
-        for p in products:
-            cur.execute('''INSERT INTO products (id, name, description, price, category_id, category_name, image_url, stock, created_at)
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                        (p['id'], p['name'], p['description'], p['price'], p['category_id'], p['category_name'], p['image_url'], p['stock'], p['created_at']))
-        conn.commit()
+def import_catalog(conn, records, update_existing=True):
+    report = catalog_import.import_records(conn, records, update_existing)
+    if report['inserted'] or report['updated']:
+        # Running servers clear their caches on their next catalog lookup
+        catalog_cache.clear_everywhere()
+        inventory_engine.forget()
+    return report
 
-    # Add additional sample products (up to 20) if not present
-    # Ensure we have the categories_list available
-    cur.execute('SELECT id, name FROM categories')
-    categories_list = [dict(row) for row in cur.fetchall()]
-    cur.execute('SELECT name FROM products')
-    existing_names = set([row['name'] for row in cur.fetchall()])
-    extra_products = [
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Slim Fit Denim Jeans",
-            "description": "Comfort stretch slim-fit denim with classic five-pocket styling.",
-            "price": 49.99,
-            "category_id": categories_list[0]["id"],
-            "category_name": "Men's Wear",
-            "image_url": "https://images.unsplash.com/photo-1541099649105-f69ad21f3246?auto=format&fit=crop&w=800&q=85",
-            "stock": 120,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Casual Linen Shirt",
-            "description": "Breathable linen shirt perfect for warm weather and a relaxed look.",
-            "price": 39.99,
-            "category_id": categories_list[0]["id"],
-            "category_name": "Men's Wear",
-            "image_url": "https://images.unsplash.com/photo-1520975911473-0f9690f8f3a9?auto=format&fit=crop&w=800&q=85",
-            "stock": 80,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Boho Floral Maxi Dress",
-            "description": "Flowy maxi dress with bohemian floral prints and adjustable straps.",
-            "price": 69.99,
-            "category_id": categories_list[1]["id"],
-            "category_name": "Women's Wear",
-            "image_url": "https://images.unsplash.com/photo-1520975911478-3b0a0f6b7f8f?auto=format&fit=crop&w=800&q=85",
-            "stock": 60,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "High Waisted Tailored Trousers",
-            "description": "Elegant high-waisted trousers with a tapered leg for a polished look.",
-            "price": 69.99,
-            "category_id": categories_list[1]["id"],
-            "category_name": "Women's Wear",
-            "image_url": "https://images.unsplash.com/photo-1544716278-ca5e3f4abd8c?auto=format&fit=crop&w=800&q=85",
-            "stock": 45,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Kids Graphic Tee Pack",
-            "description": "Soft cotton tee pack featuring playful graphic prints for kids.",
-            "price": 29.99,
-            "category_id": categories_list[2]["id"],
-            "category_name": "Children's Wear",
-            "image_url": "https://images.unsplash.com/photo-1541807084-5c52b6b35a2c?auto=format&fit=crop&w=800&q=85",
-            "stock": 140,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Comfy Cotton Pajama Set",
-            "description": "Lightweight cotton pajama set with elastic waist and soft finish.",
-            "price": 34.99,
-            "category_id": categories_list[3]["id"],
-            "category_name": "Underwear",
-            "image_url": "https://images.unsplash.com/photo-1514996937319-344454492b37?auto=format&fit=crop&w=800&q=85",
-            "stock": 200,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Men's Classic Oxford Shirt",
-            "description": "A classic oxford shirt that pairs well with formal and casual outfits.",
-            "price": 44.99,
-            "category_id": categories_list[0]["id"],
-            "category_name": "Men's Wear",
-            "image_url": "https://images.unsplash.com/photo-1541099649105-f69ad21f3246?auto=format&fit=crop&w=900&q=80",
-            "stock": 90,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Ribbed Knit Sweater",
-            "description": "Cozy ribbed sweater with a soft touch knit — perfect for layering.",
-            "price": 59.99,
-            "category_id": categories_list[1]["id"],
-            "category_name": "Women's Wear",
-            "image_url": "https://images.unsplash.com/photo-1541099649105-f69ad21f3246?auto=format&fit=crop&w=1000&q=80",
-            "stock": 70,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Outdoor Performance Jacket",
-            "description": "Water-resistant lightweight jacket with breathable fabric and zip pockets.",
-            "price": 119.99,
-            "category_id": categories_list[0]["id"],
-            "category_name": "Men's Wear",
-            "image_url": "https://images.unsplash.com/photo-1520975911468-1f0a7f4a2f2e?auto=format&fit=crop&w=900&q=80",
-            "stock": 35,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Pleated Midi Skirt",
-            "description": "Elegant pleated midi skirt with a flattering silhouette.",
-            "price": 54.99,
-            "category_id": categories_list[1]["id"],
-            "category_name": "Women's Wear",
-            "image_url": "https://images.unsplash.com/photo-1520975911473-0f9690f8f3a9?auto=format&fit=crop&w=900&q=80",
-            "stock": 50,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Athletic Running Shorts",
-            "description": "Lightweight running shorts with moisture-wicking fabric and pockets.",
-            "price": 24.99,
-            "category_id": categories_list[0]["id"],
-            "category_name": "Men's Wear",
-            "image_url": "https://images.unsplash.com/photo-1520975911478-3b0a0f6b7f8f?auto=format&fit=crop&w=900&q=80",
-            "stock": 110,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Soft Terry Hoodie",
-            "description": "Super soft terry hoodie with kangaroo pocket and relaxed fit.",
-            "price": 49.99,
-            "category_id": categories_list[1]["id"],
-            "category_name": "Women's Wear",
-            "image_url": "https://images.unsplash.com/photo-1514996937319-344454492b37?auto=format&fit=crop&w=900&q=80",
-            "stock": 95,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Kids Denim Jacket",
-            "description": "Durable denim jacket for kids with button front and comfy lining.",
-            "price": 44.99,
-            "category_id": categories_list[2]["id"],
-            "category_name": "Children's Wear",
-            "image_url": "https://images.unsplash.com/photo-1520975911468-1f0a7f4a2f2e?auto=format&fit=crop&w=900&q=80",
-            "stock": 65,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Classic Cotton Boxer Briefs (3-pack)",
-            "description": "Breathable cotton boxer briefs with supportive fit — 3-pack.",
-            "price": 24.99,
-            "category_id": categories_list[3]["id"],
-            "category_name": "Underwear",
-            "image_url": "https://images.unsplash.com/photo-1562887003-7f9c6d9b0b1f?auto=format&fit=crop&w=800&q=85",
-            "stock": 300,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Everyday Sports Bra",
-            "description": "Light support sports bra with seamless construction and breathable fabric.",
-            "price": 29.99,
-            "category_id": categories_list[3]["id"],
-            "category_name": "Underwear",
-            "image_url": "https://images.unsplash.com/photo-1551854838-0c6f0d3c7f36?auto=format&fit=crop&w=800&q=85",
-            "stock": 160,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Leather Belt with Silver Buckle",
-            "description": "Full-grain leather belt with a brushed silver buckle for everyday wear.",
-            "price": 34.99,
-            "category_id": categories_list[0]["id"],
-            "category_name": "Men's Wear",
-            "image_url": "https://images.unsplash.com/photo-1542291026-7eec264c27ff?auto=format&fit=crop&w=800&q=85",
-            "stock": 150,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Satin Slip Camisole",
-            "description": "Luxurious satin camisole with delicate straps — perfect as a layering piece.",
-            "price": 27.99,
-            "category_id": categories_list[1]["id"],
-            "category_name": "Women's Wear",
-            "image_url": "https://images.unsplash.com/photo-1541099649105-f69ad21f3246?auto=format&fit=crop&w=800&q=80",
-            "stock": 85,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-    ]
-
-    to_insert = []
-    for p in extra_products:
-        if p['name'] not in existing_names:
-            to_insert.append(p)
-
-    for p in to_insert:
-        cur.execute('''INSERT INTO products (id, name, description, price, category_id, category_name, image_url, stock, created_at)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                    (p['id'], p['name'], p['description'], p['price'], p['category_id'], p['category_name'], p['image_url'], p['stock'], p['created_at']))
-    if to_insert:
-        conn.commit()
+@api.cli.command('import-catalog')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--insert-only', is_flag=True, help='Leave products that already exist unchanged.')
+def import_catalog_command(path, fmt, insert_only):
+    """Upsert products from a CSV or JSONL catalog file."""
+    with open(path, 'rb') as f:
+        records = catalog_import.read_records(catalog_import.text_stream(f), fmt or catalog_import.detect_format(path))
+        try:
+            report = import_catalog(get_db(), records, update_existing=not insert_only)
+        except CatalogImportError as e:
+            raise click.ClickException(str(e))
+    click.echo(json.dumps(report))
+
+@api.cli.command('migrate')
+@click.option('--vacuum', is_flag=True, help='Rewrite the file afterwards to return space freed by migrations.')
+def migrate_command(vacuum):
+    """Bring the database schema up to date (run once per deploy)."""
+    # Opening the pool's first connection migrates and writes the marker
+    conn = get_db()
+    click.echo(f"schema at version {migrations.current_version(conn)}")
+    if vacuum:
+        before = os.path.getsize(current_app.config['SQLITE_PATH'])
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        click.echo(f"vacuumed: {before // 1024} KiB -> {os.path.getsize(current_app.config['SQLITE_PATH']) // 1024} KiB")
+
+@api.cli.command('rebuild-sales')
+def rebuild_sales_command():
+    """Recompute the daily sales aggregates from the order partitions."""
+    click.echo(json.dumps(partitions.rebuild_sales(get_db())))
+
+@api.cli.command('archive-orders')
+@click.option('--before', required=True, help='Archive every month before this one (YYYY-MM).')
+@click.option('--compress', is_flag=True, help='Gzip the archives (extracted again on first read).')
+def archive_orders_command(before, compress):
+    """Move past order partitions to compact read-only files."""
+    if not order_partitions.MONTH.match(before):
+        raise click.BadParameter('expected YYYY-MM', param_hint='--before')
+    conn = get_db()
+    for month in partitions.months(conn, last=before, newest_first=False):
+        if month < before:
+            try:
+                click.echo(json.dumps(partitions.archive(conn, month, compress=compress)))
+            except PartitionError as e:
+                raise click.ClickException(str(e))
+
+@api.cli.command('seed')
+def seed_command():
+    """Add the sample categories and products that are missing."""
+    init_sample_data()
+    click.echo("sample data loaded")
 
 # Routes
 
-@app.route('/api/', methods=['GET'])
-@app.route('/api', methods=['GET'])
+@api.route('/api/', methods=['GET'])
+@api.route('/api', methods=['GET'])
 def root():
     return jsonify({"message": "StyleSphere Fashion API"})
 
+def collect_component_metrics(app):
+    stats = hasher.stats()
+    wait, seen = [], 0
+    for bound, count in stats['wait_buckets']:
+        seen += count
+        wait.append(('_bucket', {'le': '+Inf' if bound == float('inf') else repr(bound)}, seen))
+    wait += [('_sum', {}, stats['wait_sum']), ('_count', {}, stats['jobs'])]
+    yield 'bcrypt_queue_wait_seconds', 'histogram', 'Time bcrypt jobs waited for a worker.', wait
+    yield 'bcrypt_rejected_total', 'counter', 'bcrypt jobs refused because the queue was full.', [('', {}, stats['rejected'])]
+    yield 'bcrypt_timed_out_total', 'counter', 'bcrypt jobs that timed out.', [('', {}, stats['timed_out'])]
+
+    caches = {'catalog': catalog_cache.stats(), 'user': user_cache.stats()}
+    yield 'cache_hits_total', 'counter', 'Cache lookups that hit.', [('', {'cache': n}, c['hits']) for n, c in caches.items()]
+    yield 'cache_misses_total', 'counter', 'Cache lookups that missed.', [('', {'cache': n}, c['misses']) for n, c in caches.items()]
+    yield 'cache_entries', 'gauge', 'Entries currently cached.', [('', {'cache': n}, c['size']) for n, c in caches.items()]
+    if 'snapshot_hits' in caches['catalog']:
+        hits = caches['catalog']['snapshot_hits']
+        yield 'catalog_snapshot_hits_total', 'counter', 'Catalog responses served from the shared snapshot.', [('', {}, hits)]
+
+    stock = inventory_engine.stats()
+    yield 'inventory_tracked_products', 'gauge', 'Products with in-memory stock counters.', [('', {}, stock['tracked'])]
+    yield 'inventory_open_holds', 'gauge', 'Checkouts holding reserved stock.', [('', {}, stock['holds'])]
+    yield 'inventory_rejected_total', 'counter', 'Checkouts rejected from memory as sold out.', [('', {}, stock['rejected'])]
+
+    writer = app.extensions.get('order_writer')
+    if writer is not None:
+        commits = writer.stats()
+        yield 'order_commit_batches_total', 'counter', 'Group commits of checkout writes.', [('', {}, commits['batches'])]
+        yield 'order_commit_writes_total', 'counter', 'Checkout writes handed to the group-commit writer.', [('', {}, commits['writes'])]
+        yield 'order_commit_failed_total', 'counter', 'Checkout writes rolled back to their savepoint.', [('', {}, commits['failed'])]
+
+    pool = app.extensions['db_pool'].stats()
+    yield 'sqlite_pool_connections_opened_total', 'counter', 'SQLite connections opened.', [('', {}, pool['opened'])]
+    yield 'sqlite_pool_idle_connections', 'gauge', 'Pooled SQLite connections not checked out.', [('', {}, pool['idle'])]
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    # SQL text, table names and latencies are not for the public
+    token = current_app.config.get('METRICS_TOKEN')
+    scraper = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (scraper or is_admin()):
+        return jsonify({"error": "Forbidden"}), 403
+    return current_app.response_class(current_app.extensions['metrics'].render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Admin Routes
+def is_admin():
+    token = current_app.config.get('ADMIN_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+@api.route('/api/admin/catalog/import', methods=['POST'])
+def import_catalog_route():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'jsonl')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({"error": "format must be csv or jsonl"}), 400
+    try:
+        records = catalog_import.read_records(catalog_import.text_stream(request.stream), fmt)
+        report = import_catalog(get_db(), records, update_existing=request.args.get('mode') != 'insert')
+        return jsonify(report), 200
+    except CatalogImportError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def sales_range():
+    return sales.parse_range(request.args, orders.timestamp_us(datetime.now(timezone.utc)))
+
+def sales_response(payload, first, last):
+    return jsonify({"from": sales.day_iso(first), "to": sales.day_iso(last), **payload}), 200
+
+# Dashboards read the daily aggregates (see sales.py), never the orders table
+@api.route('/api/admin/sales/daily', methods=['GET'])
+def sales_daily():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        first, last = sales_range()
+        return sales_response({"days": sales.daily(get_db(), first, last)}, first, last)
+    except sales.SalesQueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/admin/sales/categories', methods=['GET'])
+def sales_categories():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        first, last = sales_range()
+        return sales_response({"categories": sales.by_category(get_db(), first, last)}, first, last)
+    except sales.SalesQueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/admin/sales/products', methods=['GET'])
+def sales_products():
+    """Per-day series for ``product_id``, or the top products of the range
+    (``by=revenue|units``, ``limit``)."""
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        first, last = sales_range()
+        product_id = request.args.get('product_id')
+        if product_id:
+            return sales_response({"product_id": product_id,
+                                   "days": sales.product_series(get_db(), product_id, first, last)}, first, last)
+        by = request.args.get('by', 'revenue')
+        if by not in ('revenue', 'units'):
+            return jsonify({"error": "by must be revenue or units"}), 400
+        try:
+            limit = min(int(request.args.get('limit', sales.TOP_PRODUCTS)), sales.MAX_TOP_PRODUCTS)
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        return sales_response({"products": sales.top_products(get_db(), first, last, limit, by)}, first, last)
+    except sales.SalesQueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Authentication Routes
-@app.route('/api/register', methods=['POST'])
+def busy_response():
+    response = jsonify({"error": "Server is busy, please try again"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+# Identity data for check-auth/profile comes from user_cache; writers to the
+# users table write through to it so it never serves a stale profile.
+USER_FIELDS = ('id', 'username', 'email', 'full_name', 'created_at')
+
+def load_user(user_id):
+    user = user_cache.get(user_id)
+    if user is None:
+        read_at = time.monotonic_ns()
+        cur = get_db().cursor()
+        cur.execute('SELECT id, username, email, full_name, created_at FROM users WHERE id = ?', (user_id,))
+        row = cur.fetchone()
+        if row:
+            user = dict(row)
+            user_cache.set(user_id, user, read_at=read_at)
+    return user
+
+def cache_user(row):
+    user = {k: row[k] for k in USER_FIELDS}
+    user_cache.set(user['id'], user)
+    return user
+
+@api.route('/api/register', methods=['POST'])
 def register():
     try:
         data = request.get_json()
@@ -444,6 +541,7 @@ def register():
             return jsonify({"error": "Username, email, and password are required"}), 400
         
         # Check if user already exists (by email or username)
+        conn = get_db()
         cur = conn.cursor()
         cur.execute('SELECT id FROM users WHERE email = ?', (data['email'],))
         if cur.fetchone():
@@ -454,7 +552,7 @@ def register():
             return jsonify({"error": "Username already taken"}), 400
 
         # Hash password and create user
-        hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        hashed_password = hasher.hash(data['password'])
 
         user = {
             "id": str(uuid.uuid4()),
@@ -468,6 +566,7 @@ def register():
         cur.execute('INSERT INTO users (id, username, email, password, full_name, created_at) VALUES (?, ?, ?, ?, ?, ?)',
                     (user['id'], user['username'], user['email'], user['password'], user['full_name'], user['created_at']))
         conn.commit()
+        cache_user(user)
         
         # Create session
         session['user_id'] = user['id']
@@ -483,10 +582,12 @@ def register():
             }
         }), 201
         
+    except HasherBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     try:
         data = request.get_json()
@@ -495,12 +596,23 @@ def login():
             return jsonify({"error": "Email and password are required"}), 400
         
         # Find user
+        conn = get_db()
         cur = conn.cursor()
         cur.execute('SELECT * FROM users WHERE email = ?', (data['email'],))
         row = cur.fetchone()
-        if not row or not bcrypt.check_password_hash(row['password'], data['password']):
+        if not row or not hasher.check(row['password'], data['password']):
             return jsonify({"error": "Invalid email or password"}), 401
 
+        # Transparently upgrade hashes made with an older work factor
+        if hasher.needs_rehash(row['password']):
+            try:
+                cur.execute('UPDATE users SET password = ? WHERE id = ?', (hasher.hash(data['password']), row['id']))
+                conn.commit()
+            except HasherBusy:
+                pass
+
+        cache_user(row)
+
         # Create session
         session['user_id'] = row['id']
         session['username'] = row['username']
@@ -515,42 +627,42 @@ def login():
             }
         }), 200
         
+    except HasherBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/logout', methods=['POST'])
+@api.route('/api/logout', methods=['POST'])
 def logout():
     session.clear()
     return jsonify({"message": "Logout successful"}), 200
 
-@app.route('/api/profile', methods=['GET'])
+@api.route('/api/profile', methods=['GET'])
 def get_profile():
     if 'user_id' not in session:
         return jsonify({"error": "Not authenticated"}), 401
-    cur = conn.cursor()
-    cur.execute('SELECT id, username, email, full_name, created_at FROM users WHERE id = ?', (session['user_id'],))
-    row = cur.fetchone()
-    if not row:
+    user = load_user(session['user_id'])
+    if not user:
         return jsonify({"error": "User not found"}), 404
 
-    user = dict(row)
     return jsonify({"user": user}), 200
 
-@app.route('/api/profile', methods=['PUT'])
+@api.route('/api/profile', methods=['PUT'])
 def update_profile():
     if 'user_id' not in session:
         return jsonify({"error": "Not authenticated"}), 401
     
     try:
         data = request.get_json()
-        
+        conn = get_db()
+        cur = conn.cursor()
+
         # Prepare update data
         update_data = {}
         if 'full_name' in data:
             update_data['full_name'] = data['full_name']
         if 'email' in data:
             # Check if email already exists for another user
-            cur = conn.cursor()
             cur.execute('SELECT id FROM users WHERE email = ? AND id != ?', (data['email'], session['user_id']))
             if cur.fetchone():
                 return jsonify({"error": "Email already in use"}), 400
@@ -562,205 +674,443 @@ def update_profile():
             values.append(session['user_id'])
             cur.execute(f'UPDATE users SET {set_clause} WHERE id = ?', values)
             conn.commit()
+            # Other workers may hold the old profile (see prefork.py)
+            user_cache.invalidate(session['user_id'])
 
         cur.execute('SELECT id, username, email, full_name, created_at FROM users WHERE id = ?', (session['user_id'],))
         row = cur.fetchone()
-        user = dict(row) if row else None
+        if row:
+            user = cache_user(row)
+        else:
+            user = None
+            user_cache.delete(session['user_id'])
         return jsonify({"user": user}), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Product Routes
-@app.route('/api/categories', methods=['GET'])
+# Catalog responses are served from catalog_cache as pre-serialized JSON bytes
+# with a strong ETag; a matching If-None-Match is answered with 304 before any
+# database work happens. gzip/brotli variants are compressed once per cache
+# entry rather than per request.
+def json_body(payload):
+    return f"{current_app.json.dumps(payload)}\n".encode('utf-8')
+
+def catalog_response(key, loader):
+    entry = catalog_cache.get_or_load(key, loader)
+    if entry is None:
+        return None
+    # Each encoding is its own representation, with its own ETag
+    negotiable = len(entry.body) >= current_app.config['COMPRESS_MIN_SIZE']
+    encoding = compression.negotiate(request.accept_encodings) if negotiable else None
+    etag = entry.etag if encoding is None else f'{entry.etag}-{encoding}'
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    elif encoding is None:
+        response = current_app.response_class(entry.body, mimetype='application/json')
+    else:
+        response = current_app.response_class(entry.encode(encoding), mimetype='application/json')
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    if negotiable:
+        response.vary.add('Accept-Encoding')
+    return response
+
+def listing_facets(conn, filters):
+    """Facet counts for ``filters``, cached apart from the page they go on.
+
+    They depend on categories, prices and (with ``in_stock``) which products
+    are sold out, not on stock levels, so they are tagged ``facets`` and a
+    checkout, which retires the page by its product tags, keeps them. Only a
+    catalog write (a full clear) or a sell-out under ``in_stock`` recounts.
+    """
+    in_stock = filters[3]
+
+    def load():
+        return json_body(product_listing.facets(conn, filters)), ['facets', 'in_stock'] if in_stock else ['facets']
+
+    return json.loads(catalog_cache.get_or_load(('facets', filters[:4]), load).body)
+
+@api.route('/api/categories', methods=['GET'])
 def get_categories():
-    try:
-        cur = conn.cursor()
+    def load():
+        cur = get_db().cursor()
         cur.execute('SELECT id, name, image_url, created_at FROM categories')
         categories = [dict(r) for r in cur.fetchall()]
-        return jsonify({"categories": categories}), 200
+        return json_body({"categories": categories}), ['categories']
+
+    try:
+        return catalog_response(('categories',), load)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/products', methods=['GET'])
+@api.route('/api/products', methods=['GET'])
 def get_products():
+    if 'ids' in request.args:
+        return get_products_by_id()
     try:
-        category_id = request.args.get('category_id')
-        
-        query = {}
-        if category_id:
-            query['category_id'] = category_id
+        limit, after = page_args(request.args)
+        filters = product_listing.parse_filters(request.args)
+        fields = product_listing.parse_fields(request.args)
+    except (PaginationError, product_listing.ListingError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    def load():
+        # Keyset pagination on (sort key, id): every page is an index range
+        # scan starting right after the cursor, never an OFFSET skip. The
+        # first page also carries the facet counts.
+        conn = get_db()
         cur = conn.cursor()
+        cur.execute(*product_listing.page_query(filters, after, limit, fields))
+        rows, next_cursor = page(cur.fetchall(), limit, product_listing.sort_key(filters))
+        products = product_listing.project(rows, fields)
+        payload = {"products": products, "next_cursor": next_cursor}
+        tags = ['products'] + [product_tag(p['id']) for p in products]
+        if after is None:
+            payload["facets"] = listing_facets(conn, filters)
+        if filters[3]:
+            # A sale elsewhere in the catalog can change what "in stock" shows
+            tags.append('in_stock')
+        return json_body(payload), tags
+
+    try:
+        return catalog_response(('products', filters, fields, limit, request.args.get('after')), load)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def get_products_by_id():
+    """``GET /api/products?ids=a,b,c``: many products in one query, in the
+    requested order, with the ids that do not exist listed in ``missing``."""
+    try:
+        ids = product_listing.parse_ids(request.args)
+        fields = product_listing.parse_fields(request.args)
+    except product_listing.ListingError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def load():
+        cur = get_db().cursor()
+        cur.execute(*product_listing.batch_query(ids, fields))
+        found = {row['id']: row for row in cur.fetchall()}
+        products = product_listing.project([found[i] for i in ids if i in found], fields)
+        missing = [i for i in ids if i not in found]
+        return json_body({"products": products, "missing": missing}), [product_tag(i) for i in ids]
+
+    try:
+        return catalog_response(('products_by_id', ids, fields), load)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Full-text search over name, description and category name (FTS5). Every
+# term is matched as a prefix and results are ranked by BM25 with matches in
+# the product name weighted highest. Ranking is bounded to the first
+# SEARCH_CANDIDATES matching rows so a very broad query ("s") costs the same as
+# a narrow one; queries with fewer matches than that are ranked exactly.
+SEARCH_TERM = re.compile(r'\w+', re.UNICODE)
+
+@api.route('/api/products/search', methods=['GET'])
+def search_products():
+    terms = SEARCH_TERM.findall(request.args.get('q', ''))
+    if not terms:
+        return jsonify({"error": "q is required"}), 400
+    category_id = request.args.get('category_id')
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    try:
+        # Single-character terms are matched exactly; a one-letter prefix would
+        # expand to a large share of the vocabulary.
+        match = ' '.join(f'"{t}"*' if len(t) > 1 else f'"{t}"' for t in terms[:16])
+        candidates = """SELECT products_fts.rowid AS rowid, bm25(products_fts, 10.0, 1.0, 2.0) AS score,
+                               snippet(products_fts, 1, '<mark>', '</mark>', '…', 12) AS snippet
+                        FROM products_fts"""
+        params = [match]
         if category_id:
-            cur.execute('SELECT id, name, description, price, category_id, category_name, image_url, stock, created_at FROM products WHERE category_id = ?', (category_id,))
+            # CROSS JOIN pins products_fts as the outer loop; otherwise the
+            # planner may walk the category index and probe FTS per product.
+            candidates += ' CROSS JOIN products c ON c.rowid = products_fts.rowid WHERE products_fts MATCH ? AND c.category_id = ?'
+            params.append(category_id)
         else:
-            cur.execute('SELECT id, name, description, price, category_id, category_name, image_url, stock, created_at FROM products')
+            candidates += ' WHERE products_fts MATCH ?'
+        candidates += ' LIMIT ?'
+        params.extend([max(current_app.config['SEARCH_CANDIDATES'], limit), limit])
+        cur = get_db().cursor()
+        cur.execute(f"""SELECT p.id, p.name, p.description, p.price, p.category_id, p.category_name, p.image_url, p.stock, p.created_at, m.snippet
+                        FROM ({candidates}) m JOIN products p ON p.rowid = m.rowid
+                        ORDER BY m.score LIMIT ?""", params)
         products = [dict(r) for r in cur.fetchall()]
         return jsonify({"products": products}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/products/<product_id>', methods=['GET'])
+@api.route('/api/products/<product_id>', methods=['GET'])
 def get_product(product_id):
     try:
-        cur = conn.cursor()
-        cur.execute('SELECT id, name, description, price, category_id, category_name, image_url, stock, created_at FROM products WHERE id = ?', (product_id,))
+        fields = product_listing.parse_fields(request.args)
+    except product_listing.ListingError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def load():
+        cur = get_db().cursor()
+        cur.execute(f'SELECT {", ".join(fields)} FROM products WHERE id = ?', (product_id,))
         row = cur.fetchone()
         if not row:
+            return None
+        return json_body({"product": dict(row)}), [product_tag(product_id)]
+
+    try:
+        response = catalog_response(('product', product_id, fields), load)
+        if response is None:
             return jsonify({"error": "Product not found"}), 404
-        product = dict(row)
-        return jsonify({"product": product}), 200
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/check-auth', methods=['GET'])
+@api.route('/api/check-auth', methods=['GET'])
 def check_auth():
     if 'user_id' in session:
-        cur = conn.cursor()
-        cur.execute('SELECT id, username, email, full_name, created_at FROM users WHERE id = ?', (session['user_id'],))
-        row = cur.fetchone()
-        user = dict(row) if row else None
+        user = load_user(session['user_id'])
         return jsonify({"authenticated": True, "user": user}), 200
     else:
         return jsonify({"authenticated": False}), 200
 
 # Order Routes
-@app.route('/api/orders', methods=['POST'])
+# Accepts a cart (``items: [{product_id, quantity, size}, ...]``) or the
+# original single-product body; either way the order is one transaction.
+@api.route('/api/orders', methods=['POST'])
 def create_order():
     try:
         data = request.get_json()
-        
+
         # Validate required fields
-        required_fields = ['product_id', 'quantity', 'size', 'customer_info', 'shipping_address']
-        for field in required_fields:
+        for field in ['customer_info', 'shipping_address']:
             if not data.get(field):
                 return jsonify({"error": f"{field} is required"}), 400
-        
-        # Get product details
-        cur = conn.cursor()
-        cur.execute('SELECT id, name, image_url, price, stock FROM products WHERE id = ?', (data['product_id'],))
-        prod = cur.fetchone()
-        if not prod:
-            return jsonify({"error": "Product not found"}), 404
-
-        if prod['stock'] < int(data['quantity']):
-            return jsonify({"error": "Insufficient stock"}), 400
-
-        unit_price = prod['price']
-        total_price = unit_price * int(data['quantity'])
-
-        order_id = str(uuid.uuid4())
-        created_at = datetime.now(timezone.utc).isoformat()
-
-        cur.execute('''INSERT INTO orders (id, user_id, product_id, product_name, product_image, quantity, size, unit_price, total_price,
-                       customer_name, customer_email, customer_phone,
-                       shipping_street, shipping_city, shipping_state, shipping_zip_code, shipping_country,
-                       payment_method, order_status, payment_status, estimated_delivery, created_at)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', (
-            order_id,
-            session.get('user_id'),
-            data['product_id'],
-            prod['name'],
-            prod['image_url'],
-            int(data['quantity']),
-            data['size'],
-            unit_price,
-            total_price,
-            data['customer_info']['name'],
-            data['customer_info']['email'],
-            data['customer_info']['phone'],
-            data['shipping_address']['street'],
-            data['shipping_address']['city'],
-            data['shipping_address']['state'],
-            data['shipping_address']['zip_code'],
-            data['shipping_address'].get('country', 'India'),
-            "Cash on Delivery",
-            "confirmed",
-            "pending",
-            "5-7 business days",
-            created_at
-        ))
-
-        # Update product stock
-        cur.execute('UPDATE products SET stock = stock - ? WHERE id = ?', (int(data['quantity']), data['product_id']))
-        conn.commit()
+        lines = orders.parse_items(data)
 
-        order = {
-            "id": order_id,
-            "user_id": session.get('user_id'),
-            "product_id": data['product_id'],
-            "product_name": prod['name'],
-            "product_image": prod['image_url'],
-            "quantity": int(data['quantity']),
-            "size": data['size'],
-            "unit_price": unit_price,
-            "total_price": total_price,
-            "customer_info": {
-                "name": data['customer_info']['name'],
-                "email": data['customer_info']['email'],
-                "phone": data['customer_info']['phone']
-            },
-            "shipping_address": {
-                "street": data['shipping_address']['street'],
-                "city": data['shipping_address']['city'],
-                "state": data['shipping_address']['state'],
-                "zip_code": data['shipping_address']['zip_code'],
-                "country": data['shipping_address'].get('country', 'India')
-            },
-            "payment_method": "Cash on Delivery",
-            "order_status": "confirmed",
-            "payment_status": "pending",
-            "estimated_delivery": "5-7 business days",
-            "created_at": created_at
-        }
+        conn = get_db()
+        if partitions.recovered is None or inventory_engine.reconcile_due():
+            # Repair checkouts a crash left in one file only, then resync the counters
+            partitions.recover(conn)
+            inventory_engine.reconcile(conn)
+        order = orders.place_order(conn, session.get('user_id'), lines,
+                                   data['customer_info'], data['shipping_address'], partitions,
+                                   inventory=inventory_engine, writer=current_app.extensions.get('order_writer'))
+        sold = {item['product_id'] for item in order['items']}
+        tags = [product_tag(pid) for pid in sold]
+        if any(inventory_engine.available.get(pid, 0) <= 0 for pid in sold):
+            # Something may have sold out: in_stock listings and facets shift
+            tags.append('in_stock')
+        catalog_cache.invalidate(*tags)
 
         return jsonify({
             "message": "Order created successfully",
             "order": order
         }), 201
-        
+
+    except orders.OrderError as e:
+        return jsonify(e.to_dict()), e.status
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/orders', methods=['GET'])
+def order_cursor(after):
+    """``(created_at, id)`` of a decoded order cursor, ``created_at`` in its
+    stored form (integer microseconds)."""
+    created_at, order_id = after
+    try:
+        if isinstance(created_at, str):
+            # Cursor issued before created_at was stored as an integer
+            created_at = parse_timestamp(created_at)
+        if not isinstance(created_at, int):
+            raise TypeError(created_at)
+        order_partitions.month_of(created_at)
+    except (ValueError, TypeError, OverflowError, OSError):
+        raise PaginationError("Invalid cursor")
+    return created_at, order_id
+
+@api.route('/api/orders', methods=['GET'])
 def get_orders():
     try:
-        # Get user's orders (if authenticated) or all orders (for admin)
+        limit, after = page_args(request.args)
+        if after:
+            after = order_cursor(after)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # The logged-in user's orders (all orders with the admin token; anyone
+        # else gets 401), newest first, one keyset page at a time. Partitions
+        # are read newest first from the cursor's month until the page is
+        # full, so a page touches the months it shows and no others.
+        user_id = session.get('user_id')
+        if not user_id and not is_admin():
+            return jsonify({"error": "Not authenticated"}), 401
+        where, params = [], []
+        if user_id:
+            where.append('o.user_id = ?')
+            params.append(user_id)
+        last = None
+        if after:
+            created_at, order_id = after
+            where.append('(o.created_at, o.id) < (?, ?)')
+            params.extend([created_at, order_id])
+            last = order_partitions.month_of(created_at)
+        tail = (' WHERE ' + ' AND '.join(where) if where else '') + ' ORDER BY o.created_at DESC, o.id DESC LIMIT ?'
+        conn = get_db()
         cur = conn.cursor()
-        if 'user_id' in session:
-            cur.execute('SELECT * FROM orders WHERE user_id = ? ORDER BY created_at DESC', (session['user_id'],))
-        else:
-            cur.execute('SELECT * FROM orders ORDER BY created_at DESC')
-        rows = cur.fetchall()
-        orders = []
-        for r in rows:
-            orders.append({
-                key: r[key] for key in r.keys()
-            })
-        return jsonify({"orders": orders}), 200
+        rows, result = [], []
+        for month in partitions.months(conn, user_id, last=last):
+            schema = partitions.attach(conn, month)
+            if schema is None:
+                continue
+            cur.execute(orders.order_select(schema) + tail, params + [limit + 1 - len(rows)])
+            found = cur.fetchall()
+            rows.extend(found)
+            # Items now, while the month is attached; not for the row past the page
+            shown = [orders.order_from_row(r) for r in found[:max(limit - len(result), 0)]]
+            result.extend(orders.attach_items(conn, shown, schema))
+            if len(rows) > limit:
+                break
+        rows, next_cursor = page(rows, limit, lambda r: (r[-1], r[0]))
+        return jsonify({"orders": result, "next_cursor": next_cursor}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/orders/<order_id>', methods=['GET'])
-def get_order(order_id):
+# Streaming export of the logged-in user's orders (all orders with the admin
+# token; anyone else gets 401) as NDJSON or CSV. Rows are pulled from the
+# cursor in fetchmany() batches and written out as they arrive, so memory
+# stays flat no matter how many orders match. Filters: from/to (ISO date or datetime, to is
+# exclusive) and status (order_status).
+EXPORT_BATCH_SIZE = 500
+
+def parse_timestamp(value):
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return orders.timestamp_us(parsed)
+
+@api.route('/api/orders/export', methods=['GET'])
+def export_orders():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    user_id = session.get('user_id')
+    if not user_id and not is_admin():
+        return jsonify({"error": "Not authenticated"}), 401
+    where, params = [], []
+    if user_id:
+        where.append('o.user_id = ?')
+        params.append(user_id)
+    # Only the partitions of the months in range are read, oldest first
+    first = last = None
     try:
+        if request.args.get('from'):
+            start = parse_timestamp(request.args['from'])
+            where.append('o.created_at >= ?')
+            params.append(start)
+            first = order_partitions.month_of(start)
+        if request.args.get('to'):
+            end = parse_timestamp(request.args['to'])
+            where.append('o.created_at < ?')
+            params.append(end)
+            last = order_partitions.month_of(end - 1)
+    except ValueError:
+        return jsonify({"error": "from/to must be ISO dates"}), 400
+    if request.args.get('status'):
+        where.append('o.order_status = ?')
+        params.append(request.args['status'])
+
+    tail = (' WHERE ' + ' AND '.join(where) if where else '') + ' ORDER BY o.created_at, o.id'
+
+    def generate():
+        conn = get_db()
         cur = conn.cursor()
-        cur.execute('SELECT * FROM orders WHERE id = ?', (order_id,))
-        row = cur.fetchone()
+        columns = orders.ORDER_COLUMNS
+        if fmt == 'csv':
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(columns)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        for month in partitions.months(conn, user_id, first=first, last=last, newest_first=False):
+            schema = partitions.attach(conn, month)
+            if schema is None:
+                continue
+            cur.execute(orders.order_select(schema) + tail, params)
+            while True:
+                rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                if fmt == 'csv':
+                    writer.writerows(map(orders.order_values, rows))
+                    chunk = buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+                else:
+                    batch = orders.attach_items(conn, [orders.order_from_row(r) for r in rows], schema)
+                    chunk = ''.join(current_app.json.dumps(o) + '\n' for o in batch)
+                yield chunk
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = current_app.response_class(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=orders.{fmt}'
+    return response
+
+@api.route('/api/orders/<order_id>', methods=['GET'])
+def get_order(order_id):
+    try:
+        conn = get_db()
+        # The id says which month to attach (see order_partitions.py)
+        month = partitions.locate(conn, order_id)
+        schema = partitions.attach(conn, month) if month else None
+        row = None
+        if schema is not None:
+            row = conn.execute(orders.order_select(schema) + ' WHERE o.id = ?', (order_id,)).fetchone()
         if not row:
             return jsonify({"error": "Order not found"}), 404
 
-        if 'user_id' in session and row['user_id'] != session['user_id']:
+        order = orders.order_from_row(row)
+        if 'user_id' in session and order['user_id'] != session['user_id']:
             return jsonify({"error": "Access denied"}), 403
 
-        order = {k: row[k] for k in row.keys()}
+        orders.attach_items(conn, [order], schema)
         return jsonify({"order": order}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# Initialize sample data on startup
-with app.app_context():
-    init_sample_data()
+def create_app(config=None):
+    """Build the app. Nothing here touches the database: the schema is checked
+    when the pool opens its first connection (see db.py and
+    migrations.ensure_schema), and sample data is only loaded by
+    ``flask --app server seed``."""
+    app = Flask(__name__)
+    app.config.update(load_config())
+    if config:
+        app.config.update(config)
+
+    passwords.init_app(app)
+    sessions.init_app(app)
+    CORS(app, origins=app.config['CORS_ORIGINS'], supports_credentials=True)
+    compression.init_app(app)
+    db.init_app(app)
+    # Before the group-commit writer, which attaches partitions through it
+    app.extensions['order_partitions'] = OrderPartitions(order_partitions.partition_dir(app.config['SQLITE_PATH']))
+    group_commit.init_app(app)
+    app.extensions['catalog_cache'] = CatalogCache(max_entries=app.config['CATALOG_CACHE_SIZE'],
+                                                   generation_path=generation_path(app.config['SQLITE_PATH']))
+    app.extensions['user_cache'] = TTLCache(max_entries=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+    app.extensions['inventory'] = InventoryEngine(hold_ttl=app.config['INVENTORY_HOLD_TTL'],
+                                                  reconcile_interval=app.config['INVENTORY_RECONCILE_INTERVAL'])
+
+    # Per-route and per-statement timings, served at /api/metrics (see metrics.py)
+    metrics.init_app(app).add_collector(lambda: collect_component_metrics(app))
+
+    app.register_blueprint(api)
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8001, debug=True)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=8001, debug=True)
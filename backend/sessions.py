@@ -0,0 +1,223 @@
+import secrets
+import threading
+import time
+
+from flask.sessions import SecureCookieSession, SecureCookieSessionInterface, SessionInterface, SessionMixin, session_json_serializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from db import ConnectionPool
+from ttl_cache import TTLCache
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    # Like Flask's SecureCookieSession: ``accessed`` is only set by reads and
+    # writes, so responses that never looked at the session can be shared.
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self.accessed = True
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class CookieSession(SecureCookieSession):
+    """Flask's cookie session, with ``'user_id' in session`` counted as an
+    access too, so an anonymous answer also gets ``Vary: Cookie``."""
+
+    def __contains__(self, key):
+        self.accessed = True
+        return super().__contains__(key)
+
+
+class CookieSessionInterface(SecureCookieSessionInterface):
+    session_class = CookieSession
+
+
+class MemorySessionStore:
+    """Process-local sessions in an LRU with TTL eviction."""
+
+    def __init__(self, max_entries=100000, ttl=7 * 24 * 3600):
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl, clock=time.time)
+
+    def load(self, sid):
+        return self._cache.get(sid)
+
+    def save(self, sid, data, expires_at):
+        self._cache.set(sid, (data, expires_at), ttl=expires_at - time.time())
+
+    def delete(self, sid):
+        self._cache.delete(sid)
+
+
+class SqliteSessionStore:
+    """Sessions in their own SQLite file, so session writes never contend
+    with the catalog/order database. Expired rows are removed in batches at
+    most once every ``sweep_interval`` seconds, piggybacked on a save."""
+
+    def __init__(self, path, sweep_interval=300, sweep_batch=1000):
+        self.pool = ConnectionPool(path, max_idle=8, setup=self.create_table)
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+    @staticmethod
+    def create_table(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)')
+        conn.commit()
+
+    def load(self, sid):
+        conn = self.pool.acquire()
+        try:
+            row = conn.execute('SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?',
+                               (sid, time.time())).fetchone()
+        finally:
+            self.pool.release(conn)
+        if row is None:
+            return None
+        return session_json_serializer.loads(row['data']), row['expires_at']
+
+    def save(self, sid, data, expires_at):
+        conn = self.pool.acquire()
+        try:
+            conn.execute('''INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+                            ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at''',
+                         (sid, session_json_serializer.dumps(data), expires_at))
+            conn.commit()
+            if time.time() >= self._next_sweep:
+                self.sweep(conn)
+        finally:
+            self.pool.release(conn)
+
+    def delete(self, sid):
+        conn = self.pool.acquire()
+        try:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (sid,))
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def sweep(self, conn):
+        if not self._sweep_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._next_sweep = time.time() + self.sweep_interval
+            removed = 0
+            while True:
+                cur = conn.execute('''DELETE FROM sessions WHERE id IN (
+                                          SELECT id FROM sessions WHERE expires_at <= ? LIMIT ?)''',
+                                   (time.time(), self.sweep_batch))
+                conn.commit()
+                removed += cur.rowcount
+                if cur.rowcount < self.sweep_batch:
+                    return removed
+        finally:
+            self._sweep_lock.release()
+
+
+class ServerSessionInterface(SessionInterface):
+    """Server-side sessions keyed by a random id in a signed cookie.
+
+    The store is only written when the session changed, when a new session
+    gets its first data, or when less than half of its lifetime is left, so
+    requests that merely read the session (check-auth, profile, orders) cost
+    one store lookup and no write.
+    """
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='stylesphere-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                sid = None
+            if sid:
+                loaded = self.store.load(sid)
+                if loaded is not None:
+                    data, expires_at = loaded
+                    return ServerSession(data, sid=sid, expires_at=expires_at)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            # The response depends on who is asking; shared caches must not
+            # hand it to another user
+            response.vary.add('Cookie')
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        stale = session.expires_at is not None and session.expires_at - now < self.ttl / 2
+        if not (session.new or session.modified or stale):
+            return
+        self.store.save(session.sid, dict(session), now + self.ttl)
+        if session.new:
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid.encode('ascii')).decode('ascii'),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def init_app(app):
+    """Install the session backend named by ``SESSION_BACKEND``:
+    ``sqlite`` (default), ``memory`` or ``cookie`` (stateless signed cookie)."""
+    backend = app.config.get('SESSION_BACKEND', 'sqlite')
+    ttl = app.config.get('SESSION_TTL', 7 * 24 * 3600)
+    if backend == 'cookie':
+        app.session_interface = CookieSessionInterface()
+    elif backend == 'memory':
+        app.session_interface = ServerSessionInterface(
+            MemorySessionStore(max_entries=app.config.get('SESSION_MAX_ENTRIES', 100000), ttl=ttl), ttl)
+    elif backend == 'sqlite':
+        app.session_interface = ServerSessionInterface(SqliteSessionStore(app.config['SESSION_SQLITE_PATH']), ttl)
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    return app.session_interface
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries also expire ``ttl`` seconds after
+    they were last written. Expired entries are dropped lazily on access and
+    from the cold end of the LRU when the cache is full.
+
+    With a shared ``InvalidationBoard`` (pre-forked workers, see prefork.py)
+    ``invalidate(key)`` also retires the copies other processes hold: an entry
+    is only served while its key was not invalidated anywhere after
+    ``read_at``, the time its value was read (the time of ``set`` unless the
+    caller passes it).
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600.0, clock=time.monotonic, board=None, namespace=''):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.board = board
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at, read_at, slots = item
+                if expires_at > self._clock() and (self.board is None or self.board.fresh(slots, read_at)):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None, read_at=None):
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        slots = ()
+        if self.board is not None:
+            read_at = time.monotonic_ns() if read_at is None else read_at
+            slots = self.board.slots_for((f'{self.namespace}{key}',))
+        with self._lock:
+            self._data[key] = (value, expires_at, read_at, slots)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate(self, key):
+        """``delete`` here and in every process sharing the board."""
+        if self.board is not None:
+            self.board.touch(f'{self.namespace}{key}')
+        self.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def sweep(self):
+        """Drop every expired entry; returns how many were removed."""
+        now = self._clock()
+        with self._lock:
+            expired = [k for k, item in self._data.items() if item[1] <= now]
+            for k in expired:
+                del self._data[k]
+        return len(expired)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
+
+    def __len__(self):
+        return len(self._data)
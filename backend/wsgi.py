@@ -1,4 +1,6 @@
-from server import app
+from server import create_app
+
+app = create_app()
 
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    app.run()
@@ -29,7 +29,7 @@ const HomePage = () => {
     try {
       const [categoriesRes, productsRes] = await Promise.all([
         axios.get(`${API}/categories`),
-        axios.get(`${API}/products`)
+        axios.get(`${API}/products?limit=3`)
       ]);
       
       setCategories(categoriesRes.data.categories);
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { useSearchParams, Link } from "react-router-dom";
 import axios from "axios";
 import { Card, CardContent } from "../components/ui/card";
@@ -15,34 +15,103 @@ import {
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || 'https://clothsonlin321.pythonanywhere.com';
 const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 24;
+const SEARCH_LIMIT = 48;
+
+const SORT_OPTIONS = [
+  { value: "created", label: "Oldest first" },
+  { value: "newest", label: "Newest first" },
+  { value: "price", label: "Price: low to high" },
+  { value: "price_desc", label: "Price: high to low" },
+  { value: "name", label: "Name" },
+];
 
 const ProductsPage = () => {
   const [searchParams, setSearchParams] = useSearchParams();
   const [products, setProducts] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [facets, setFacets] = useState(null);
   const [categories, setCategories] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [loaded, setLoaded] = useState(false);
   const [selectedCategory, setSelectedCategory] = useState(searchParams.get("category") || "");
+  const [sort, setSort] = useState("created");
+  const [minPrice, setMinPrice] = useState("");
+  const [maxPrice, setMaxPrice] = useState("");
+  const [inStock, setInStock] = useState(false);
   const [viewMode, setViewMode] = useState("grid");
   const [searchQuery, setSearchQuery] = useState("");
+  // Typed filters reach the server once typing pauses
+  const [typed, setTyped] = useState({ query: "", minPrice: "", maxPrice: "" });
+  // Only the latest request may update the list (filters can change mid-flight)
+  const requestId = useRef(0);
+
+  useEffect(() => {
+    axios.get(`${API}/categories`)
+      .then((response) => setCategories(response.data.categories))
+      .catch((error) => console.error("Error fetching categories:", error));
+  }, []);
 
   useEffect(() => {
-    fetchData();
-  }, [selectedCategory]);
+    const next = { query: searchQuery.trim(), minPrice, maxPrice };
+    const timer = setTimeout(() => setTyped((current) =>
+      current.query === next.query && current.minPrice === next.minPrice && current.maxPrice === next.maxPrice ? current : next
+    ), 300);
+    return () => clearTimeout(timer);
+  }, [searchQuery, minPrice, maxPrice]);
 
-  const fetchData = async () => {
+  useEffect(() => {
+    fetchFirstPage();
+  }, [selectedCategory, sort, inStock, typed]);
+
+  // Filtering, sorting and paging all happen on the server; the page only
+  // ever holds what has been shown so far.
+  const listParams = (after) => ({
+    limit: PAGE_SIZE,
+    sort,
+    ...(selectedCategory ? { category_id: selectedCategory } : {}),
+    ...(typed.minPrice !== "" ? { min_price: typed.minPrice } : {}),
+    ...(typed.maxPrice !== "" ? { max_price: typed.maxPrice } : {}),
+    ...(inStock ? { in_stock: 1 } : {}),
+    ...(after ? { after } : {}),
+  });
+
+  const fetchFirstPage = async () => {
+    const id = ++requestId.current;
     try {
       setLoading(true);
-      const [categoriesRes, productsRes] = await Promise.all([
-        axios.get(`${API}/categories`),
-        axios.get(`${API}/products${selectedCategory ? `?category_id=${selectedCategory}` : ''}`)
-      ]);
-      
-      setCategories(categoriesRes.data.categories);
-      setProducts(productsRes.data.products);
+      const response = typed.query
+        ? await axios.get(`${API}/products/search`, {
+            params: { q: typed.query, limit: SEARCH_LIMIT, ...(selectedCategory ? { category_id: selectedCategory } : {}) },
+          })
+        : await axios.get(`${API}/products`, { params: listParams(null) });
+      if (id !== requestId.current) return;
+      setProducts(response.data.products || []);
+      setNextCursor(response.data.next_cursor || null);
+      setFacets(response.data.facets || null);
     } catch (error) {
-      console.error("Error fetching data:", error);
+      console.error("Error fetching products:", error);
     } finally {
-      setLoading(false);
+      if (id === requestId.current) {
+        setLoading(false);
+        setLoaded(true);
+      }
+    }
+  };
+
+  const loadMore = async () => {
+    const id = requestId.current;
+    try {
+      setLoadingMore(true);
+      const response = await axios.get(`${API}/products`, { params: listParams(nextCursor) });
+      if (id !== requestId.current) return;
+      setProducts((shown) => [...shown, ...(response.data.products || [])]);
+      setNextCursor(response.data.next_cursor || null);
+    } catch (error) {
+      console.error("Error fetching more products:", error);
+    } finally {
+      setLoadingMore(false);
     }
   };
 
@@ -55,14 +124,16 @@ const ProductsPage = () => {
     }
   };
 
-  const filteredProducts = products.filter(product =>
-    product.name.toLowerCase().includes(searchQuery.toLowerCase()) ||
-    product.description.toLowerCase().includes(searchQuery.toLowerCase())
-  );
+  // Facet counts cover the whole filtered catalog, not just the loaded pages
+  const totalCount = typed.query || !facets
+    ? products.length
+    : facets.categories
+        .filter((facet) => !selectedCategory || facet.id === selectedCategory)
+        .reduce((sum, facet) => sum + facet.count, 0);
 
   const selectedCategoryName = categories.find(cat => cat.id === selectedCategory)?.name || "All Products";
 
-  if (loading) {
+  if (!loaded) {
     return (
       <div className="min-h-screen flex items-center justify-center">
         <div className="loading-spinner"></div>
@@ -81,7 +152,7 @@ const ProductsPage = () => {
                 {selectedCategoryName}
               </h1>
               <p className="text-gray-600">
-                {filteredProducts.length} {filteredProducts.length === 1 ? 'product' : 'products'} available
+                {totalCount} {totalCount === 1 ? 'product' : 'products'} {typed.query ? 'found' : 'available'}
               </p>
             </div>
             
@@ -163,12 +234,70 @@ const ProductsPage = () => {
                   </button>
                 ))}
               </div>
+
+              {/* Sort, price and stock filters (search results are ranked by relevance instead) */}
+              <div className="space-y-3 mt-6">
+                <h4 className="font-medium text-gray-900 mb-3">Sort by</h4>
+                <select
+                  value={sort}
+                  onChange={(e) => setSort(e.target.value)}
+                  className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-orange-500 focus:border-orange-500 outline-none"
+                  disabled={Boolean(typed.query)}
+                  data-testid="sort-select"
+                >
+                  {SORT_OPTIONS.map((option) => (
+                    <option key={option.value} value={option.value}>{option.label}</option>
+                  ))}
+                </select>
+              </div>
+
+              <div className="space-y-3 mt-6">
+                <h4 className="font-medium text-gray-900 mb-3">Price</h4>
+                <div className="flex items-center gap-2">
+                  <input
+                    type="number"
+                    min="0"
+                    placeholder="Min"
+                    value={minPrice}
+                    onChange={(e) => setMinPrice(e.target.value)}
+                    className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-orange-500 focus:border-orange-500 outline-none"
+                    disabled={Boolean(typed.query)}
+                    data-testid="min-price-input"
+                  />
+                  <span className="text-gray-400">–</span>
+                  <input
+                    type="number"
+                    min="0"
+                    placeholder="Max"
+                    value={maxPrice}
+                    onChange={(e) => setMaxPrice(e.target.value)}
+                    className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-orange-500 focus:border-orange-500 outline-none"
+                    disabled={Boolean(typed.query)}
+                    data-testid="max-price-input"
+                  />
+                </div>
+                <label className="flex items-center gap-2 text-gray-700">
+                  <input
+                    type="checkbox"
+                    checked={inStock}
+                    onChange={(e) => setInStock(e.target.checked)}
+                    className="accent-orange-500"
+                    disabled={Boolean(typed.query)}
+                    data-testid="in-stock-checkbox"
+                  />
+                  In stock only
+                </label>
+              </div>
             </div>
           </div>
 
           {/* Products Grid */}
           <div className="flex-1">
-            {filteredProducts.length === 0 ? (
+            {loading ? (
+              <div className="flex justify-center py-12">
+                <div className="loading-spinner"></div>
+              </div>
+            ) : products.length === 0 ? (
               <div className="text-center py-12">
                 <div className="w-24 h-24 bg-gray-100 rounded-full flex items-center justify-center mx-auto mb-4">
                   <ShoppingBag className="w-12 h-12 text-gray-400" />
@@ -184,7 +313,7 @@ const ProductsPage = () => {
                   ? "grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6"
                   : "space-y-4"
               }>
-                {filteredProducts.map((product) => (
+                {products.map((product) => (
                   viewMode === "grid" ? (
                     <Card key={product.id} className="product-card cursor-pointer hover:shadow-lg transition-shadow" data-testid={`product-card-${product.id}`}>
                       <Link to={`/products/${product.id}`} className="block">
@@ -288,6 +417,18 @@ const ProductsPage = () => {
                 ))}
               </div>
             )}
+            {!loading && nextCursor && !typed.query && (
+              <div className="text-center mt-8">
+                <Button
+                  variant="outline"
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  data-testid="load-more-products"
+                >
+                  {loadingMore ? "Loading..." : "Load more"}
+                </Button>
+              </div>
+            )}
           </div>
         </div>
       </div>
@@ -20,6 +20,7 @@ import {
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || '';
 const API = BACKEND_URL ? `${BACKEND_URL}/api` : '/api';
+const ORDERS_PAGE_SIZE = 10;
 
 const ProfilePage = ({ user, setUser }) => {
   const [editing, setEditing] = useState(false);
@@ -30,16 +31,22 @@ const ProfilePage = ({ user, setUser }) => {
     username: user?.username || ""
   });
 
-  // Orders loaded from backend for authenticated user
+  // Orders loaded from backend for authenticated user, one page at a time
   const [orders, setOrders] = useState([]);
+  const [ordersCursor, setOrdersCursor] = useState(null);
   const [ordersLoading, setOrdersLoading] = useState(true);
+  const [ordersLoadingMore, setOrdersLoadingMore] = useState(false);
   const [ordersError, setOrdersError] = useState(null);
 
+  const fetchOrdersPage = (after) =>
+    axios.get(`${API}/orders`, { params: { limit: ORDERS_PAGE_SIZE, ...(after ? { after } : {}) } });
+
   useEffect(() => {
-    // Fetch orders when component mounts or when user changes
+    // Fetch the first page when component mounts or when user changes
     const fetchOrders = async () => {
       if (!user) {
         setOrders([]);
+        setOrdersCursor(null);
         setOrdersLoading(false);
         return;
       }
@@ -47,12 +54,14 @@ const ProfilePage = ({ user, setUser }) => {
       try {
         setOrdersLoading(true);
         setOrdersError(null);
-        const response = await axios.get(`${API}/orders`);
+        const response = await fetchOrdersPage(null);
         setOrders(response.data.orders || []);
+        setOrdersCursor(response.data.next_cursor);
       } catch (err) {
         console.error("Failed to load orders:", err);
         setOrdersError(err.response?.data?.error || err.message || 'Failed to load orders');
         setOrders([]);
+        setOrdersCursor(null);
       } finally {
         setOrdersLoading(false);
       }
@@ -61,6 +70,19 @@ const ProfilePage = ({ user, setUser }) => {
     fetchOrders();
   }, [user]);
 
+  const loadMoreOrders = async () => {
+    try {
+      setOrdersLoadingMore(true);
+      const response = await fetchOrdersPage(ordersCursor);
+      setOrders((loaded) => [...loaded, ...(response.data.orders || [])]);
+      setOrdersCursor(response.data.next_cursor);
+    } catch (err) {
+      toast.error(err.response?.data?.error || "Failed to load more orders");
+    } finally {
+      setOrdersLoadingMore(false);
+    }
+  };
+
   const handleSaveProfile = async () => {
     try {
       setLoading(true);
@@ -320,6 +342,18 @@ const ProfilePage = ({ user, setUser }) => {
                         </CardContent>
                       </Card>
                     ))}
+                    {ordersCursor && (
+                      <div className="text-center">
+                        <Button
+                          variant="outline"
+                          onClick={loadMoreOrders}
+                          disabled={ordersLoadingMore}
+                          data-testid="orders-load-more"
+                        >
+                          {ordersLoadingMore ? "Loading..." : "Load more orders"}
+                        </Button>
+                      </div>
+                    )}
                   </div>
                 )}
               </CardContent>